@@ -17,6 +17,17 @@ from ..api_1_0.resources.futuremark3dmark06results import \
 from ..api_1_0.resources.futuremark3dmarkresults import \
     Futuremark3DMarkResultAPI, Futuremark3DMarkResultListAPI, \
     RevisionFuturemark3DMarkResultListAPI
+from ..api_1_0.resources.leaderboards import LeaderboardAPI, \
+    LeaderboardResultAPI, LeaderboardRankAPI
+from ..api_1_0.resources.compare import CompareAPI
+from ..api_1_0.resources.export import ExportAPI
+from ..api_1_0.resources.metrics import MetricsAPI
+from ..api_1_0.resources.queued import QueuedAPI
+from ..api_1_0.resources.search import SearchAPI
+from ..api_1_0.resources.snapshots import SnapshotAPI
+from ..api_1_0.resources.stats import StatsAPI
+from ..api_1_0.resources.results import RevisionResultListAPI
+from ..api_1_0.resources.submissions import SubmissionAPI
 
 
 api = Api(api_blueprint, catch_all_404s=True)
@@ -31,6 +42,7 @@ api.add_resource(UserLogoutRefresh, '/logout/refresh')
 api.add_resource(TokenRefresh, '/tokenrefresh', endpoint='tokenrefresh')
 api.add_resource(MachineListAPI, '/machines', endpoint='machines')
 api.add_resource(MachineAPI, '/machines/<int:id>', endpoint='machine')
+api.add_resource(SubmissionAPI, '/submissions', endpoint='submissions')
 api.add_resource(RevisionListAPI, '/revisions', endpoint='revisions')
 api.add_resource(RevisionAPI, '/revisions/<int:id>', endpoint='revision')
 api.add_resource(MachineRevisionListAPI, '/machines/<int:id>/revisions',
@@ -58,3 +70,19 @@ api.add_resource(Futuremark3DMarkResultAPI,
 api.add_resource(RevisionFuturemark3DMarkResultListAPI,
                  '/revisions/<int:id>/futuremark3dmarkresults',
                  endpoint='revision_futuremark3dmarkresults')
+api.add_resource(RevisionResultListAPI, '/revisions/<int:id>/results',
+                 endpoint='revision_results')
+api.add_resource(QueuedAPI, '/queued', '/queued/<int:id>', endpoint='queued')
+api.add_resource(LeaderboardAPI, '/leaderboards/<metric>',
+                 endpoint='leaderboard')
+api.add_resource(LeaderboardResultAPI,
+                 '/leaderboards/<metric>/results/<int:id>',
+                 endpoint='leaderboard_result')
+api.add_resource(LeaderboardRankAPI, '/leaderboards/<metric>/ranks/<int:rank>',
+                 endpoint='leaderboard_rank')
+api.add_resource(CompareAPI, '/compare', endpoint='compare')
+api.add_resource(ExportAPI, '/export/<kind>', endpoint='export')
+api.add_resource(SearchAPI, '/search/<kind>', endpoint='search')
+api.add_resource(SnapshotAPI, '/snapshots/<table>', endpoint='snapshot')
+api.add_resource(StatsAPI, '/stats/<metric>', endpoint='stats')
+api.add_resource(MetricsAPI, '/metrics', endpoint='metrics')
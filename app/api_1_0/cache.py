@@ -0,0 +1,215 @@
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from hashlib import sha1
+from flask import Response, current_app, g, request
+from flask_restful import fields
+from flask_restful.utils import unpack
+from werkzeug.http import http_date, quote_etag
+from .. import db
+from ..models import ChangeCounter
+
+
+# Conditional GETs and a per-process response cache, both driven by the
+# change counters the write endpoints bump (see ChangeCounter).
+#
+# Counters come in three sizes:
+#
+#   'revisions'                   any write to the table
+#   'revisions:5'                 a write to that row
+#   'machines:3:revisions'        a write to one of machine 3's revisions
+#
+# Every write bumps all three for the row it touches (see touch()).
+#
+# Each resource declares the tables its responses are built from, and the
+# ETag is a hash of the URL and those tables' versions, so a client holding
+# the current version gets a 304 after one lookup on the counters.
+#
+# Past that, a response is cached under its URL along with the counters for
+# exactly what went into it: the list it's a page of ('revisions' or
+# 'machines:3:revisions'), plus the row of everything it embeds, collected
+# while it was serialized. A hit re-reads those counters first (in the same
+# query as the tables), so it's never older than the last commit; updating
+# revision 5 only evicts responses that actually show revision 5.
+
+_Entry = namedtuple('_Entry', 'tags versions data')
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+# parent list counter each table's writes bump, as (parent, foreign key)
+_parents = {
+    'machines': ('users', 'author_id'),
+    'revisions': ('machines', 'machine_id'),
+    'cinebenchr15results': ('revisions', 'revision_id'),
+    'futuremark3dmark06results': ('revisions', 'revision_id'),
+    'futuremark3dmarkresults': ('revisions', 'revision_id')
+}
+
+
+def row_tag(obj):
+    return '{}:{}'.format(obj.__tablename__, obj.id)
+
+
+def _row_tags(table, id, get, tags):
+    tags.add(table)
+    if id is not None:
+        tags.add('{}:{}'.format(table, id))
+    if table in _parents:
+        parent, column = _parents[table]
+        parent_id = get(column)
+        if parent_id is not None:
+            tags.add('{}:{}:{}'.format(parent, parent_id, table))
+
+
+def touch(*objects, rows=None, updated=None):
+    """Bump the counters for `objects` as part of the current transaction.
+
+    Rows inserted with Core rather than the ORM can be passed as `rows`,
+    {table: [row dict]}. Nothing can have cached a row that didn't exist
+    yet, so those only bump their table and the lists they join, not a
+    counter each. Rows updated with Core go in `updated` the same way, each
+    with its id (and any foreign key in _parents), and do get a counter
+    each. Call it after making the change and before committing it.
+    """
+    db.session.flush()
+    tags = set()
+    for obj in objects:
+        _row_tags(obj.__tablename__, obj.id,
+                  lambda column: getattr(obj, column), tags)
+    for table, table_rows in (rows or {}).items():
+        for row in table_rows:
+            _row_tags(table, None, row.get, tags)
+    for table, table_rows in (updated or {}).items():
+        for row in table_rows:
+            _row_tags(table, row['id'], row.get, tags)
+    if tags:
+        ChangeCounter.bump(*tags)
+
+
+def depends_on(*tags):
+    """Add counters the response being built depends on."""
+    collected = g.get('_cache_tags')
+    if collected is not None:
+        collected.update(tags)
+
+
+def _embedded(obj, field_map, tags):
+    for key, field in field_map.items():
+        if isinstance(field, fields.Nested):
+            value = getattr(obj, field.attribute or key, None)
+            if value is not None:
+                tags.add(row_tag(value))
+                _embedded(value, field.nested, tags)
+
+
+def record_rows(data, field_map):
+    """Note the rows `data` is about to be serialized from, if caching.
+
+    Items of a list are covered by the list's own counter, so only what's
+    embedded in them is noted; a lone object is noted as well.
+    """
+    collected = g.get('_cache_tags')
+    if collected is None:
+        return
+    if isinstance(data, (list, tuple)):
+        for item in data:
+            _embedded(item, field_map, collected)
+    elif data is not None:
+        if hasattr(data, '__tablename__'):
+            collected.add(row_tag(data))
+        _embedded(data, field_map, collected)
+
+
+def _versions(tags):
+    found = ChangeCounter.read(tags)
+    return {tag: found.get(tag, (0,))[0] for tag in tags}, \
+        [changed_at for version, changed_at in found.values()]
+
+
+def _store(url, entry):
+    with _lock:
+        _entries[url] = entry
+        _entries.move_to_end(url)
+        while len(_entries) > current_app.config['API_CACHE_SIZE']:
+            _entries.popitem(last=False)
+
+
+def cached(tables, *keys):
+    """Serve conditional and cached GETs for a resource method.
+
+    `tables` are the tables its responses are built from, `keys` any list
+    counters they depend on, formatted with the URL's view args.
+    """
+    tables = tuple(sorted(set(tables)))
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            url = request.url
+            with _lock:
+                entry = _entries.get(url)
+            # the tables and the cached entry's counters in one query
+            wanted = set(tables)
+            if entry is not None:
+                wanted.update(entry.tags)
+            versions, changed = _versions(wanted)
+
+            state = ';'.join('{}={}'.format(table, versions[table])
+                             for table in tables)
+            etag = sha1('{} {}'.format(url, state)
+                        .encode('utf-8')).hexdigest()
+            last_modified = max(changed) if changed else None
+            headers = {'ETag': quote_etag(etag)}
+            if last_modified is not None:
+                headers['Last-Modified'] = http_date(last_modified)
+
+            if request.if_none_match:
+                if request.if_none_match.contains(etag):
+                    return Response(status=304, headers=headers)
+            elif request.if_modified_since and last_modified is not None \
+                    and last_modified.replace(microsecond=0) <= \
+                    request.if_modified_since:
+                return Response(status=304, headers=headers)
+
+            if entry is not None and all(
+                    versions[tag] == version
+                    for tag, version in entry.versions.items()):
+                with _lock:
+                    if url in _entries:
+                        _entries.move_to_end(url)
+                return entry.data, 200, headers
+
+            g._cache_tags = {key.format(**request.view_args)
+                             for key in keys}
+            try:
+                resp = f(*args, **kwargs)
+            finally:
+                tags = g.pop('_cache_tags')
+
+            if isinstance(resp, Response):
+                # streamed lists aren't worth holding on to
+                if resp.status_code == 200:
+                    resp.headers.extend(headers)
+                return resp
+            data, code, extra = unpack(resp)
+            if code != 200:
+                return data, code, extra
+
+            if len(tags) > current_app.config['API_CACHE_MAX_TAGS']:
+                # too many rows to track one by one, go by whole tables
+                tags = set(tables)
+            if not tags:
+                # nothing said what it depends on, so nothing would ever
+                # evict it; a resource that isn't built from rows it
+                # serializes has to name its counters with depends_on()
+                return data, code, dict(extra or {}, **headers)
+            # only keep it if none of the tables changed while it was being
+            # built, otherwise the counters might be newer than the data
+            now, _ = _versions(set(tables) | tags)
+            if all(now[table] == versions[table] for table in tables):
+                _store(url, _Entry(frozenset(tags),
+                                   {tag: now[tag] for tag in tags}, data))
+            return data, code, dict(extra or {}, **headers)
+        return wrapper
+    return decorator
@@ -0,0 +1,83 @@
+from flask import request
+from flask_restful import abort, fields
+
+
+# ?fields= and ?expand= let a client trim a response down to what it uses.
+#
+#   ?fields=id,cpu_cb,revision.cpu_name   only these (dotted paths reach
+#                                         into nested objects)
+#   ?expand=revision                      embed revision but nothing nested
+#                                         inside it; ?expand= embeds nothing
+#
+# Leaving both off returns the full field map, as before. A trimmed field
+# map is an ordinary field map, so the serializers and loading plans built
+# from it only touch what's left in it.
+
+_selections = {}
+
+
+def _paths(value):
+    return {tuple(part.strip().split('.'))
+            for part in value.split(',') if part.strip()}
+
+
+def _check(field_map, paths, param, nested_only=False):
+    for path in paths:
+        current = field_map
+        for part in path:
+            field = current.get(part) if current is not None else None
+            if field is None:
+                abort(400, message='Unknown field {!r} in ?{}='.format(
+                    '.'.join(path), param))
+            current = field.nested if isinstance(field, fields.Nested) \
+                else None
+        if nested_only and current is None:
+            abort(400, message='{!r} in ?{}= is not a nested object'.format(
+                '.'.join(path), param))
+
+
+def _prune(field_map, only, expand, path=()):
+    pruned = {}
+    for key, field in field_map.items():
+        here = path + (key,)
+        depth = len(here)
+        below = only is not None and any(
+            len(p) > depth and p[:depth] == here for p in only)
+        if only is not None and here not in only and not below:
+            continue
+        if isinstance(field, fields.Nested):
+            expanded = expand is None or below or \
+                (only is not None and here in only) or \
+                any(p[:depth] == here for p in expand)
+            if not expanded:
+                continue
+            field = fields.Nested(
+                _prune(field.nested, only if below else None, expand, here),
+                allow_null=field.allow_null, default=field.default,
+                attribute=field.attribute)
+        pruned[key] = field
+    return pruned
+
+
+def requested_fields(field_map):
+    """The part of `field_map` the current request asked for."""
+    only = request.args.get('fields')
+    expand = request.args.get('expand')
+    if only is None and expand is None:
+        return field_map
+
+    key = (id(field_map), only, expand)
+    if key not in _selections:
+        only_paths = _paths(only) if only is not None else None
+        expand_paths = _paths(expand) if expand is not None else None
+        if only_paths is not None:
+            _check(field_map, only_paths, 'fields')
+        if expand_paths is not None:
+            _check(field_map, expand_paths, 'expand', nested_only=True)
+        # there are only so many sensible combinations, but don't let
+        # someone grow this forever by making up new ones
+        if len(_selections) > 1024:
+            _selections.clear()
+        _selections[key] = (field_map,
+                            _prune(field_map, only_paths, expand_paths))
+    return _selections[key][1]
@@ -0,0 +1,95 @@
+import re
+from urllib.parse import unquote_plus
+from flask import request
+from flask_restful import abort
+from .. import db
+from ..bulk import coerce, hardware_fields
+from ..models import Revision
+
+
+# Filtering lists by hardware and score, straight from the query string:
+#
+#   /revisions?cpu_make=AMD&cpu_proc_cores>=8&gpu_name~=1080
+#   /cinebenchr15results?cpu_name~=ryzen&cpu_cb>=1500
+#
+# Operators are =, !=, >, >=, <, <= and ~= (contains, ignoring case, for
+# text). Revision lists filter on the revision's hardware columns, result
+# lists on those of the revision each result belongs to as well as on the
+# result's own columns. Conditions are ANDed together.
+#
+# "cpu_cb>=1500" doesn't survive being read as key=value pairs (it comes out
+# as "cpu_cb>" = "1500"), so filters are read from the raw query string.
+
+_condition = re.compile(r'^(\w+)(!=|>=|<=|~=|=|>|<)(.*)$', re.DOTALL)
+
+_operators = {
+    '=': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value
+}
+
+# query string arguments that aren't filters
+reserved = ('cursor', 'limit', 'stream', 'fields')
+
+
+def filterable(model):
+    """{name: column} of what lists of `model` can be filtered on."""
+    columns = {name: getattr(Revision, name) for name in hardware_fields}
+    if model is not Revision:
+        for column in model.__table__.c:
+            if not column.primary_key and not column.foreign_keys and \
+                    not column.key.endswith('url'):
+                columns[column.key] = getattr(model, column.key)
+    return columns
+
+
+def conditions():
+    """(name, operator, value) for each part of the query string."""
+    for part in request.query_string.decode('utf-8', 'replace').split('&'):
+        match = _condition.match(unquote_plus(part))
+        if match is not None:
+            yield match.groups()
+
+
+def _contains(column, value):
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%') \
+        .replace('_', '\\_')
+    return column.ilike('%' + escaped + '%', escape='\\')
+
+
+def filtered(query):
+    """`query` narrowed down by the filters in the query string."""
+    model = query.column_descriptions[0]['entity']
+    columns = filterable(model)
+    criteria, errors = [], {}
+    joined = model is Revision
+    for name, operator, value in conditions():
+        if name in reserved:
+            continue
+        column = columns.get(name)
+        if column is None:
+            if operator != '=':
+                errors[name] = 'not something to filter on'
+            # anything else is some other argument, and not ours to judge
+            continue
+        if operator == '~=':
+            if column.type.python_type is not str:
+                errors[name] = '~= is only for text'
+            else:
+                criteria.append(_contains(column, value))
+        else:
+            try:
+                value = coerce(column, value)
+            except (ValueError, OverflowError) as e:
+                errors[name] = str(e) or 'invalid value'
+                continue
+            criteria.append(_operators[operator](column, value))
+        if column.class_ is Revision and not joined:
+            query = query.join(Revision, model.revision_id == Revision.id)
+            joined = True
+    if errors:
+        abort(400, message='Invalid filters', errors=errors)
+    return query.filter(db.and_(*criteria)) if criteria else query
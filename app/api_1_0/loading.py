@@ -0,0 +1,95 @@
+from flask import current_app, request
+from flask_restful import fields
+from flask_sqlalchemy import get_debug_queries
+from sqlalchemy import inspect
+from sqlalchemy.orm import Load
+from sqlalchemy.orm.interfaces import MANYTOONE
+from . import api_blueprint
+from .fieldsets import requested_fields
+
+
+# Marshalling a result walks result -> revision -> machine -> (user,
+# active_revision), and left to the default lazy loaders that is a SELECT
+# per row per level. Instead every resource builds a loading plan from the
+# same field map it marshals with, so whatever gets nested is fetched up
+# front in a fixed number of statements no matter how many rows there are,
+# and whatever isn't in the field map (columns or relationships) is never
+# fetched at all.
+
+_plans = {}
+
+
+def _columns(model, field_map):
+    columns = inspect(model).column_attrs
+    names = []
+    for key, field in field_map.items():
+        if isinstance(field, type):
+            field = field()
+        source = key if field.attribute is None else field.attribute
+        if source in columns:
+            names.append(source)
+    return names
+
+
+def _options(model, field_map, option=None):
+    if option is None:
+        option = Load(model)
+    columns = _columns(model, field_map)
+    if columns:
+        yield option.load_only(*columns)
+    # relationships the field map doesn't nest stay unloaded, even the ones
+    # the model would otherwise join in by default (like Machine.user)
+    yield option.lazyload('*')
+
+    for key, field in field_map.items():
+        if not isinstance(field, fields.Nested):
+            continue
+        attribute = getattr(model, key)
+        # many-to-one can ride along on the same SELECT, anything else
+        # would multiply the rows, so fetch it with one IN query instead
+        if attribute.property.direction is MANYTOONE:
+            # a relationship that's an inner join by default (Machine.user)
+            # still has to chain on as a plain one: nested in parentheses
+            # under an outer join, SQLite reads the whole of both tables
+            # into a temporary one for every query
+            nested = option.joinedload(
+                attribute,
+                innerjoin='unnested' if attribute.property.innerjoin
+                else False)
+        else:
+            nested = option.selectinload(attribute)
+        yield nested
+        for nested_option in _options(attribute.property.mapper.class_,
+                                      field.nested, nested):
+            yield nested_option
+
+
+def loading_plan(model, field_map):
+    """Loader options that load exactly what `field_map` marshals."""
+    key = id(field_map)
+    if key not in _plans:
+        if len(_plans) > 4096:
+            _plans.clear()
+        _plans[key] = (field_map, list(_options(model, field_map)))
+    return _plans[key][1]
+
+
+def narrow(query, field_map):
+    """`query` set up to load what the request asked for of `field_map`."""
+    model = query.column_descriptions[0]['entity']
+    return query.options(*loading_plan(model, requested_fields(field_map)))
+
+
+@api_blueprint.after_request
+def count_queries(response):
+    queries = len(get_debug_queries())
+    # for the tests (see tests/test_queries.py) and for looking into a
+    # request by hand, not something to tell the world about
+    if current_app.debug or current_app.testing:
+        response.headers['X-Query-Count'] = str(queries)
+    ceiling = current_app.config['API_QUERY_CEILING']
+    if ceiling is not None and queries > ceiling:
+        current_app.logger.warning(
+            '%s %s ran %d SQL statements (ceiling is %d)',
+            request.method, request.path, queries, ceiling)
+    return response
@@ -0,0 +1,228 @@
+import json
+import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dateutil import parser
+from flask import (Response, current_app, request, stream_with_context,
+    url_for)
+from flask_restful import abort, inputs
+from sqlalchemy import and_, or_
+from werkzeug.urls import url_encode
+from .fieldsets import requested_fields
+from .loading import loading_plan
+from .serializers import serialize
+from .. import db
+
+
+# Keyset ("seek") pagination. Every list is ordered by its sort key
+# descending (NULLs last) with ties broken by id descending, and a cursor
+# just remembers the (key, id) of the row at the edge of the current page.
+# The next page is then a range condition the sort index can seek to, so
+# page N costs the same as page 1 instead of growing with an OFFSET.
+
+
+def encode_cursor(direction, key, id):
+    if hasattr(key, 'isoformat'):
+        key = key.isoformat()
+    payload = json.dumps([direction, key, id], separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+# ids are compared with the id column, so nothing past a BigInteger
+_ID_MIN, _ID_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def _int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _cursor_key(key, sort_key):
+    # a cursor comes from the client, so make sure its key is something the
+    # sort key can be compared with before it goes anywhere near the query
+    if key is None:
+        return None
+    if sort_key is None:
+        raise ValueError(key)
+    type_ = getattr(sort_key, 'type', None)
+    if isinstance(type_, db.DateTime):
+        if not isinstance(key, str):
+            raise ValueError(key)
+        return parser.parse(key)
+    if isinstance(type_, db.Integer):
+        if not _int(key) or not _ID_MIN <= key <= _ID_MAX:
+            raise ValueError(key)
+        return key
+    # anything else we sort on (floats, search ranks) is a number
+    if not (_int(key) or isinstance(key, float) and math.isfinite(key)):
+        raise ValueError(key)
+    return key
+
+
+def decode_cursor(cursor, sort_key):
+    try:
+        direction, key, id = json.loads(
+            urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        if direction not in ('next', 'prev') or not _int(id) or \
+                not _ID_MIN <= id <= _ID_MAX:
+            raise ValueError(cursor)
+        key = _cursor_key(key, sort_key)
+    except (TypeError, ValueError, OverflowError):
+        abort(400, message='Invalid cursor')
+    return direction, key, id
+
+
+def page_limit():
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return current_app.config['API_PAGE_LIMIT']
+    return max(1, min(limit, current_app.config['API_PAGE_LIMIT_MAX']))
+
+
+def _nullable(sort_key):
+    # expressions don't say, so assume the worst for them
+    return getattr(sort_key, 'nullable', True)
+
+
+def _after(sort_key, id_column, key, id):
+    # rows that come after (key, id) in "key desc nulls last, id desc" order
+    if sort_key is None:
+        return id_column < id
+    if key is None:
+        return and_(sort_key.is_(None), id_column < id)
+    # spelled so the range on the sort key is visible to the planner, which
+    # then seeks its index instead of OR-ing several index lookups together
+    after = and_(sort_key <= key, or_(sort_key < key, id_column < id))
+    if _nullable(sort_key):
+        after = or_(after, sort_key.is_(None))
+    return after
+
+
+def _before(sort_key, id_column, key, id):
+    # rows that come before (key, id) in the same order
+    if sort_key is None:
+        return id_column > id
+    if key is None:
+        return or_(sort_key.isnot(None),
+                   and_(sort_key.is_(None), id_column > id))
+    return and_(sort_key >= key, or_(sort_key > key, id_column > id))
+
+
+def _link(cursor, limit):
+    # the rest of the query string is passed on as it came, since filters
+    # like cpu_cb>1500 don't survive a trip through request.args
+    kept = [part for part in
+            request.query_string.decode('utf-8', 'replace').split('&')
+            if part and part.split('=', 1)[0] not in ('cursor', 'limit')]
+    return url_for(request.endpoint, _external=True, **request.view_args) + \
+        '?' + '&'.join(kept + [url_encode({'cursor': cursor,
+                                            'limit': limit})])
+
+
+def fetch_page(query, sort_key, limit, direction='next', key=None, id=None):
+    """Fetch up to `limit` rows of `query` on the far side of (key, id).
+
+    Returns the rows in list order, their (key, id) edges for building
+    cursors, and whether there were more rows past the end of the page.
+    """
+    id_column = query.column_descriptions[0]['entity'].id
+
+    if direction == 'next':
+        order = [id_column.desc()]
+        if sort_key is not None and _nullable(sort_key):
+            order.insert(0, sort_key.desc().nullslast())
+        elif sort_key is not None:
+            order.insert(0, sort_key.desc())
+        if id is not None:
+            query = query.filter(_after(sort_key, id_column, key, id))
+    else:
+        # walk backwards from the cursor, then flip the page back around
+        order = [id_column.asc()]
+        if sort_key is not None and _nullable(sort_key):
+            order.insert(0, sort_key.asc().nullsfirst())
+        elif sort_key is not None:
+            order.insert(0, sort_key.asc())
+        query = query.filter(_before(sort_key, id_column, key, id))
+
+    # select the sort key alongside each row so expressions (like the
+    # 3DMark score sum) can be put in a cursor the same way columns are
+    if sort_key is not None:
+        query = query.add_columns(sort_key)
+    rows = query.order_by(*order).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    if sort_key is not None:
+        items = [row[0] for row in rows]
+        edges = [(row[1], row[0].id) for row in rows]
+    else:
+        items = rows
+        edges = [(None, item.id) for item in items]
+    return items, edges, more
+
+
+def stream(query, sort_key, fields, envelope):
+    """Stream the whole of `query` as one chunked JSON response.
+
+    Rows are pulled a chunk at a time with the same seek queries the pages
+    use and written out as soon as they are marshalled, so neither the
+    rows nor the response body ever have to fit in memory all at once.
+    """
+    chunk = current_app.config['API_STREAM_CHUNK']
+
+    def generate():
+        yield '{{{}: ['.format(json.dumps(envelope))
+        separator = ''
+        key = id = None
+        more = True
+        while more:
+            items, edges, more = fetch_page(query, sort_key, chunk,
+                                            key=key, id=id)
+            for item in serialize(items, fields):
+                yield separator + json.dumps(item)
+                separator = ', '
+            if edges:
+                key, id = edges[-1]
+        yield ']}\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/json')
+
+
+def paginate(query, sort_key, fields, envelope):
+    """Return one page of `query` marshalled with `fields` under `envelope`.
+
+    `sort_key` is the column (or expression) the list is ordered by,
+    descending, or None to order by id alone. Asking for `?stream=true`
+    returns every row instead, streamed in chunks. Either way only the
+    fields the request asked for are loaded and marshalled.
+    """
+    fields = requested_fields(fields)
+    model = query.column_descriptions[0]['entity']
+    query = query.options(*loading_plan(model, fields))
+
+    if request.args.get('stream', type=inputs.boolean):
+        return stream(query, sort_key, fields, envelope)
+
+    limit = page_limit()
+
+    direction, key, id = 'next', None, None
+    cursor = request.args.get('cursor')
+    if cursor:
+        direction, key, id = decode_cursor(cursor, sort_key)
+
+    items, edges, more = fetch_page(query, sort_key, limit, direction, key, id)
+
+    next_link = prev_link = None
+    if items:
+        if more or direction == 'prev':
+            next_link = _link(encode_cursor('next', *edges[-1]), limit)
+        if cursor and (more or direction == 'next'):
+            prev_link = _link(encode_cursor('prev', *edges[0]), limit)
+
+    return {
+        envelope: serialize(items, fields),
+        'limit': limit,
+        'next': next_link,
+        'prev': prev_link
+    }
@@ -3,7 +3,8 @@ from flask_restful import Resource, reqparse
 from flask_httpauth import HTTPBasicAuth
 from flask_jwt_extended import (create_access_token, create_refresh_token,
     jwt_refresh_token_required, jwt_required, get_jwt_identity, get_raw_jwt)
-from app.models import User, RevokedToken
+from app.blacklist import blacklist
+from app.models import User
 
 
 auth = HTTPBasicAuth()
@@ -62,10 +63,9 @@ class TokenRefresh(Resource):
 class UserLogoutAccess(Resource):
     @jwt_required
     def post(self):
-        jti = get_raw_jwt()['jti']
+        raw_jwt = get_raw_jwt()
         try:
-            revoked_token = RevokedToken(jti = jti)
-            revoked_token.add()
+            blacklist.revoke(raw_jwt['jti'], raw_jwt.get('exp'))
             return {'message': 'Access token has been revoked'}
         except:
             return {'message': 'Something went wrong'}, 500
@@ -74,10 +74,9 @@ class UserLogoutAccess(Resource):
 class UserLogoutRefresh(Resource):
     @jwt_refresh_token_required
     def post(self):
-        jti = get_raw_jwt()['jti']
+        raw_jwt = get_raw_jwt()
         try:
-            revoked_token = RevokedToken(jti = jti)
-            revoked_token.add()
+            blacklist.revoke(raw_jwt['jti'], raw_jwt.get('exp'))
             return {'message': 'Refresh token has been revoked'}
         except:
             return {'message': 'Something went wrong'}, 500
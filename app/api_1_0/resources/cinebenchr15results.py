@@ -1,9 +1,15 @@
 from flask import g
-from flask_restful import Resource, reqparse, fields, marshal_with
+from flask_restful import Resource, reqparse, fields
 from dateutil import parser
 from flask_jwt_extended import jwt_required
-from .revisions import revision_fields
-from ... import db
+from .revisions import revision_fields, revision_tags
+from .queued import write_behind
+from ..cache import cached, touch
+from ..filters import filtered
+from ..loading import narrow
+from ..pagination import paginate
+from ..serializers import serialize_with
+from ... import db, leaderboards
 from ...models import Revision, CinebenchR15Result
 
 
@@ -16,13 +22,15 @@ cinebenchr15result_fields = {
     'uri': fields.Url('.cinebenchr15result', absolute=True)
 }
 
+cinebenchr15result_tags = ('cinebenchr15results',) + revision_tags
+
 
 class CinebenchR15ResultListAPI(Resource):
-    @marshal_with(cinebenchr15result_fields,
-                  envelope='cinebenchr15results')
+    @cached(cinebenchr15result_tags, 'cinebenchr15results')
     def get(self):
-        return CinebenchR15Result.query.order_by(
-            CinebenchR15Result.cpu_cb.desc()).all()
+        return paginate(filtered(CinebenchR15Result.query),
+                        CinebenchR15Result.cpu_cb, cinebenchr15result_fields,
+                        'cinebenchr15results')
 
 
 class CinebenchR15ResultAPI(Resource):
@@ -33,12 +41,16 @@ class CinebenchR15ResultAPI(Resource):
         self.reqparse.add_argument('opengl_fps', type=int, location='json')
         super(CinebenchR15ResultAPI, self).__init__()
 
-    @marshal_with(cinebenchr15result_fields, envelope='cinebenchr15result')
+    @cached(cinebenchr15result_tags)
+    @serialize_with(cinebenchr15result_fields,
+                    envelope='cinebenchr15result')
     def get(self, id):
-        return CinebenchR15Result.query.get_or_404(id)
+        return narrow(CinebenchR15Result.query,
+                      cinebenchr15result_fields).get_or_404(id)
 
     @jwt_required
-    @marshal_with(cinebenchr15result_fields, envelope='cinebenchr15result')
+    @serialize_with(cinebenchr15result_fields,
+                    envelope='cinebenchr15result')
     def put(self, id):
         cinebenchr15result = CinebenchR15Result.query.get_or_404(id)
         args = self.reqparse.parse_args()
@@ -49,13 +61,19 @@ class CinebenchR15ResultAPI(Resource):
                     setattr(cinebenchr15result, k, parser.parse(v))
                 else:
                     setattr(cinebenchr15result, k, v)
+        touch(cinebenchr15result)
         db.session.commit()
+        leaderboards.record(cinebenchr15result)
         return cinebenchr15result
 
     @jwt_required
     def delete(self, id):
+        cinebenchr15result = CinebenchR15Result.query.get(id)
+        if cinebenchr15result is not None:
+            touch(cinebenchr15result)
         CinebenchR15Result.query.filter(CinebenchR15Result.id == id).delete()
         db.session.commit()
+        leaderboards.discard(CinebenchR15Result, id)
         return {'result': True}
 
 
@@ -67,13 +85,18 @@ class RevisionCinebenchR15ResultListAPI(Resource):
         self.reqparse.add_argument('opengl_fps', type=int, location='json')
         super(RevisionCinebenchR15ResultListAPI, self).__init__()
 
-    @marshal_with(cinebenchr15result_fields, envelope='cinebenchr15results')
+    @cached(cinebenchr15result_tags,
+            'revisions:{id}:cinebenchr15results')
     def get(self, id):
         revision = Revision.query.get_or_404(id)
-        return revision.cinebenchr15results.all()
+        return paginate(filtered(revision.cinebenchr15results),
+                        CinebenchR15Result.cpu_cb, cinebenchr15result_fields,
+                        'cinebenchr15results')
 
     @jwt_required
-    @marshal_with(cinebenchr15result_fields, envelope='cinebenchr15result')
+    @write_behind('cinebenchr15result')
+    @serialize_with(cinebenchr15result_fields,
+                    envelope='cinebenchr15result')
     def post(self, id):
         args = self.reqparse.parse_args()
 
@@ -91,6 +114,8 @@ class RevisionCinebenchR15ResultListAPI(Resource):
 
         cinebenchr15result.revision_id = revision.id
         db.session.add(cinebenchr15result)
+        touch(cinebenchr15result)
         db.session.commit()
+        leaderboards.record(cinebenchr15result)
 
         return cinebenchr15result, 201
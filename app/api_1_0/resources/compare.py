@@ -0,0 +1,158 @@
+from statistics import median
+from flask import current_app, request
+from flask_restful import Resource, abort
+from .cinebenchr15results import cinebenchr15result_tags
+from .futuremark3dmark06results import futuremark3dmark06result_tags
+from .futuremark3dmarkresults import futuremark3dmarkresult_tags
+from .revisions import revision_fields
+from ..cache import cached, depends_on
+from ..loading import narrow
+from ..serializers import serialize
+from ... import db
+from ...bulk import type_names
+from ...models import Machine, Revision
+from ...stats import metrics
+
+
+# Several systems side by side: each revision's hardware and, for every
+# benchmark, how many results it has and its best and median score.
+#
+# /compare?revisions=1,2,3 compares those revisions, and
+# /compare?machines=4,5 the active revisions of those machines. Either way
+# the revisions are loaded as /revisions/<id> would load them, and then
+# each result table is summarized for all of them in one grouped query, so
+# the number of queries stays the same however many are compared, and only
+# the summaries come back rather than every result.
+
+compare_tags = cinebenchr15result_tags + futuremark3dmark06result_tags + \
+    futuremark3dmarkresult_tags
+
+# score columns of each result table
+_metrics = {}
+for name, model in metrics.items():
+    _metrics.setdefault(model, []).append(name)
+
+
+def _ids(name):
+    try:
+        ids = [int(id) for id in request.args[name].split(',') if id]
+    except ValueError:
+        abort(400, message='{} must be a comma separated list of ids'
+              .format(name))
+    limit = current_app.config['API_COMPARE_LIMIT']
+    if not 1 <= len(ids) <= limit:
+        abort(400, message='Compare between 1 and {} {}'.format(limit, name))
+    return ids
+
+
+def _number(value):
+    # (a median of two decimals can come back from the database's floating
+    # point average with noise in its last places)
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 4)
+
+
+def _window_functions():
+    # SQLite has had them since 3.25, Postgres for ever
+    dialect = db.session.get_bind().dialect
+    if dialect.name == 'sqlite':
+        return dialect.dbapi.sqlite_version_info >= (3, 25)
+    return True
+
+
+def _grouped(model, columns, revision_ids):
+    # (revision id, count, best, median, best, median...) for each revision
+    # with results. Each score is numbered among its revision's non-NULL
+    # scores of that column, and the median is then the middle one, or the
+    # mean of the middle two.
+    numbered = []
+    for i, column in enumerate(columns):
+        window = {'partition_by': model.revision_id}
+        numbered += [
+            db.func.row_number().over(
+                order_by=(column.is_(None), column), **window)
+            .label('position{}'.format(i)),
+            db.func.count(column).over(**window).label('of{}'.format(i))]
+    ranked = db.session.query(model.revision_id, *(columns + numbered)) \
+        .filter(model.revision_id.in_(revision_ids)).subquery()
+    summaries = []
+    for i, column in enumerate(columns):
+        value = ranked.c[column.name]
+        position = ranked.c['position{}'.format(i)]
+        of = ranked.c['of{}'.format(i)]
+        middle = db.and_(value.isnot(None), position >= (of + 1) / 2,
+                         position <= (of + 2) / 2)
+        summaries += [db.func.max(value),
+                      db.func.avg(db.case([(middle, value)]))]
+    return db.session.query(ranked.c.revision_id, db.func.count(),
+                            *summaries).group_by(ranked.c.revision_id)
+
+
+def _grouped_in_python(model, columns, revision_ids):
+    # the same as _grouped, for a database without window functions: the
+    # scores come back and the medians are worked out here instead
+    scores = {}
+    for row in db.session.query(model.revision_id, *columns) \
+            .filter(model.revision_id.in_(revision_ids)):
+        scores.setdefault(row[0], []).append(row[1:])
+    for revision_id, rows in scores.items():
+        summary = [revision_id, len(rows)]
+        for values in zip(*rows):
+            values = sorted(value for value in values if value is not None)
+            summary += [values[-1], median(values)] if values \
+                else [None, None]
+        yield summary
+
+
+def _summaries(revision_ids):
+    # {revision id: {type name: {count, metric: {best, median}}}}
+    found = {id: {} for id in revision_ids}
+    grouped = _grouped if _window_functions() else _grouped_in_python
+    for model, names in _metrics.items():
+        # counted, not serialized, so note what they're counted from
+        depends_on(*('revisions:{}:{}'.format(id, model.__tablename__)
+                     for id in revision_ids))
+        columns = [getattr(model, name) for name in names]
+        for row in grouped(model, columns, revision_ids):
+            revision_id, count, values = row[0], row[1], row[2:]
+            summary = {'count': count}
+            for i, name in enumerate(names):
+                best, middle = values[2 * i:2 * i + 2]
+                summary[name] = {
+                    'best': _number(best) if best is not None else None,
+                    'median': _number(middle) if middle is not None
+                    else None
+                }
+            found[revision_id][type_names[model]] = summary
+    return found
+
+
+class CompareAPI(Resource):
+    @cached(compare_tags)
+    def get(self):
+        if 'revisions' in request.args:
+            ids = _ids('revisions')
+            revisions = narrow(Revision.query, revision_fields) \
+                .filter(Revision.id.in_(ids)).all()
+            by_id = {revision.id: revision for revision in revisions}
+        elif 'machines' in request.args:
+            ids = _ids('machines')
+            revisions = narrow(Revision.query, revision_fields) \
+                .add_columns(Machine.id) \
+                .join(Machine, Machine.active_revision_id == Revision.id) \
+                .filter(Machine.id.in_(ids)).all()
+            by_id = {machine_id: revision
+                     for revision, machine_id in revisions}
+            revisions = list(by_id.values())
+        else:
+            abort(400, message='Give either revisions= or machines=')
+        missing = [id for id in ids if id not in by_id]
+        if missing:
+            abort(404, message='Nothing to compare for {}'.format(
+                ', '.join(str(id) for id in missing)))
+
+        summaries = _summaries([revision.id for revision in revisions])
+        return {'revisions': [
+            {'revision': serialize(by_id[id], revision_fields),
+             'benchmarks': summaries[by_id[id].id]}
+            for id in ids]}
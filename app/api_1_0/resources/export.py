@@ -0,0 +1,25 @@
+from dateutil import parser
+from flask import Response, request, stream_with_context
+from flask_restful import Resource, abort
+from ...exporter import formats, kinds
+
+
+class ExportAPI(Resource):
+    def get(self, kind):
+        if kind not in kinds:
+            abort(404, message='Nothing to export called {!r}'.format(kind))
+        format = request.args.get('format', 'ndjson')
+        if format not in formats:
+            abort(400, message='format must be one of ' +
+                  ', '.join(sorted(formats)))
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = parser.parse(since)
+            except (ValueError, OverflowError):
+                abort(400, message='Invalid since date')
+        generate, mimetype = formats[format]
+        return Response(
+            stream_with_context(generate(kind, since)), mimetype=mimetype,
+            headers={'Content-Disposition': 'attachment; filename={}.{}'
+                     .format(kind, format)})
@@ -1,8 +1,14 @@
-from flask_restful import Resource, reqparse, fields, marshal_with
+from flask_restful import Resource, reqparse, fields
 from dateutil import parser
 from flask_jwt_extended import jwt_required
-from .revisions import revision_fields
-from ... import db
+from .revisions import revision_fields, revision_tags
+from .queued import write_behind
+from ..cache import cached, touch
+from ..filters import filtered
+from ..loading import narrow
+from ..pagination import paginate
+from ..serializers import serialize_with
+from ... import db, leaderboards
 
 
 futuremark3dmark06result_fields = {
@@ -23,15 +29,19 @@ futuremark3dmark06result_fields = {
     'uri': fields.Url('.futuremark3dmark06result', absolute=True)
 }
 
+futuremark3dmark06result_tags = ('futuremark3dmark06results',) + revision_tags
+
 
 from ...models import Revision, Futuremark3DMark06Result
 
+
 class Futuremark3DMark06ResultListAPI(Resource):
-    @marshal_with(futuremark3dmark06result_fields,
-                  envelope='futuremark3dmark06results')
+    @cached(futuremark3dmark06result_tags, 'futuremark3dmark06results')
     def get(self):
-        return Futuremark3DMark06Result.query.order_by(
-            Futuremark3DMark06Result.overall_score.desc()).all()
+        return paginate(filtered(Futuremark3DMark06Result.query),
+                        Futuremark3DMark06Result.overall_score,
+                        futuremark3dmark06result_fields,
+                        'futuremark3dmark06results')
 
 
 class Futuremark3DMark06ResultAPI(Resource):
@@ -53,14 +63,16 @@ class Futuremark3DMark06ResultAPI(Resource):
         self.reqparse.add_argument('result_url', type=str, location='json')
         super(Futuremark3DMark06ResultAPI, self).__init__()
 
-    @marshal_with(futuremark3dmark06result_fields,
-                  envelope='futuremark3dmark06result')
+    @cached(futuremark3dmark06result_tags)
+    @serialize_with(futuremark3dmark06result_fields,
+                    envelope='futuremark3dmark06result')
     def get(self, id):
-        return Futuremark3DMark06Result.query.get_or_404(id)
+        return narrow(Futuremark3DMark06Result.query,
+                      futuremark3dmark06result_fields).get_or_404(id)
 
     @jwt_required
-    @marshal_with(futuremark3dmark06result_fields,
-                  envelope='futuremark3dmark06result')
+    @serialize_with(futuremark3dmark06result_fields,
+                    envelope='futuremark3dmark06result')
     def put(self, id):
         futuremark3dmark06result = Futuremark3DMark06Result.query.get_or_404(
             id)
@@ -72,14 +84,20 @@ class Futuremark3DMark06ResultAPI(Resource):
                     setattr(futuremark3dmark06result, k, parser.parse(v))
                 else:
                     setattr(futuremark3dmark06result, k, v)
+        touch(futuremark3dmark06result)
         db.session.commit()
+        leaderboards.record(futuremark3dmark06result)
         return futuremark3dmark06result
 
     @jwt_required
     def delete(self, id):
+        futuremark3dmark06result = Futuremark3DMark06Result.query.get(id)
+        if futuremark3dmark06result is not None:
+            touch(futuremark3dmark06result)
         Futuremark3DMark06Result.query\
             .filter(Futuremark3DMark06Result.id == id).delete()
         db.session.commit()
+        leaderboards.discard(Futuremark3DMark06Result, id)
         return {'result': True}
 
 
@@ -102,15 +120,19 @@ class RevisionFuturemark3DMark06ResultListAPI(Resource):
         self.reqparse.add_argument('result_url', type=str, location='json')
         super(RevisionFuturemark3DMark06ResultListAPI, self).__init__()
 
-    @marshal_with(futuremark3dmark06result_fields,
-                  envelope='futuremark3dmark06results')
+    @cached(futuremark3dmark06result_tags,
+            'revisions:{id}:futuremark3dmark06results')
     def get(self, id):
         revision = Revision.query.get_or_404(id)
-        return revision.futuremark3dmark06results.all()
+        return paginate(filtered(revision.futuremark3dmark06results),
+                        Futuremark3DMark06Result.overall_score,
+                        futuremark3dmark06result_fields,
+                        'futuremark3dmark06results')
 
     @jwt_required
-    @marshal_with(futuremark3dmark06result_fields,
-                  envelope='futuremark3dmark06result')
+    @write_behind('futuremark3dmark06result')
+    @serialize_with(futuremark3dmark06result_fields,
+                    envelope='futuremark3dmark06result')
     def post(self, id):
         args = self.reqparse.parse_args()
 
@@ -137,6 +159,8 @@ class RevisionFuturemark3DMark06ResultListAPI(Resource):
 
         futuremark3dmark06result.revision_id = revision.id
         db.session.add(futuremark3dmark06result)
+        touch(futuremark3dmark06result)
         db.session.commit()
+        leaderboards.record(futuremark3dmark06result)
 
         return futuremark3dmark06result, 201
@@ -1,9 +1,14 @@
-from flask_restful import Resource, reqparse, fields, marshal_with
+from flask_restful import Resource, reqparse, fields
 from dateutil import parser
-from sqlalchemy import desc
 from flask_jwt_extended import jwt_required
-from .revisions import revision_fields
-from ... import db
+from .revisions import revision_fields, revision_tags
+from .queued import write_behind
+from ..cache import cached, touch
+from ..filters import filtered
+from ..loading import narrow
+from ..pagination import paginate
+from ..serializers import serialize_with
+from ... import db, leaderboards
 from ...models import Revision, Futuremark3DMarkResult
 
 
@@ -19,21 +24,21 @@ futuremark3dmarkresult_fields = {
     'skydiver_score': fields.Integer(default=None),
     'skydiver_result_url': fields.String,
     'overall_result_url': fields.String,
+    'aggregate_score': fields.Integer,
     'revision': fields.Nested(revision_fields),
     'uri': fields.Url('.futuremark3dmarkresult', absolute=True)
 }
 
+futuremark3dmarkresult_tags = ('futuremark3dmarkresults',) + revision_tags
+
 
 class Futuremark3DMarkResultListAPI(Resource):
-    @marshal_with(futuremark3dmarkresult_fields,
-                  envelope='futuremark3dmarkresults')
+    @cached(futuremark3dmarkresult_tags, 'futuremark3dmarkresults')
     def get(self):
-        # order by sum of all scores to come up with kinda "aggregate score"
-        return Futuremark3DMarkResult.query.order_by(desc(
-            Futuremark3DMarkResult.icestorm_score +
-            Futuremark3DMarkResult.cloudgate_score +
-            Futuremark3DMarkResult.firestrike_score +
-            Futuremark3DMarkResult.skydiver_score)).all()
+        return paginate(filtered(Futuremark3DMarkResult.query),
+                        Futuremark3DMarkResult.aggregate_score,
+                        futuremark3dmarkresult_fields,
+                        'futuremark3dmarkresults')
 
 
 class Futuremark3DMarkResultAPI(Resource):
@@ -61,14 +66,16 @@ class Futuremark3DMarkResultAPI(Resource):
                                    location='json')
         super(Futuremark3DMarkResultAPI, self).__init__()
 
-    @marshal_with(futuremark3dmarkresult_fields,
-                  envelope='futuremark3dmarkresult')
+    @cached(futuremark3dmarkresult_tags)
+    @serialize_with(futuremark3dmarkresult_fields,
+                    envelope='futuremark3dmarkresult')
     def get(self, id):
-        return Futuremark3DMarkResult.query.get_or_404(id)
+        return narrow(Futuremark3DMarkResult.query,
+                      futuremark3dmarkresult_fields).get_or_404(id)
 
     @jwt_required
-    @marshal_with(futuremark3dmarkresult_fields,
-                  envelope='futuremark3dmarkresult')
+    @serialize_with(futuremark3dmarkresult_fields,
+                    envelope='futuremark3dmarkresult')
     def put(self, id):
         futuremark3dmarkresult = Futuremark3DMarkResult.query.get_or_404(id)
         args = self.reqparse.parse_args()
@@ -79,14 +86,20 @@ class Futuremark3DMarkResultAPI(Resource):
                     setattr(futuremark3dmarkresult, k, parser.parse(v))
                 else:
                     setattr(futuremark3dmarkresult, k, v)
+        touch(futuremark3dmarkresult)
         db.session.commit()
+        leaderboards.record(futuremark3dmarkresult)
         return futuremark3dmarkresult
 
     @jwt_required
     def delete(self, id):
+        futuremark3dmarkresult = Futuremark3DMarkResult.query.get(id)
+        if futuremark3dmarkresult is not None:
+            touch(futuremark3dmarkresult)
         Futuremark3DMarkResult.query.filter(
                                     Futuremark3DMarkResult.id == id).delete()
         db.session.commit()
+        leaderboards.discard(Futuremark3DMarkResult, id)
         return {'result': True}
 
 
@@ -115,15 +128,19 @@ class RevisionFuturemark3DMarkResultListAPI(Resource):
                                    type=str, location='json')
         super(RevisionFuturemark3DMarkResultListAPI, self).__init__()
 
-    @marshal_with(futuremark3dmarkresult_fields,
-                  envelope='futuremark3dmarkresults')
+    @cached(futuremark3dmarkresult_tags,
+            'revisions:{id}:futuremark3dmarkresults')
     def get(self, id):
         revision = Revision.query.get_or_404(id)
-        return revision.futuremark3dmarkresults.all()
+        return paginate(filtered(revision.futuremark3dmarkresults),
+                        Futuremark3DMarkResult.aggregate_score,
+                        futuremark3dmarkresult_fields,
+                        'futuremark3dmarkresults')
 
     @jwt_required
-    @marshal_with(futuremark3dmarkresult_fields,
-                  envelope='futuremark3dmarkresult')
+    @write_behind('futuremark3dmarkresult')
+    @serialize_with(futuremark3dmarkresult_fields,
+                    envelope='futuremark3dmarkresult')
     def post(self, id):
         args = self.reqparse.parse_args()
 
@@ -148,6 +165,8 @@ class RevisionFuturemark3DMarkResultListAPI(Resource):
 
         futuremark3dmarkresult.revision_id = revision.id
         db.session.add(futuremark3dmarkresult)
+        touch(futuremark3dmarkresult)
         db.session.commit()
+        leaderboards.record(futuremark3dmarkresult)
 
         return futuremark3dmarkresult, 201
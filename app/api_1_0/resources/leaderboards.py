@@ -0,0 +1,97 @@
+from flask import request
+from flask_restful import Resource, abort
+from .cinebenchr15results import (cinebenchr15result_fields,
+                                  cinebenchr15result_tags)
+from .futuremark3dmark06results import (futuremark3dmark06result_fields,
+                                        futuremark3dmark06result_tags)
+from .futuremark3dmarkresults import (futuremark3dmarkresult_fields,
+                                      futuremark3dmarkresult_tags)
+from .. import api_blueprint
+from ..cache import cached, depends_on
+from ..fieldsets import requested_fields
+from ..loading import narrow
+from ..pagination import page_limit
+from ..serializers import serialize
+from ...leaderboards import boards
+from ...models import (CinebenchR15Result, Futuremark3DMark06Result,
+                       Futuremark3DMarkResult)
+
+
+result_fields = {
+    CinebenchR15Result: cinebenchr15result_fields,
+    Futuremark3DMark06Result: futuremark3dmark06result_fields,
+    Futuremark3DMarkResult: futuremark3dmarkresult_fields
+}
+
+leaderboard_tags = cinebenchr15result_tags + futuremark3dmark06result_tags + \
+    futuremark3dmarkresult_tags
+
+
+@api_blueprint.before_app_first_request
+def build_leaderboards():
+    # pay for loading the scores when the worker starts up, not on
+    # whichever leaderboard request happens to come in first
+    for board in boards.values():
+        board.ensure()
+
+
+def get_board(metric):
+    board = boards.get(metric)
+    if board is None:
+        abort(404, message='No leaderboard for {!r}'.format(metric))
+    # the ranking changes with any write to the board's table
+    depends_on(board.table)
+    return board.ensure()
+
+
+def radius():
+    return max(0, min(request.args.get('radius', 5, type=int), 50))
+
+
+def ranked(board, entries):
+    # one query for the results themselves, however many entries there are
+    field_map = requested_fields(result_fields[board.model])
+    ids = [id for rank, id, score in entries]
+    results = {}
+    if ids:
+        results = {result.id: result for result in
+                   narrow(board.model.query, field_map)
+                   .filter(board.model.id.in_(ids))}
+    # a result deleted since the board was read is off the board by the
+    # next request, so just leave it out of this one
+    return {
+        'leaderboard': board.name,
+        'total': len(board),
+        'results': [{'rank': rank,
+                     'score': score,
+                     'result': serialize(results[id], field_map)}
+                    for rank, id, score in entries if id in results]
+    }
+
+
+class LeaderboardAPI(Resource):
+    @cached(leaderboard_tags)
+    def get(self, metric):
+        board = get_board(metric)
+        return ranked(board, board.top(page_limit()))
+
+
+class LeaderboardResultAPI(Resource):
+    @cached(leaderboard_tags)
+    def get(self, metric, id):
+        board = get_board(metric)
+        rank = board.rank(id)
+        if rank is None:
+            abort(404, message='Result {} is not on the {!r} leaderboard'
+                  .format(id, metric))
+        return dict(ranked(board, board.around(rank, radius())), rank=rank)
+
+
+class LeaderboardRankAPI(Resource):
+    @cached(leaderboard_tags)
+    def get(self, metric, rank):
+        board = get_board(metric)
+        if not 1 <= rank <= len(board):
+            abort(404, message='The {!r} leaderboard has no rank {}'
+                  .format(metric, rank))
+        return dict(ranked(board, board.around(rank, radius())), rank=rank)
@@ -1,9 +1,14 @@
 from flask import g
-from flask_restful import Resource, reqparse, fields, marshal_with
+from flask_restful import Resource, reqparse, fields
 from dateutil import parser
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from ... import db
-from .users import user_fields
+from .users import user_fields, user_tags
+from ..cache import cached, touch
+from ..loading import narrow
+from ..pagination import paginate
+from ..serializers import serialize_with
+from ...decorators import current_user_id
 from ...models import User, Machine
 
 
@@ -38,6 +43,8 @@ machine_fields = {
     'user': fields.Nested(user_fields)
 }
 
+machine_tags = ('machines', 'revisions') + user_tags
+
 
 # View subclass of Resource (which inherits from MethodView)
 class MachineListAPI(Resource):
@@ -54,12 +61,13 @@ class MachineListAPI(Resource):
                                    location='json')
         super(MachineListAPI, self).__init__()
 
-    @marshal_with(machine_fields, envelope='machines')
+    @cached(machine_tags, 'machines')
     def get(self):
-        return Machine.query.order_by(Machine.timestamp.desc()).all()
+        return paginate(Machine.query, Machine.timestamp, machine_fields,
+                        'machines')
 
     @jwt_required
-    @marshal_with(machine_fields, envelope='machine')
+    @serialize_with(machine_fields, envelope='machine')
     def post(self):
         args = self.reqparse.parse_args()
 
@@ -67,17 +75,15 @@ class MachineListAPI(Resource):
         ts = None # set to none if not provided next
         if args['timestamp'] is not None:
             ts = parser.parse(args['timestamp'])
-        current_username = get_jwt_identity()
-        current_user = User.find_by_username(current_username)
-
         machine = Machine(system_name=args['system_name'],
                           system_notes=args['system_notes'],
                           owner=args['owner'],
                           timestamp=ts,
                           active_revision_id=None,
-                          author_id=current_user.id)
+                          author_id=current_user_id())
 
         db.session.add(machine)
+        touch(machine)
         db.session.commit()
         return machine, 201
 
@@ -95,14 +101,15 @@ class UserMachineListAPI(Resource):
                                    location='json')
         super(UserMachineListAPI, self).__init__()
 
-    @marshal_with(machine_fields, envelope='machines')
+    @cached(machine_tags, 'users:{id}:machines')
     def get(self, id):
-        return User.query.get(id
-                        ).machines.order_by(Machine.timestamp.desc()).all()
+        user = User.query.get_or_404(id)
+        return paginate(user.machines, Machine.timestamp, machine_fields,
+                        'machines')
 
     # @jwt_required
     @jwt_required
-    @marshal_with(machine_fields, envelope='machine')
+    @serialize_with(machine_fields, envelope='machine')
     def post(self, id):
         args = self.reqparse.parse_args()
 
@@ -118,6 +125,7 @@ class UserMachineListAPI(Resource):
                           author_id=id)
 
         db.session.add(machine)
+        touch(machine)
         db.session.commit()
         return machine, 201
 
@@ -132,13 +140,14 @@ class MachineAPI(Resource):
                                    location='json')
         super(MachineAPI, self).__init__()
 
-    @marshal_with(machine_fields)
+    @cached(machine_tags)
+    @serialize_with(machine_fields)
     def get(self, id):
-        return Machine.query.get(id)
+        return narrow(Machine.query, machine_fields).get_or_404(id)
 
     # @jwt_required
     @jwt_required
-    @marshal_with(machine_fields, envelope='machine')
+    @serialize_with(machine_fields, envelope='machine')
     def put(self, id):
         machine = Machine.query.get_or_404(id)
 
@@ -157,12 +166,16 @@ class MachineAPI(Resource):
                 else:
                     setattr(machine, k, v)
         # autocommit? This doesn't appear to be necessary---leaving in for now.
+        touch(machine)
         db.session.commit()
         return machine
 
     # @jwt_required
     @jwt_required
     def delete(self, id):
+        machine = Machine.query.get(id)
+        if machine is not None:
+            touch(machine)
         Machine.query.filter(Machine.id == id).delete()
         db.session.commit()
         return {'result': True}
@@ -0,0 +1,22 @@
+from flask import current_app
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+from ...decorators import permission_required
+from ...hashing import hashing
+from ...models import Permission
+from ...writebehind import journal
+
+
+class MetricsAPI(Resource):
+    # how busy the worker is isn't for everyone to see
+    @jwt_required
+    @permission_required(Permission.ADMINISTER)
+    def get(self):
+        metrics = {'hashing': hashing.metrics()}
+        if current_app.config['WRITE_BEHIND']:
+            queued, oldest = journal.depth()
+            metrics['write_behind'] = {
+                'queued': queued,
+                'oldest': oldest.isoformat() if oldest is not None else None
+            }
+        return metrics
@@ -0,0 +1,102 @@
+from datetime import datetime
+from functools import wraps
+from flask import current_app, jsonify, request, url_for
+from flask_restful import Resource, abort
+from .. import api_blueprint
+from ...bulk import parse_result
+from ...models import Revision
+from ...writebehind import journal
+
+
+# Result submissions taken under WRITE_BEHIND (see writebehind.py): they're
+# answered with a 202 and the id of their journal entry instead of the
+# result, and /queued/<id> (or /queued?ids=1,2,3) says whether each has been
+# saved yet, and once it has, where the result is.
+
+
+@api_blueprint.before_app_first_request
+def start_flusher():
+    if current_app.config['WRITE_BEHIND']:
+        journal.start(current_app._get_current_object())
+
+
+def queue_results(revision_id, items, now=None):
+    """Queue `items` (already checked with parse_result) for
+    `revision_id`, returning what the 202 says about each.
+    """
+    ids = journal.enqueue(revision_id, items, now)
+    return [{'index': index, 'type': item['type'], 'id': id,
+             'status': 'queued',
+             'uri': url_for('.queued', id=id, _external=True)}
+            for index, (item, id) in enumerate(zip(items, ids))]
+
+
+def write_behind(type_name):
+    """Queue what a single result POST would save, under WRITE_BEHIND.
+
+    Goes above serialize_with, so a queued submission's response isn't
+    taken for the result's.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(resource, id):
+            if not current_app.config['WRITE_BEHIND']:
+                return f(resource, id)
+            args = resource.reqparse.parse_args()
+            item = {key: value for key, value in args.items()
+                    if value is not None}
+            item['type'] = type_name
+            now = datetime.utcnow()
+            try:
+                parse_result(item, now)
+            except ValueError as e:
+                abort(400, message='Nothing was queued', errors=e.args[0])
+            revision = Revision.query.get_or_404(id)
+            queued, = queue_results(revision.id, [item], now)
+            del queued['index']
+            response = jsonify({'queued': queued})
+            response.status_code = 202
+            response.headers['Location'] = queued['uri']
+            return response
+        return wrapper
+    return decorator
+
+
+def _entry(id, entry):
+    result = None
+    if entry['result_id'] is not None:
+        result = url_for('.' + entry['type'], id=entry['result_id'],
+                         _external=True)
+    return {'id': id,
+            'type': entry['type'],
+            'status': entry['status'],
+            'revision': url_for('.revision', id=entry['revision_id'],
+                                _external=True),
+            'result': result,
+            'errors': entry['error'],
+            'received_at': entry['received_at'].isoformat(),
+            'saved_at': entry['saved_at'].isoformat()
+            if entry['saved_at'] is not None else None}
+
+
+class QueuedAPI(Resource):
+    def get(self, id=None):
+        if id is not None:
+            entry = journal.status([id]).get(id)
+            if entry is None:
+                abort(404, message='No queued submission {} (it may have '
+                                   'been pruned)'.format(id))
+            return {'queued': _entry(id, entry)}
+
+        try:
+            ids = [int(id) for id in request.args.get('ids', '').split(',')
+                   if id]
+        except ValueError:
+            abort(400, message='ids must be a comma separated list of ids')
+        limit = current_app.config['API_BULK_LIMIT']
+        if not 1 <= len(ids) <= limit:
+            abort(400, message='Ask after between 1 and {} ids'.format(limit))
+        found = journal.status(ids)
+        return {'queued': [_entry(id, found[id]) for id in ids
+                           if id in found],
+                'missing': [id for id in ids if id not in found]}
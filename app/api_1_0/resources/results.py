@@ -0,0 +1,79 @@
+from datetime import datetime
+from flask import current_app, request, url_for
+from flask_restful import Resource, abort
+from flask_jwt_extended import jwt_required
+from .queued import queue_results
+from ..cache import touch
+from ... import db, leaderboards
+from ...bulk import insert_many, parse_result, type_names
+from ...models import Revision
+
+
+# Submitting a rig's worth of runs for a revision in one request, of any
+# mix of benchmarks. Every item is checked before anything is written, so
+# the batch goes in whole or not at all, and then each benchmark's rows go
+# in with multi-row INSERTs in the one transaction.
+#
+# {"results": [{"type": "cinebenchr15result", "cpu_cb": 1500, ...}, ...]}
+#
+# Under WRITE_BEHIND the checked batch is queued instead (see queued.py).
+
+
+def insert_results(revision_id, parsed):
+    """Insert parsed (model, row)s for `revision_id` in the current
+    transaction. Returns {model: [row]}, each row with its new id.
+    """
+    by_model = {}
+    for model, row in parsed:
+        row['revision_id'] = revision_id
+        by_model.setdefault(model, []).append(row)
+    for model, rows in by_model.items():
+        ids = insert_many(model.__table__, rows)
+        for row, id in zip(rows, ids):
+            row['id'] = id
+    return by_model
+
+
+def table_rows(by_model):
+    """insert_results' rows as touch() takes them."""
+    return {model.__tablename__: rows for model, rows in by_model.items()}
+
+
+class RevisionResultListAPI(Resource):
+    @jwt_required
+    def post(self, id):
+        items = (request.get_json(silent=True) or {}).get('results')
+        if not isinstance(items, list) or not items:
+            abort(400, message='Expected a non-empty "results" list')
+        limit = current_app.config['API_BULK_LIMIT']
+        if len(items) > limit:
+            abort(400, message='At most {} results at a time'.format(limit))
+
+        revision = Revision.query.get_or_404(id)
+
+        now = datetime.utcnow()
+        parsed, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                parsed.append(parse_result(item, now))
+            except ValueError as e:
+                errors.append({'index': index, 'errors': e.args[0]})
+        if errors:
+            abort(400, message='No results were saved', errors=errors)
+
+        if current_app.config['WRITE_BEHIND']:
+            return {'queued': queue_results(revision.id, items, now)}, 202
+
+        by_model = insert_results(revision.id, parsed)
+        touch(rows=table_rows(by_model))
+        db.session.commit()
+        leaderboards.record_rows(by_model)
+
+        # back in the order they were sent
+        saved = []
+        for model, row in parsed:
+            name = type_names[model]
+            saved.append({'index': len(saved), 'type': name, 'id': row['id'],
+                          'uri': url_for('.' + name, id=row['id'],
+                                         _external=True)})
+        return {'results': saved}, 201
@@ -1,9 +1,15 @@
 from flask import g
-from flask_restful import Resource, reqparse, fields, marshal_with
+from flask_restful import Resource, reqparse, fields
 from dateutil import parser
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from .machines import machine_fields
+from flask_jwt_extended import jwt_required
+from .machines import machine_fields, machine_tags
+from ..cache import cached, touch
+from ..filters import filtered
+from ..loading import narrow
+from ..pagination import paginate
+from ..serializers import serialize_with
 from ... import db
+from ...decorators import current_user_id
 from ...models import Machine, Revision, User
 
 
@@ -28,12 +34,15 @@ revision_fields = {
     'uri': fields.Url('.revision', absolute=True)
 }
 
+revision_tags = ('revisions',) + machine_tags
+
 
 # global revision list
 class RevisionListAPI(Resource):
-    @marshal_with(revision_fields, envelope='revisions')
+    @cached(revision_tags, 'revisions')
     def get(self):
-        return Revision.query.order_by(Revision.timestamp.desc()).all()
+        return paginate(filtered(Revision.query), Revision.timestamp,
+                        revision_fields, 'revisions')
 
 
 class RevisionAPI(Resource):
@@ -59,12 +68,13 @@ class RevisionAPI(Resource):
                                    location='json')
         super(RevisionAPI, self).__init__()
 
-    @marshal_with(revision_fields, envelope='revision')
+    @cached(revision_tags)
+    @serialize_with(revision_fields, envelope='revision')
     def get(self, id):
-        return Revision.query.get_or_404(id)
+        return narrow(Revision.query, revision_fields).get_or_404(id)
 
     @jwt_required
-    @marshal_with(revision_fields, envelope='revision')
+    @serialize_with(revision_fields, envelope='revision')
     def put(self, id):
         revision = Revision.query.get_or_404(id)
         args = self.reqparse.parse_args()
@@ -76,11 +86,19 @@ class RevisionAPI(Resource):
                     setattr(revision, k, parser.parse(v))
                 else:
                     setattr(revision, k, v)
+        touch(revision)
         db.session.commit()
         return revision
 
     @jwt_required
     def delete(self, id):
+        revision = Revision.query.get(id)
+        if revision is not None:
+            touch(revision)
+            # the database clears the machine's active_revision_id (ON
+            # DELETE SET NULL), which changes the machine as well
+            if revision.active_revision_of is not None:
+                touch(revision.active_revision_of)
         Revision.query.filter(Revision.id == id).delete()
         db.session.commit()
         return {'result': True}
@@ -110,13 +128,14 @@ class MachineRevisionListAPI(Resource):
                                    location='json')
         super(MachineRevisionListAPI, self).__init__()
 
-    @marshal_with(revision_fields, envelope='revisions')
+    @cached(revision_tags, 'machines:{id}:revisions')
     def get(self, id):
         machine = Machine.query.get_or_404(id)
-        return machine.revisions.order_by(Revision.timestamp.desc()).all()
+        return paginate(filtered(machine.revisions), Revision.timestamp,
+                        revision_fields, 'revisions')
 
     @jwt_required
-    @marshal_with(revision_fields, envelope='revision')
+    @serialize_with(revision_fields, envelope='revision')
     def post(self, id):
         args = self.reqparse.parse_args()
 
@@ -126,8 +145,6 @@ class MachineRevisionListAPI(Resource):
         except TypeError:
             ts = None # none will use the model's default (current time)
 
-        current_username = get_jwt_identity()
-        current_user = User.find_by_username(current_username)
         machine = Machine.query.get_or_404(id)
 
         revision = Revision(
@@ -146,15 +163,16 @@ class MachineRevisionListAPI(Resource):
             revision_notes=args['revision_notes'],
             pcpartpicker_url=args['pcpartpicker_url'],
             timestamp=ts,
-            author_id=current_user.id)
+            author_id=current_user_id())
 
         machine.revisions.append(revision)
 
-        # commit once to get the id of the revision
-        db.session.commit()
+        # flush to get the id of the revision
+        db.session.flush()
         # set the Machine.active_revision_id to this revision
         machine.active_revision_id = revision.id
-        # commit again to save the new active_revision_id
+        # and save both together
+        touch(revision, machine)
         db.session.commit()
 
         return revision, 201
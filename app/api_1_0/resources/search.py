@@ -0,0 +1,26 @@
+from flask import request
+from flask_restful import Resource, abort
+from .machines import machine_fields
+from .revisions import revision_fields, revision_tags
+from ..cache import cached
+from ..pagination import paginate
+from ...search import search, searched, terms
+
+
+search_fields = {
+    'machines': machine_fields,
+    'revisions': revision_fields
+}
+
+
+class SearchAPI(Resource):
+    @cached(revision_tags, '{kind}')
+    def get(self, kind):
+        if kind not in searched:
+            abort(404, message='Nothing to search called {!r}'.format(kind))
+        words = terms(request.args.get('q'))
+        if not words:
+            abort(400, message='Nothing to search for, use ?q=')
+        query, rank = search(kind, words)
+        # best match first, as a page like any other list
+        return paginate(query, rank, search_fields[kind], kind)
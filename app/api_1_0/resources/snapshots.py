@@ -0,0 +1,27 @@
+import io
+import numpy as np
+from flask import Response
+from flask_restful import Resource, abort
+from .cinebenchr15results import cinebenchr15result_tags
+from .futuremark3dmark06results import futuremark3dmark06result_tags
+from .futuremark3dmarkresults import futuremark3dmarkresult_tags
+from ..cache import cached
+from ...snapshot import snapshot, tables
+
+
+snapshot_tags = cinebenchr15result_tags + futuremark3dmark06result_tags + \
+    futuremark3dmarkresult_tags
+
+
+class SnapshotAPI(Resource):
+    @cached(snapshot_tags)
+    def get(self, table):
+        if table not in tables:
+            abort(404, message='No snapshot of {!r}'.format(table))
+        # one array per column (see app/snapshot.py), np.load() reads it
+        data = io.BytesIO()
+        np.savez(data, **snapshot(table))
+        return Response(
+            data.getvalue(), mimetype='application/octet-stream',
+            headers={'Content-Disposition': 'attachment; filename={}.npz'
+                     .format(table)})
@@ -0,0 +1,24 @@
+from flask import request
+from flask_restful import Resource, abort
+from .snapshots import snapshot_tags
+from ..cache import cached, depends_on
+from ..pagination import page_limit
+from ...stats import distribution, group_fields, metrics
+
+
+class StatsAPI(Resource):
+    @cached(snapshot_tags)
+    def get(self, metric):
+        if metric not in metrics:
+            abort(404, message='No statistics for {!r}'.format(metric))
+        group_by = request.args.get('group_by')
+        if group_by is not None and group_by not in group_fields:
+            abort(400, message='group_by must be one of ' +
+                  ', '.join(group_fields))
+        # nothing here is serialized from rows, it all comes out of the
+        # snapshot, which is rebuilt on any write to these
+        depends_on(metrics[metric].__tablename__, 'revisions')
+        bins = max(1, min(request.args.get('bins', 20, type=int), 200))
+        min_count = request.args.get('min_count', 1, type=int)
+        return distribution(metric, group_by, bins, min_count,
+                            page_limit() if group_by else None)
@@ -0,0 +1,130 @@
+from flask import current_app, request
+from flask_restful import Resource, abort
+from dateutil import parser
+from flask_jwt_extended import jwt_required
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.exceptions import HTTPException
+from .machines import MachineListAPI, machine_fields
+from .results import insert_results, table_rows
+from .revisions import MachineRevisionListAPI, revision_fields
+from .cinebenchr15results import cinebenchr15result_fields
+from .futuremark3dmark06results import futuremark3dmark06result_fields
+from .futuremark3dmarkresults import futuremark3dmarkresult_fields
+from ..cache import touch
+from ..serializers import serialize
+from ... import db, leaderboards
+from ...bulk import parse_result, type_names
+from ...decorators import current_user_id
+from ...models import (Machine, Revision, CinebenchR15Result,
+                       Futuremark3DMark06Result, Futuremark3DMarkResult)
+
+
+# A whole system in one request: the machine, its first revision (which
+# becomes the active one) and any results for it, all in one transaction.
+#
+# {"machine": {"system_name": ...}, "revision": {"cpu_name": ...},
+#  "results": [{"type": "cinebenchr15result", "cpu_cb": 1500}, ...]}
+#
+# The machine and revision take the same fields as POST /machines and
+# POST /machines/<id>/revisions, and the results the same as
+# POST /revisions/<id>/results. Each comes back the way its own endpoint
+# would return it.
+
+result_fields = {
+    CinebenchR15Result: cinebenchr15result_fields,
+    Futuremark3DMark06Result: futuremark3dmark06result_fields,
+    Futuremark3DMarkResult: futuremark3dmarkresult_fields
+}
+
+
+class _Part(object):
+    # what reqparse reads location='json' arguments from
+    def __init__(self, json):
+        self.json = json
+
+
+def _parse(reqparse, part):
+    if not isinstance(part, dict):
+        raise ValueError('must be an object')
+    try:
+        args = reqparse.parse_args(req=_Part(part))
+        if args.get('timestamp') is not None:
+            args['timestamp'] = parser.parse(args['timestamp'])
+    except HTTPException as e:
+        raise ValueError(getattr(e, 'data', {}).get('message', e.description))
+    except (ValueError, OverflowError):
+        raise ValueError({'timestamp': 'not a date'})
+    return args
+
+
+def _loaded(model, row, revision):
+    # stands in for a result inserted with Core, so it can be serialized
+    # with the revision it belongs to without querying it back
+    result = model(**row)
+    set_committed_value(result, 'revision', revision)
+    return result
+
+
+class SubmissionAPI(Resource):
+    def __init__(self):
+        self.machine_parser = MachineListAPI().reqparse
+        self.revision_parser = MachineRevisionListAPI().reqparse
+        super(SubmissionAPI, self).__init__()
+
+    @jwt_required
+    def post(self):
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            abort(400, message='Expected a JSON object')
+        items = data.get('results') or []
+        if not isinstance(items, list):
+            abort(400, message='"results" must be a list')
+        limit = current_app.config['API_BULK_LIMIT']
+        if len(items) > limit:
+            abort(400, message='At most {} results at a time'.format(limit))
+
+        # check everything before writing anything
+        errors = {}
+        try:
+            machine_args = _parse(self.machine_parser, data.get('machine'))
+        except ValueError as e:
+            errors['machine'] = e.args[0]
+        try:
+            revision_args = _parse(self.revision_parser,
+                                   data.get('revision') or {})
+        except ValueError as e:
+            errors['revision'] = e.args[0]
+        parsed, result_errors = [], []
+        for index, item in enumerate(items):
+            try:
+                parsed.append(parse_result(item))
+            except ValueError as e:
+                result_errors.append({'index': index, 'errors': e.args[0]})
+        if result_errors:
+            errors['results'] = result_errors
+        if errors:
+            abort(400, message='Nothing was saved', errors=errors)
+
+        author_id = current_user_id()
+        machine = Machine(author_id=author_id, **machine_args)
+        revision = Revision(author_id=author_id, **revision_args)
+        machine.revisions.append(revision)
+        db.session.add(machine)
+        # flushing hands out both ids, so the machine can point at its
+        # revision and the results at the revision without a second commit
+        db.session.flush()
+        machine.active_revision_id = revision.id
+        set_committed_value(machine, 'active_revision', revision)
+        by_model = insert_results(revision.id, parsed)
+        touch(machine, revision, rows=table_rows(by_model))
+
+        response = {
+            'machine': serialize(machine, machine_fields),
+            'revision': serialize(revision, revision_fields),
+            'results': [{type_names[model]: serialize(
+                _loaded(model, row, revision), result_fields[model])}
+                for model, row in parsed]
+        }
+        db.session.commit()
+        leaderboards.record_rows(by_model)
+        return response, 201
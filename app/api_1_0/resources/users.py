@@ -1,9 +1,13 @@
-from flask import g
-from flask_restful import Resource, reqparse, fields, marshal_with
+from flask_restful import Resource, reqparse, fields
 from flask_jwt_extended import (create_access_token, create_refresh_token,
-    jwt_required, get_jwt_identity, get_raw_jwt)
+    jwt_required, get_raw_jwt)
+from ..cache import cached, touch
+from ..pagination import paginate
+from ..serializers import serialize_with
 from ... import db
-from ...models import User, RevokedToken
+from ...blacklist import blacklist
+from ...decorators import current_user_id
+from ...models import User
 
 
 # flask_restful fields usage:
@@ -15,6 +19,9 @@ user_fields = {
     'last_seen': fields.DateTime(dt_format='iso8601')
 }
 
+# tables a response built from the field map above is read from
+user_tags = ('users',)
+
 
 # List of users
 class UserListAPI(Resource):
@@ -26,16 +33,17 @@ class UserListAPI(Resource):
                                    location='json')
         super(UserListAPI, self).__init__()
 
-    @marshal_with(user_fields, envelope='users')
+    @cached(user_tags, 'users')
     def get(self):
-        return User.query.all()
+        return paginate(User.query, None, user_fields, 'users')
 
-    @marshal_with(user_fields, envelope='user')
+    @serialize_with(user_fields, envelope='user')
     def post(self):
         args = self.reqparse.parse_args()
         user = User(username=args['username'])
         user.hash_password(args['password'])
         db.session.add(user)
+        touch(user)
         db.session.commit()
         access_token = create_access_token(identity=args['username'])
         refresh_token = create_refresh_token(identity=args['username'])
@@ -52,17 +60,18 @@ class UserAPI(Resource):
                                    location='json')
         super(UserAPI, self).__init__()
 
-    @marshal_with(user_fields, envelope='user')
+    @cached(user_tags)
+    @serialize_with(user_fields, envelope='user')
     def get(self, id):
         return User.query.get_or_404(id)
 
     @jwt_required
-    @marshal_with(user_fields, envelope='user')
+    @serialize_with(user_fields, envelope='user')
     def put(self, id):
         user = User.query.get_or_404(id)
 
         # only currently logged in user allowed to change their login or pass
-        if g.user.username == get_jwt_identity():
+        if current_user_id() == user.id:
             # as seen in other places, loop through supplied args to apply
             # the difference is that we're watching out for the password
             args = self.reqparse.parse_args()
@@ -73,6 +82,10 @@ class UserAPI(Resource):
                     else:
                         user.hash_password(v)
 
+            # the tokens they logged in with go out of date along with it
+            user.auth_version += 1
+            touch(user)
+            blacklist.changed()
             db.session.commit()
             return user, 201
         else:
@@ -82,10 +95,9 @@ class UserAPI(Resource):
 class UserLogoutAPI(Resource):
     @jwt_required
     def post(self):
-        jti = get_raw_jwt()['jti']
+        raw_jwt = get_raw_jwt()
         try:
-            revoked_token = RevokedToken(jti = jti)
-            revoked_token.add()
+            blacklist.revoke(raw_jwt['jti'], raw_jwt.get('exp'))
             return {'message': 'Refresh token has been revoked'}
         except:
             return {'message': 'Something went wrong'}, 500
@@ -0,0 +1,177 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+from functools import wraps
+from urllib.parse import urlparse, urlunparse
+from flask import request, url_for
+from flask_restful import fields
+from flask_restful.fields import MarshallingException
+from flask_restful.utils import unpack
+from werkzeug.routing import BuildError
+from .cache import record_rows
+from .fieldsets import requested_fields
+
+
+# A stand-in for flask_restful.marshal. marshal() walks the field map and
+# dispatches through every field object for every row, and fields.Url calls
+# url_for each time too. Here each field map is turned into the source of a
+# plain function once (per field map, at import time), so serializing a row
+# is just attribute reads and the same conversions the fields would apply.
+# The output is meant to be identical to marshal()'s, field for field.
+
+_compiled = {}
+
+# the id we ask url_for to build with, so we can cut it back out and keep
+# the rest of the URL as a template for every other row
+_ID_PLACEHOLDER = 1234567890123
+
+
+class _UrlTemplates(dict):
+    # built once per serialize() call, maps a fields.Url to the
+    # (prefix, suffix) around the id in its URL, or None if the endpoint
+    # can't be built from an id alone
+    def __missing__(self, field):
+        endpoint = field.endpoint if field.endpoint is not None \
+            else request.endpoint
+        template = None
+        try:
+            o = urlparse(url_for(endpoint, _external=field.absolute,
+                                 id=_ID_PLACEHOLDER))
+        except BuildError:
+            o = None
+        if o is not None and not o.query:
+            if field.absolute:
+                scheme = field.scheme if field.scheme is not None \
+                    else o.scheme
+                url = urlunparse((scheme, o.netloc, o.path, "", "", ""))
+            else:
+                url = urlunparse(("", "", o.path, "", "", ""))
+            if url.count(str(_ID_PLACEHOLDER)) == 1:
+                template = tuple(url.split(str(_ID_PLACEHOLDER)))
+        self[field] = template
+        return template
+
+
+def _fixed(precision):
+    zero = Decimal()
+
+    def format(value):
+        dvalue = Decimal(value)
+        if not dvalue.is_normal() and dvalue != zero:
+            raise MarshallingException('Invalid Fixed precision number.')
+        return str(dvalue.quantize(precision, rounding=ROUND_HALF_EVEN))
+    return format
+
+
+def compile_fields(field_map):
+    """Return the serializer function for `field_map`, building it once."""
+    if id(field_map) in _compiled:
+        return _compiled[id(field_map)][1]
+
+    namespace = {'MarshallingException': MarshallingException}
+    lines = ['def serialize(obj, urls):']
+    names = []
+    for n, (key, field) in enumerate(field_map.items()):
+        if isinstance(field, type):
+            field = field()
+        name = 'f{}'.format(n)
+        names.append((key, name))
+        namespace['field{}'.format(n)] = field
+        namespace['default{}'.format(n)] = field.default
+        default = 'default{}'.format(n)
+        source = key if field.attribute is None else field.attribute
+
+        if isinstance(field, fields.Url):
+            lines += [
+                "    t = urls[field{n}]".format(n=n),
+                "    v = getattr(obj, 'id', None)",
+                "    if t is None or v is None:",
+                "        {0} = field{1}.output({2!r}, obj)".format(
+                    name, n, key),
+                "    else:",
+                "        {} = t[0] + str(int(v)) + t[1]".format(name)]
+            continue
+
+        if not isinstance(source, str) or '.' in source or \
+                type(field) not in (fields.Integer, fields.String,
+                                    fields.DateTime, fields.Fixed,
+                                    fields.Nested):
+            # anything unusual just goes through the field itself
+            lines.append("    {0} = field{1}.output({2!r}, obj)".format(
+                name, n, key))
+            continue
+
+        lines.append("    v = getattr(obj, {!r}, None)".format(source))
+        if isinstance(field, fields.Nested):
+            namespace['nested{}'.format(n)] = compile_fields(field.nested)
+            if field.allow_null:
+                empty = 'None'
+            elif field.default is not None:
+                empty = default
+            else:
+                empty = 'nested{}(None, urls)'.format(n)
+            lines.append(
+                "    {0} = {1} if v is None else nested{2}(v, urls)".format(
+                    name, empty, n))
+            continue
+
+        if isinstance(field, fields.Integer):
+            convert = 'int(v)'
+        elif isinstance(field, fields.String):
+            convert = 'str(v)'
+        elif isinstance(field, fields.DateTime) and \
+                field.dt_format == 'iso8601':
+            convert = 'v.isoformat()'
+        else:
+            convert = 'field{}.format(v)'.format(n)
+            if isinstance(field, fields.Fixed):
+                namespace['fixed{}'.format(n)] = _fixed(field.precision)
+                convert = 'fixed{}(v)'.format(n)
+        lines.append("    {0} = {1} if v is None else {2}".format(
+            name, default, convert))
+
+    lines.append("    return {" + ", ".join(
+        "{!r}: {}".format(key, name) for key, name in names) + "}")
+
+    exec(compile('\n'.join(lines), '<serializer>', 'exec'), namespace)
+    serialize = namespace['serialize']
+    # trimmed field maps (see fieldsets.py) end up in here too, so keep it
+    # from growing forever; anything dropped just gets compiled again
+    if len(_compiled) > 4096:
+        _compiled.clear()
+    # hang on to the field map as well so its id can't be reused
+    _compiled[id(field_map)] = (field_map, serialize)
+    return serialize
+
+
+def serialize(data, field_map, envelope=None):
+    """Drop-in replacement for flask_restful.marshal."""
+    serializer = compile_fields(field_map)
+    record_rows(data, field_map)
+    urls = _UrlTemplates()
+    if isinstance(data, (list, tuple)):
+        out = [serializer(item, urls) for item in data]
+    else:
+        out = serializer(data, urls)
+    return {envelope: out} if envelope else out
+
+
+class serialize_with(object):
+    """Drop-in replacement for flask_restful.marshal_with.
+
+    Unlike marshal_with it also honours ?fields= and ?expand=.
+    """
+    def __init__(self, field_map, envelope=None):
+        self.field_map = field_map
+        self.envelope = envelope
+        compile_fields(field_map)
+
+    def __call__(self, f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            resp = f(*args, **kwargs)
+            field_map = requested_fields(self.field_map)
+            if isinstance(resp, tuple):
+                data, code, headers = unpack(resp)
+                return serialize(data, field_map, self.envelope), \
+                    code, headers
+            return serialize(resp, field_map, self.envelope)
+        return wrapper
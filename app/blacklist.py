@@ -0,0 +1,158 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import blake2b
+from flask import current_app
+from . import db
+from .models import ChangeCounter, RevokedToken, User
+
+
+# Every JWT-protected request asks whether its token has been revoked, and
+# nearly always it hasn't. So each worker keeps a bloom filter of the
+# revoked jtis: a miss there is a definite "not revoked" without going to
+# the database, and only a hit (a revoked token, or the odd false
+# positive) is checked against revoked_tokens. False positives that turn
+# out fine are remembered in a small LRU so they don't keep costing a
+# query either.
+#
+# Revoking a token bumps the 'revoked_tokens' change counter (see
+# ChangeCounter) in the same transaction, and each worker reads it at most
+# once every JWT_BLACKLIST_RECHECK seconds: if it's moved on since the
+# filter was built, the filter is rebuilt from the table before answering.
+# The counter lives in the database every worker on every host already
+# shares, so a revocation in one of them holds in all of them within that
+# many seconds (and in its own worker straight away), while checks in
+# between don't touch the database at all.
+#
+# Only tokens that haven't expired yet are loaded; the rest would be turned
+# away by their expiry anyway (see RevokedToken.prune to clear them out).
+#
+# Tokens also carry the user's auth_version from when they were issued
+# (see User.token_claims), and one that doesn't match the current version
+# is refused as well. Workers remember the versions they've looked up, and
+# a change to one bumps the same counter, which makes them forget them.
+
+_COUNTER = 'revoked_tokens'
+
+
+class BloomFilter(object):
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1024)
+        self.size = int(math.ceil(-capacity * math.log(error_rate) /
+                                  math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+
+class Blacklist(object):
+    def __init__(self):
+        self._filter = None
+        self._stamp = None
+        # when the counter's next due to be read
+        self._recheck_at = 0
+        self._not_revoked = OrderedDict()
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read_stamp(self):
+        now = time.monotonic()
+        if self._stamp is not None and now < self._recheck_at:
+            return self._stamp
+        stamp = ChangeCounter.current(_COUNTER)
+        self._recheck_at = now + \
+            current_app.config['JWT_BLACKLIST_RECHECK']
+        return stamp
+
+    def _refresh(self):
+        stamp = self._read_stamp()
+        if self._filter is not None and stamp == self._stamp:
+            return
+        with self._lock:
+            if self._filter is not None and stamp == self._stamp:
+                return
+            live = RevokedToken.live()
+            count = db.session.query(
+                db.func.count(RevokedToken.id)).filter(live).scalar()
+            bloom = BloomFilter(count * 2)
+            jtis = db.session.query(RevokedToken.jti).filter(live) \
+                .yield_per(1000)
+            for jti, in jtis:
+                bloom.add(jti)
+            self._filter, self._stamp = bloom, stamp
+            self._not_revoked.clear()
+            self._versions.clear()
+
+    def _remember(self, stamp, cache, key, value):
+        with self._lock:
+            # looked up before the last reload, so it may be out of date
+            if stamp != self._stamp:
+                return
+            cache[key] = value
+            while len(cache) > \
+                    current_app.config['JWT_BLACKLIST_CACHE_SIZE']:
+                cache.popitem(last=False)
+
+    def is_revoked(self, jti):
+        self._refresh()
+        stamp = self._stamp
+        if jti not in self._filter or jti in self._not_revoked:
+            return False
+        if RevokedToken.is_jti_blacklisted(jti):
+            return True
+        self._remember(stamp, self._not_revoked, jti, True)
+        return False
+
+    def is_stale(self, uid, version):
+        """Whether a token issued to `uid` at `version` is out of date."""
+        self._refresh()
+        stamp = self._stamp
+        try:
+            current = self._versions[uid]
+        except KeyError:
+            current = db.session.query(User.auth_version) \
+                .filter_by(id=uid).scalar()
+            self._remember(stamp, self._versions, uid, current)
+        # a user that's gone has no valid tokens at all
+        return current is None or current != version
+
+    def revoke(self, jti, expires=None):
+        """Revoke `jti`, a token expiring at the timestamp `expires`."""
+        expires_at = None
+        if expires is not None:
+            expires_at = datetime.utcfromtimestamp(expires)
+        db.session.add(RevokedToken(jti=jti, expires_at=expires_at))
+        self.changed()
+        db.session.commit()
+        # the counter we just bumped means our own filter gets rebuilt too,
+        # but there's no need to wait for that to start rejecting this one
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            self._not_revoked.pop(jti, None)
+
+    def changed(self):
+        """Have every worker reload, after revoked_tokens or an auth_version
+        changed. Call it before committing the change, as with touch()."""
+        ChangeCounter.bump(_COUNTER)
+        # and this one to look at the counter again on its next check
+        self._recheck_at = 0
+
+
+blacklist = Blacklist()
@@ -0,0 +1,191 @@
+import sqlite3
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from dateutil import parser
+from . import db
+from .models import (CinebenchR15Result, Futuremark3DMark06Result,
+                     Futuremark3DMarkResult)
+
+
+# Multi-row INSERTs that still tell you the ids they were given, which
+# executemany and the ORM's bulk_insert_mappings don't.
+#
+# Postgres hands them back with RETURNING. SQLite gives an INTEGER PRIMARY
+# KEY the next id up to each row in turn, and once a transaction has
+# written nothing else can until it commits, so rows inserted together get
+# consecutive ids ending at the table's highest. Anything else gets a
+# statement a row.
+#
+# Compiling a multi-row INSERT costs about as much as running it, so on
+# SQLite anything too big for one statement goes through executemany
+# instead, which prepares the statement once and is several times faster.
+
+# bound parameters allowed in a statement
+_MAX_PARAMS = {
+    'sqlite': 32766 if sqlite3.sqlite_version_info >= (3, 32) else 999,
+    'postgresql': 32767
+}
+
+
+def insert_many(table, rows):
+    """Insert `rows` (dicts with the same keys) into `table` in the current
+    transaction, returning their new ids in the same order.
+    """
+    if not rows:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        return [db.session.execute(table.insert().values(**row))
+                .inserted_primary_key[0] for row in rows]
+    per_statement = max(1, _MAX_PARAMS[dialect] // len(rows[0]))
+    if dialect == 'sqlite' and len(rows) > per_statement:
+        db.session.execute(table.insert(), rows)
+        last = db.session.query(db.func.max(table.c.id)).scalar()
+        return list(range(last - len(rows) + 1, last + 1))
+    ids = []
+    for start in range(0, len(rows), per_statement):
+        chunk = rows[start:start + per_statement]
+        statement = table.insert().values(chunk)
+        if dialect == 'postgresql':
+            ids.extend(id for id, in db.session.execute(
+                statement.returning(table.c.id)))
+        else:
+            last = db.session.execute(statement).lastrowid
+            ids.extend(range(last - len(chunk) + 1, last + 1))
+    return ids
+
+
+# a revision's hardware, as imported and exported alongside its results
+hardware_fields = ('cpu_make', 'cpu_name', 'cpu_socket', 'cpu_mhz',
+                   'cpu_proc_cores', 'chipset', 'system_memory_gb',
+                   'system_memory_mhz', 'gpu_name', 'gpu_make',
+                   'gpu_memory_mb', 'gpu_count')
+
+
+# Results submitted or imported many at a time, as
+# {"type": "cinebenchr15result", "cpu_cb": 1500, ...}
+
+result_types = {
+    'cinebenchr15result': CinebenchR15Result,
+    'futuremark3dmark06result': Futuremark3DMark06Result,
+    'futuremark3dmarkresult': Futuremark3DMarkResult
+}
+# which is also the endpoint of its detail resource
+type_names = {model: name for name, model in result_types.items()}
+
+# filled in here rather than taken from the client
+_derived = ('id', 'revision_id', 'aggregate_score')
+
+
+def _parse_date(value):
+    # dateutil takes anything, but slowly; most dates are ISO 8601, which
+    # datetime can read itself (on Python 3.7 and up)
+    try:
+        return datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        return parser.parse(value)
+
+
+# bits in each integer type, as PostgreSQL has them (subclasses first)
+_int_bits = ((db.SmallInteger, 16), (db.BigInteger, 64), (db.Integer, 32))
+
+
+def _int_range(column):
+    bits = next(bits for type_, bits in _int_bits
+                if isinstance(column.type, type_))
+    return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+
+
+def _decimal(column, value):
+    # rounded to the column's scale as the database would round it, and
+    # turned away if that doesn't fit its precision rather than left to
+    # fail the whole INSERT
+    precision, scale = column.type.precision, column.type.scale or 0
+    if precision is None:
+        return value
+    step = Decimal(1).scaleb(-scale)
+    limit = Decimal(10) ** (precision - scale)
+    if abs(value) < limit:
+        value = value.quantize(step, rounding=ROUND_HALF_UP)
+        if abs(value) < limit:
+            return value
+    raise ValueError('must be between {} and {}'.format(
+        -(limit - step), limit - step))
+
+
+def coerce(column, value):
+    """`value` from JSON or CSV as `column` stores it, else ValueError."""
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is int:
+        if isinstance(value, bool) or \
+                (isinstance(value, float) and not value.is_integer()):
+            raise ValueError('must be a whole number')
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError('must be a whole number')
+        low, high = _int_range(column)
+        if not low <= value <= high:
+            raise ValueError('must be between {} and {}'.format(low, high))
+        return value
+    if python_type is Decimal:
+        if isinstance(value, bool):
+            raise ValueError('must be a number')
+        try:
+            value = Decimal(str(value))
+        except (InvalidOperation, ValueError):
+            raise ValueError('must be a number')
+        if not value.is_finite():
+            raise ValueError('must be a number')
+        return _decimal(column, value)
+    if python_type is datetime:
+        if not isinstance(value, str):
+            raise ValueError('must be a date string')
+        return _parse_date(value)
+    if not isinstance(value, str):
+        raise ValueError('must be a string')
+    return value
+
+
+def parse_result(item, now=None):
+    """(model, row) for one submitted result, or raise ValueError with a
+    {field: message} dict of everything wrong with it.
+    """
+    if not isinstance(item, dict):
+        raise ValueError({'type': 'each result must be an object'})
+    model = result_types.get(item.get('type'))
+    if model is None:
+        raise ValueError({'type': 'must be one of ' +
+                          ', '.join(sorted(result_types))})
+    columns = model.__table__.c
+    row, errors = {}, {}
+    for key, value in item.items():
+        if key == 'type':
+            continue
+        if key not in columns or key in _derived:
+            errors[key] = 'not a {} field'.format(item['type'])
+            continue
+        try:
+            row[key] = coerce(columns[key], value)
+        except (ValueError, OverflowError) as e:
+            errors[key] = str(e) or 'invalid value'
+    if errors:
+        raise ValueError(errors)
+    # every row of a multi-row INSERT needs the same columns
+    for column in columns:
+        if column.key not in _derived:
+            row.setdefault(column.key, None)
+    if row['result_date'] is None:
+        row['result_date'] = now or datetime.utcnow()
+    if model is Futuremark3DMarkResult:
+        # the ORM hook that keeps this up to date doesn't see Core inserts
+        row['aggregate_score'] = model.calculate_aggregate_score(
+            row['icestorm_score'], row['cloudgate_score'],
+            row['firestrike_score'], row['skydiver_score'])
+        low, high = _int_range(columns['aggregate_score'])
+        if not low <= row['aggregate_score'] <= high:
+            raise ValueError({'aggregate_score': 'the scores add up to more '
+                                                 'than it can hold'})
+    return model, row
@@ -0,0 +1,45 @@
+from functools import wraps
+from flask_jwt_extended import get_jwt_claims, get_jwt_identity
+from flask_restful import abort
+from .models import User
+
+
+# Access tokens carry the user's id and permissions (see
+# User.token_claims), so the write endpoints can tell who's asking and what
+# they may do without loading the user or their role. Tokens issued before
+# that was the case are looked up the old way until they expire.
+
+
+def _legacy_user():
+    return User.find_by_username(get_jwt_identity())
+
+
+def current_user_id():
+    claims = get_jwt_claims()
+    if 'uid' in claims:
+        return claims['uid']
+    user = _legacy_user()
+    return user.id if user is not None else None
+
+
+def current_user_can(permissions):
+    claims = get_jwt_claims()
+    if 'perms' in claims:
+        return (claims['perms'] & permissions) == permissions
+    user = _legacy_user()
+    return user is not None and user.can(permissions)
+
+
+def permission_required(permissions):
+    """Refuse the request with a 403 unless the token has `permissions`.
+
+    Goes under @jwt_required.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user_can(permissions):
+                abort(403, message='Permission denied')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from flask import current_app
+from . import db
+from .bulk import hardware_fields, type_names
+from .models import (Machine, Revision, CinebenchR15Result,
+                     Futuremark3DMark06Result, Futuremark3DMarkResult)
+
+
+# Dumping whole tables for analytics (see /export and `flask
+# export-results`), flattened so each line stands on its own: a revision
+# carries its machine's name and owner, a result its revision's hardware as
+# well. Results come out in the same layout `flask import-results` reads.
+# Deleting a machine or revision leaves its revisions and results behind,
+# and those are exported too, with what they'd carry of it left empty.
+#
+# Rows are read through a server-side cursor where the database has them
+# (and SQLite's own lazy one where it doesn't), a chunk at a time, so an
+# export takes the same memory however big the tables are. ?since= (or
+# --since) only exports rows dated from then on, in date order, so the
+# last date seen is where the next incremental export starts.
+
+result_models = (CinebenchR15Result, Futuremark3DMark06Result,
+                 Futuremark3DMarkResult)
+
+kinds = ('machines', 'revisions', 'results') + \
+    tuple(model.__tablename__ for model in result_models)
+
+
+def _select(kind):
+    # (select, the table's own id and the column it's dated by)
+    if kind == 'machines':
+        columns = [column for column in Machine.__table__.c
+                   if column.key != 'system_notes_html']
+        return db.select(columns), Machine.id, Machine.timestamp
+    if kind == 'revisions':
+        columns = [column for column in Revision.__table__.c
+                   if column.key != 'revision_notes_html']
+        return db.select(columns[:1] + [Machine.system_name, Machine.owner] +
+                         columns[1:]) \
+            .select_from(Revision.__table__.outerjoin(
+                Machine.__table__, Revision.machine_id == Machine.id)), \
+            Revision.id, Revision.timestamp
+    model = next(model for model in result_models
+                 if model.__tablename__ == kind)
+    columns = [column for column in model.__table__.c
+               if column.key != 'revision_id']
+    hardware = [getattr(Revision, name) for name in hardware_fields]
+    return db.select(
+        columns[:1] + [db.literal(type_names[model]).label('type')] +
+        columns[1:] + [model.revision_id, Revision.machine_id] +
+        [Machine.system_name, Machine.owner] + hardware +
+        [Revision.timestamp.label('revision_timestamp')]) \
+        .select_from(model.__table__.outerjoin(Revision.__table__)
+                     .outerjoin(Machine.__table__,
+                                Revision.machine_id == Machine.id)), \
+        model.id, model.result_date
+
+
+def header(kind):
+    """Column names of an export of `kind`, in order."""
+    if kind == 'results':
+        names = []
+        for model in result_models:
+            for name in header(model.__tablename__):
+                if name not in names:
+                    names.append(name)
+        return names
+    return [column.key for column in _select(kind)[0].columns]
+
+
+def rows(kind, since=None, chunk=None):
+    """Stream every row of `kind` dated `since` or later, as dicts."""
+    if kind == 'results':
+        for model in result_models:
+            for row in rows(model.__tablename__, since, chunk):
+                yield row
+        return
+    chunk = chunk or current_app.config['API_STREAM_CHUNK']
+    query, id, date = _select(kind)
+    if since is not None:
+        query = query.where(date >= since)
+    query = query.order_by(date, id) \
+        .execution_options(stream_results=True)
+    result = db.session.execute(query)
+    try:
+        while True:
+            fetched = result.fetchmany(chunk)
+            if not fetched:
+                return
+            for row in fetched:
+                yield dict(row)
+    finally:
+        result.close()
+
+
+def _buffered(pieces, size=65536):
+    # fewer, bigger writes than a line at a time
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def _ndjson(kind, since):
+    for row in rows(kind, since):
+        yield json.dumps(row, default=_json_value) + '\n'
+
+
+def _csv(kind, since):
+    line = io.StringIO()
+    writer = csv.DictWriter(line, header(kind))
+    writer.writeheader()
+    for row in rows(kind, since):
+        writer.writerow({key: value.isoformat()
+                         if hasattr(value, 'isoformat') else value
+                         for key, value in row.items()})
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+    yield line.getvalue()
+
+
+def ndjson(kind, since=None):
+    """An export of `kind` as NDJSON, in pieces of about 64KB."""
+    return _buffered(_ndjson(kind, since))
+
+
+def csv_lines(kind, since=None):
+    """An export of `kind` as CSV with a header, in pieces of about 64KB."""
+    return _buffered(_csv(kind, since))
+
+
+formats = {'ndjson': (ndjson, 'application/x-ndjson'),
+           'csv': (csv_lines, 'text/csv')}
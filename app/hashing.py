@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from flask import current_app
+from passlib.apps import custom_app_context as pwd_context
+from werkzeug.exceptions import ServiceUnavailable
+
+
+# Password hashing is slow on purpose, and done on the worker that's
+# serving the request it would hold up everything else that worker has to
+# do. So it's handed to a small pool of processes instead, with a cap on
+# how many hashes may be waiting for one: past that a login or signup gets
+# a quick 503 rather than joining an ever longer queue, and a burst of them
+# can't take the rest of the API down with it.
+#
+# HASH_POOL_WORKERS = 0 hashes inline, which is what the tests want.
+
+
+class PoolSaturated(ServiceUnavailable):
+    description = 'Too many logins and signups at once, try again shortly.'
+
+    def get_headers(self, environ=None):
+        return super(PoolSaturated, self).get_headers(environ) + \
+            [('Retry-After', '1')]
+
+
+def _encrypt(password):
+    return pwd_context.encrypt(password)
+
+
+def _verify(password, hash):
+    return pwd_context.verify(password, hash)
+
+
+class HashingPool(object):
+    def __init__(self):
+        self._executor = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latencies = deque(maxlen=1000)
+
+    def _pool(self):
+        # one per process, made after gunicorn has forked the worker
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    config = current_app.config
+                    workers = config['HASH_POOL_WORKERS']
+                    self._executor = ProcessPoolExecutor(workers) \
+                        if workers else None
+                    self._slots = threading.BoundedSemaphore(
+                        max(workers, 1) + config['HASH_POOL_QUEUE'])
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _done(self, slots, start):
+        slots.release()
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._latencies.append(time.perf_counter() - start)
+
+    def run(self, fn, *args):
+        executor = self._pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PoolSaturated()
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        if executor is None:
+            try:
+                return fn(*args)
+            finally:
+                self._done(slots, start)
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._done(slots, start)
+            raise
+        # the slot comes back once the hash is actually done (or cancelled
+        # before it started), not when we stop waiting for it: one that's
+        # timed out is still taking up a process until it finishes
+        future.add_done_callback(lambda future: self._done(slots, start))
+        try:
+            return future.result(
+                timeout=current_app.config['HASH_POOL_TIMEOUT'])
+        except TimeoutError:
+            future.cancel()
+            raise PoolSaturated()
+
+    def encrypt(self, password):
+        return self.run(_encrypt, password)
+
+    def verify(self, password, hash):
+        return self.run(_verify, password, hash)
+
+    def metrics(self):
+        config = current_app.config
+        workers = config['HASH_POOL_WORKERS']
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = self._in_flight
+            completed, rejected = self._completed, self._rejected
+
+        def percentile(p):
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(p / 100 * len(latencies)))
+            return round(latencies[index] * 1000, 2)
+
+        return {
+            'workers': workers,
+            'queue_limit': config['HASH_POOL_QUEUE'],
+            'in_flight': in_flight,
+            'queue_depth': max(0, in_flight - max(workers, 1)),
+            'completed': completed,
+            'rejected': rejected,
+            'latency_ms': {'p50': percentile(50),
+                           'p95': percentile(95),
+                           'p99': percentile(99)}
+        }
+
+
+hashing = HashingPool()
@@ -0,0 +1,273 @@
+import csv
+import json
+import os
+from datetime import datetime
+from . import db
+from .api_1_0.cache import touch
+from .bulk import coerce, hardware_fields, insert_many, parse_result
+from .models import Machine, Revision
+
+
+# Loading historical runs straight into the database (see
+# `flask import-results`), for when there are far too many to send through
+# the API one by one.
+#
+# Each record is one result, flattened together with the machine and
+# revision it was run on:
+#
+#   type, system_name, owner, system_notes, machine_timestamp,
+#   cpu_make, cpu_name, ... (any Revision column), revision_timestamp,
+#   cpu_cb, opengl_fps, ... (the result's own fields, as for
+#   POST /revisions/<id>/results)
+#
+# Machines are matched on (system_name, owner) among the importing user's
+# machines, and revisions on their machine and hardware columns, so the
+# same system across many records is created once and then reused. A
+# machine created by the import gets its newest imported revision as its
+# active one.
+#
+# Records go in batch by batch, a transaction each, using multi-row
+# INSERTs; after each batch the caller is told how far it got, which is
+# what makes an interrupted import resumable. The checkpoint keeps the
+# machines made so far as well, so a resumed import goes on moving their
+# active revisions along.
+
+machine_fields = ('system_name', 'owner', 'system_notes')
+
+# what tells one revision of a machine from another
+revision_key = hardware_fields
+revision_fields = revision_key + ('revision_notes', 'pcpartpicker_url')
+
+# anything else in a record belongs to the result
+_not_result = set(Machine.__table__.c.keys()) | \
+    set(Revision.__table__.c.keys())
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def read_records(path, format=None):
+    """Stream the records in a CSV or NDJSON file as dicts."""
+    if format is None:
+        format = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+    with open(path, newline='' if format == 'csv' else None,
+              encoding='utf-8') as f:
+        if format == 'csv':
+            for record in csv.DictReader(f):
+                # an empty cell means no value, as a missing key would
+                yield {key: value for key, value in record.items()
+                       if value != ''}
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield InvalidRecord({'record': 'not valid JSON'})
+
+
+def _take(record, table, names, errors, prefix=''):
+    values = {}
+    for name in names:
+        try:
+            values[name] = coerce(table.c[name], record.get(prefix + name))
+        except (ValueError, OverflowError) as e:
+            errors[prefix + name] = str(e)
+    return values
+
+
+def parse_record(record, now):
+    """(machine, revision, model, result) values for one record, or raise
+    InvalidRecord with a {field: message} dict.
+    """
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord({'record': 'not an object'})
+    errors = {}
+    machine = _take(record, Machine.__table__, machine_fields, errors)
+    machine.update(_take(record, Machine.__table__, ('timestamp',), errors,
+                         prefix='machine_'))
+    revision = _take(record, Revision.__table__, revision_fields, errors)
+    revision.update(_take(record, Revision.__table__, ('timestamp',),
+                          errors, prefix='revision_'))
+    if not machine['system_name']:
+        errors['system_name'] = 'required'
+    # (aggregate_score is worked out again, if it's there from an export)
+    result = {key: value for key, value in record.items()
+              if key not in _not_result and key != 'aggregate_score' and
+              not key.startswith(('machine_', 'revision_'))}
+    try:
+        model, row = parse_result(result, now)
+    except ValueError as e:
+        errors.update(e.args[0])
+    if errors:
+        raise InvalidRecord(errors)
+    machine['timestamp'] = machine['timestamp'] or now
+    revision['timestamp'] = revision['timestamp'] or now
+    return machine, revision, model, row
+
+
+def load_checkpoint(checkpoint, path):
+    """(records of `path` already imported, ids of the machines the import
+    made) according to `checkpoint`, or None if it's a checkpoint for some
+    other file (or an earlier version of this one).
+    """
+    try:
+        with open(checkpoint) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return 0, []
+    if state.get('path') != os.path.abspath(path) or \
+            state.get('size') != os.path.getsize(path):
+        return None
+    return state['records'], state.get('machines', [])
+
+
+def save_checkpoint(checkpoint, path, records, machines=()):
+    # replaced in one go, so being killed mid-write can't lose it
+    tmp = checkpoint + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'path': os.path.abspath(path),
+                   'size': os.path.getsize(path),
+                   'records': records,
+                   'machines': sorted(machines)}, f)
+    os.replace(tmp, checkpoint)
+
+
+def _machine_key(machine):
+    # a missing owner is left NULL, but matches one that's blank
+    return machine['system_name'], machine['owner'] or ''
+
+
+class Importer(object):
+    def __init__(self, author_id, made_machines=()):
+        self.author_id = author_id
+        self.machines = {}
+        self.revisions = {}
+        # rows inserted so far, by table
+        self.created = {}
+        # including those an earlier run of the same import made, if this
+        # is resuming it
+        self.made_machines = set(made_machines)
+        # (timestamp, id) of the newest revision of each machine made
+        self.active = {}
+        if self.made_machines:
+            for machine_id, timestamp, id in db.session.query(
+                    Machine.id, Revision.timestamp, Revision.id) \
+                    .join(Revision, Machine.active_revision_id ==
+                          Revision.id) \
+                    .filter(Machine.id.in_(self.made_machines)):
+                self.active[machine_id] = (timestamp, id)
+        # the user's existing machines and revisions, to match against
+        for id, system_name, owner in db.session.query(
+                Machine.id, Machine.system_name, Machine.owner) \
+                .filter(Machine.author_id == author_id):
+            self.machines[(system_name, owner or '')] = id
+        key_columns = [getattr(Revision, name) for name in revision_key]
+        for row in db.session.query(Revision.id, Revision.machine_id,
+                                    *key_columns) \
+                .join(Machine, Revision.machine_id == Machine.id) \
+                .filter(Machine.author_id == author_id):
+            self.revisions[tuple(row[1:])] = row[0]
+
+    def run(self, records, batch_size=5000, skip=0):
+        """Import `records`, skipping the first `skip`.
+
+        Yields (records read, [(record number, errors)]) after each batch is
+        committed.
+        """
+        batch, rejected, number = [], [], 0
+        now = datetime.utcnow()
+        for number, record in enumerate(records, 1):
+            if number <= skip:
+                continue
+            try:
+                batch.append(parse_record(record, now))
+            except InvalidRecord as e:
+                rejected.append((number, e.args[0]))
+            if len(batch) >= batch_size:
+                self._write(batch)
+                yield number, rejected
+                batch, rejected = [], []
+                now = datetime.utcnow()
+        if batch or rejected:
+            self._write(batch)
+            yield number, rejected
+
+    def _write(self, batch):
+        table_rows = {}
+        activated = []
+
+        new_machines = {}
+        for machine, revision, model, row in batch:
+            key = _machine_key(machine)
+            if key not in self.machines and key not in new_machines:
+                new_machines[key] = dict(machine, author_id=self.author_id,
+                                         active_revision_id=None)
+        if new_machines:
+            rows = list(new_machines.values())
+            ids = insert_many(Machine.__table__, rows)
+            self.machines.update(zip(new_machines, ids))
+            self.made_machines.update(ids)
+            table_rows['machines'] = rows
+
+        revision_keys = []
+        new_revisions = {}
+        for machine, revision, model, row in batch:
+            machine_id = self.machines[_machine_key(machine)]
+            key = (machine_id,) + tuple(revision[name]
+                                        for name in revision_key)
+            revision_keys.append(key)
+            if key not in self.revisions and key not in new_revisions:
+                new_revisions[key] = dict(revision, machine_id=machine_id,
+                                          author_id=self.author_id)
+        if new_revisions:
+            rows = list(new_revisions.values())
+            ids = insert_many(Revision.__table__, rows)
+            self.revisions.update(zip(new_revisions, ids))
+            table_rows['revisions'] = rows
+            activated = self._activate(rows, ids)
+
+        by_model = {}
+        for (machine, revision, model, row), key in zip(batch,
+                                                        revision_keys):
+            row['revision_id'] = self.revisions[key]
+            by_model.setdefault(model, []).append(row)
+        for model, rows in by_model.items():
+            insert_many(model.__table__, rows)
+            table_rows[model.__tablename__] = rows
+
+        for table, rows in table_rows.items():
+            self.created[table] = self.created.get(table, 0) + len(rows)
+        if table_rows:
+            # machines already made (by an earlier batch) that got a newer
+            # revision here may be cached, so they need a counter each
+            touch(rows=table_rows, updated={'machines': activated})
+        db.session.commit()
+
+    def _activate(self, rows, ids):
+        # machines the import made get the newest of their revisions;
+        # returns the machine rows it updated
+        changed = {}
+        for row, id in zip(rows, ids):
+            machine_id = row['machine_id']
+            if machine_id not in self.made_machines:
+                continue
+            newest = self.active.get(machine_id)
+            if newest is None or (row['timestamp'], id) > newest:
+                self.active[machine_id] = changed[machine_id] = \
+                    (row['timestamp'], id)
+        if changed:
+            machines = Machine.__table__
+            db.session.execute(
+                machines.update()
+                .where(machines.c.id == db.bindparam('machine_id'))
+                .values(active_revision_id=db.bindparam('revision_id')),
+                [{'machine_id': machine_id, 'revision_id': id}
+                 for machine_id, (timestamp, id) in changed.items()])
+        return [{'id': machine_id, 'author_id': self.author_id,
+                 'active_revision_id': id}
+                for machine_id, (timestamp, id) in changed.items()]
@@ -0,0 +1,181 @@
+import threading
+from array import array
+from bisect import bisect_left
+from . import db
+from .models import (ChangeCounter, CinebenchR15Result,
+                     Futuremark3DMark06Result, Futuremark3DMarkResult)
+
+
+# Per-process ranked indexes over the benchmark scores, so "top N", "what
+# rank is result X" and "who's around rank R" are a bisect into a sorted
+# array rather than a COUNT(*) ... WHERE score > x for every request.
+#
+# Each entry packs (score, id) into one signed 64 bit key that sorts the
+# same way the result lists do (score descending, then id descending), so
+# the whole leaderboard is one flat array('q'), about 8 bytes a result.
+# That leaves 31 bits and a sign for the score, as much as an Integer
+# column holds anyway; a score past that (which the API turns away, see
+# bulk.coerce) is left off the board rather than breaking it.
+
+_ID_BITS = 32
+_SCORE_MIN, _SCORE_MAX = -(1 << 31), (1 << 31) - 1
+
+
+def _ranked(score):
+    return score is not None and _SCORE_MIN <= score <= _SCORE_MAX
+
+
+def _key(score, id):
+    return -((score << _ID_BITS) + id)
+
+
+def _unkey(key):
+    # (score, id)
+    return divmod(-key, 1 << _ID_BITS)
+
+
+class Leaderboard(object):
+    def __init__(self, column):
+        self.column = column
+        self.model = column.class_
+        self.name = column.key
+        self.table = self.model.__tablename__
+        self._keys = array('q')
+        self._scores = {}
+        # the table's change counter as of the last build, None if unbuilt
+        # or out of date
+        self._version = None
+        self._built = False
+        self._lock = threading.RLock()
+        # held by whichever thread is rebuilding the board
+        self._building = threading.Lock()
+
+    def build(self, version):
+        rows = [(id, score) for id, score in
+                db.session.query(self.model.id, self.column)
+                .filter(self.column.isnot(None)) if _ranked(score)]
+        keys = array('q', sorted(_key(score, id) for id, score in rows))
+        scores = dict(rows)
+        with self._lock:
+            self._keys, self._scores = keys, scores
+            self._version = version
+            self._built = True
+
+    def ensure(self):
+        # read the counter before the scores, so a write racing the build
+        # just means building again next time rather than missing it
+        version = ChangeCounter.current(self.table)
+        if version == self._version:
+            return self
+        # one thread rebuilds; the rest go on serving the board as it was
+        # until it's done, rather than all reading the scores at once. Only
+        # the very first build is waited for, there being nothing to serve.
+        if not self._building.acquire(blocking=not self._built):
+            return self
+        try:
+            # it may have been built while we waited (counters only go up)
+            if self._version is None or self._version < version:
+                self.build(version)
+        finally:
+            self._building.release()
+        return self
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, id, score):
+        with self._lock:
+            self._remove(id)
+            if _ranked(score):
+                key = _key(score, id)
+                self._keys.insert(bisect_left(self._keys, key), key)
+                self._scores[id] = score
+
+    def discard(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        score = self._scores.pop(id, None)
+        if score is not None:
+            del self._keys[bisect_left(self._keys, _key(score, id))]
+
+    def rank(self, id):
+        """1-based rank of result `id`, or None if it isn't ranked."""
+        with self._lock:
+            score = self._scores.get(id)
+            if score is None:
+                return None
+            return bisect_left(self._keys, _key(score, id)) + 1
+
+    def slice(self, start, stop):
+        """[(rank, id, score)] for the 1-based ranks start..stop-1."""
+        start = max(start, 1)
+        with self._lock:
+            keys = self._keys[start - 1:max(stop - 1, start - 1)]
+        entries = []
+        for rank, key in enumerate(keys, start):
+            score, id = _unkey(key)
+            entries.append((rank, id, score))
+        return entries
+
+    def top(self, count):
+        return self.slice(1, count + 1)
+
+    def around(self, rank, radius):
+        return self.slice(rank - radius, rank + radius + 1)
+
+
+boards = {board.name: board for board in (
+    Leaderboard(CinebenchR15Result.cpu_cb),
+    Leaderboard(CinebenchR15Result.opengl_fps),
+    Leaderboard(Futuremark3DMark06Result.overall_score),
+    Leaderboard(Futuremark3DMarkResult.aggregate_score),
+)}
+
+
+def _applied(changes):
+    # changes is {model: function applying the write to one of its boards}
+    built = [board for board in boards.values()
+             if board.model in changes and board._version is not None]
+    if not built:
+        return
+    # if our write is the only one since the build, patching the board in
+    # place keeps it current; if another worker got one in as well, leave
+    # it to be rebuilt on its next use
+    versions = ChangeCounter.read({board.table for board in built})
+    for board in built:
+        version = versions.get(board.table, (0,))[0]
+        # another thread may have given up on the board since, so look
+        # again under its lock
+        with board._lock:
+            if board._version is not None and \
+                    version == board._version + 1:
+                changes[board.model](board)
+                board._version = version
+            else:
+                board._version = None
+
+
+def record(result):
+    """Apply a committed insert or update of `result` to its leaderboards."""
+    _applied({type(result): lambda board: board.update(
+        result.id, getattr(result, board.name))})
+
+
+def record_rows(rows_by_model):
+    """Apply committed inserts made with Core to their leaderboards, given
+    as {model: [row dict including its id]}.
+    """
+    def applying(rows):
+        def apply(board):
+            for row in rows:
+                board.update(row['id'], row.get(board.name))
+        return apply
+    _applied({model: applying(rows)
+              for model, rows in rows_by_model.items()})
+
+
+def discard(model, id):
+    """Drop a deleted result of type `model` from its leaderboards."""
+    _applied({model: lambda board: board.discard(id)})
@@ -5,8 +5,10 @@ from passlib.apps import custom_app_context as pwd_context
 # per http://stackoverflow.com/a/9695045
 from flask_sqlalchemy import SQLAlchemy
 from passlib.hash import pbkdf2_sha256 as sha256
+from sqlalchemy import event
 
 from . import db
+from .hashing import hashing
 
 class Permission:
     POST = 0x01 # 0000 0001 (update)
@@ -34,13 +36,23 @@ class Role(db.Model):
                            Permission.DELETE, False),
             'Administrator': (0xff, False)
         }
+        changed = False
         for r in roles:
             role = Role.query.filter_by(name=r).first()
             if role is None:
                 role = Role(name=r)
+            elif role.permissions != roles[r][0]:
+                # tokens carry the permissions they were issued with, so
+                # have the role's users' tokens refused and reissued
+                role.users.update({User.auth_version: User.auth_version + 1},
+                                  synchronize_session=False)
+                changed = True
             role.permissions = roles[r][0]
             role.default = roles[r][1]
             db.session.add(role)
+        if changed:
+            from .blacklist import blacklist
+            blacklist.changed()
         db.session.commit()
 
         def __repr__(self):
@@ -53,13 +65,18 @@ class User(db.Model):
     username = db.Column(db.String(32), index=True, unique=True)
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
     password_hash = db.Column(db.String(128))
+    # bumped whenever something in the user's tokens goes out of date,
+    # which gets the tokens refused (see blacklist.py)
+    auth_version = db.Column(db.Integer, nullable=False, default=0,
+                             server_default='0')
     machines = db.relationship('Machine', backref='author', lazy='dynamic')
 
+    # both run on the hashing pool, and raise PoolSaturated if it's full
     def hash_password(self, password):
-        self.password_hash = pwd_context.encrypt(password)
+        self.password_hash = hashing.encrypt(password)
 
     def verify_password(self, password):
-        return pwd_context.verify(password, self.password_hash)
+        return hashing.verify(password, self.password_hash)
 
     def can(self, permissions):
         return self.role is not None and \
@@ -68,6 +85,13 @@ class User(db.Model):
     def is_administrator(self):
         return self.can(Permission.ADMINISTER)
 
+    def token_claims(self):
+        # a user without a role can't do anything, as with can()
+        return {'uid': self.id,
+                'perms': self.role.permissions
+                if self.role is not None else 0,
+                'ver': self.auth_version}
+
     @staticmethod
     def generate_hash(password):
         return sha256.hash(password)
@@ -84,17 +108,103 @@ class User(db.Model):
 class RevokedToken(db.Model):
     __tablename__ = 'revoked_tokens'
     id = db.Column(db.Integer, primary_key = True)
-    jti = db.Column(db.String(120))
+    jti = db.Column(db.String(120), unique=True, index=True)
+    # when the token itself stops being accepted, after which there's no
+    # need to remember it was revoked (None if it never expires)
+    expires_at = db.Column(db.DateTime, index=True)
 
     def add(self):
         db.session.add(self)
         db.session.commit()
 
+    @classmethod
+    def live(cls):
+        return db.or_(cls.expires_at.is_(None),
+                      cls.expires_at > datetime.utcnow())
+
     @classmethod
     def is_jti_blacklisted(cls, jti):
-        query = cls.query.filter_by(jti = jti).first()
+        query = db.session.query(cls.id).filter_by(jti = jti) \
+            .filter(cls.live()).first()
         return bool(query)
 
+    @classmethod
+    def prune(cls, batch_size=1000):
+        """Delete expired tokens, a batch per commit, yielding each count."""
+        now = datetime.utcnow()
+        while True:
+            ids = [id for id, in db.session.query(cls.id)
+                   .filter(cls.expires_at <= now).limit(batch_size)]
+            if not ids:
+                return
+            cls.query.filter(cls.id.in_(ids)) \
+                .delete(synchronize_session=False)
+            db.session.commit()
+            yield len(ids)
+
+
+class ChangeCounter(db.Model):
+    # one row per thing a response can depend on (for now a table), bumped
+    # in the same transaction as the change, so a GET can tell whether
+    # anything it would return has changed by reading a handful of these
+    __tablename__ = 'change_counters'
+    key = db.Column(db.String(128), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0,
+                        server_default='0')
+    changed_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+
+    @classmethod
+    def bump(cls, *keys):
+        """Count a change to each of `keys` in the current transaction."""
+        keys = sorted(set(keys))
+        rows = [{'key': key, 'now': datetime.utcnow()} for key in keys]
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            # one statement however many counters there are, creating the
+            # ones that don't exist yet without racing another writer
+            db.session.execute(db.text(
+                'INSERT INTO change_counters ("key", version, changed_at) '
+                'VALUES (:key, 1, :now) ON CONFLICT ("key") DO UPDATE '
+                'SET version = change_counters.version + 1, '
+                'changed_at = :now'), rows)
+            return
+        table = cls.__table__
+        db.session.execute(
+            table.insert().prefix_with('IGNORE').values(
+                key=db.bindparam('key'), version=0,
+                changed_at=db.bindparam('now')), rows)
+        db.session.execute(table.update()
+                           .where(table.c.key.in_(keys))
+                           .values(version=table.c.version + 1,
+                                   changed_at=rows[0]['now']))
+
+    @classmethod
+    def read(cls, keys):
+        """{key: (version, changed_at)} for those of `keys` ever bumped."""
+        rows = db.session.query(cls.key, cls.version, cls.changed_at) \
+            .filter(cls.key.in_(list(keys)))
+        return {key: (version, changed_at)
+                for key, version, changed_at in rows}
+
+    @classmethod
+    def current(cls, key):
+        return cls.read((key,)).get(key, (0, None))[0]
+
+
+class JournalMark(db.Model):
+    # how far into each write-behind journal (see writebehind.py) has made
+    # it into the database, and what became of each entry of the last
+    # batch, written in the same transaction as the rows themselves, so a
+    # flush cut short after committing isn't done twice
+    __tablename__ = 'journal_marks'
+    journal = db.Column(db.String(32), primary_key=True)
+    flushed_through = db.Column(db.Integer, nullable=False)
+    flushed_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+    # {"saved": [[entry id, result id]], "failed": [[entry id, errors]]}
+    last_batch = db.Column(db.Text)
+
 
 class Machine(db.Model):
     __tablename__ = 'machines'
@@ -103,17 +213,27 @@ class Machine(db.Model):
     system_notes = db.Column(db.Text)
     system_notes_html = db.Column(db.Text)
     owner = db.Column(db.Text)
-    active_revision_id = db.Column(db.Integer, db.ForeignKey('machines.id'))
+    # machines and revisions point at each other, so this one is added
+    # after both tables exist; deleting the active revision leaves the
+    # machine without one
+    active_revision_id = db.Column(db.Integer,
+                                   db.ForeignKey('revisions.id',
+                                                 use_alter=True,
+                                                 ondelete='SET NULL'),
+                                   index=True)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
-    author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     user = db.relationship(User, lazy="joined", innerjoin=True)
 
-    active_revision = db.relationship('Revision',
-                                      cascade='all,delete',
-                                      backref='active_revision_of',
-                                      uselist=False)
+    # post_update: a new machine and its first revision can be flushed
+    # together, setting this once both have ids
+    active_revision = db.relationship(
+        'Revision', foreign_keys=[active_revision_id], post_update=True,
+        cascade='all,delete',
+        backref=db.backref('active_revision_of', uselist=False))
     revisions = db.relationship('Revision', cascade='all,delete',
-                                backref='machine', lazy='dynamic')
+                                backref='machine', lazy='dynamic',
+                                foreign_keys='Revision.machine_id')
 
 
 class Revision(db.Model):
@@ -135,8 +255,21 @@ class Revision(db.Model):
     revision_notes_html = db.Column(db.Text)
     pcpartpicker_url = db.Column(db.String)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
-    author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'))
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'),
+                           index=True)
+
+    # for the hardware filters on the lists (see api_1_0/filters.py): an
+    # equality on the first column, then a range or the list's order on
+    # the second
+    __table_args__ = (
+        db.Index('ix_revisions_cpu_make_cpu_proc_cores', 'cpu_make',
+                 'cpu_proc_cores'),
+        db.Index('ix_revisions_cpu_name_timestamp', 'cpu_name', 'timestamp'),
+        db.Index('ix_revisions_gpu_make_gpu_memory_mb', 'gpu_make',
+                 'gpu_memory_mb'),
+        db.Index('ix_revisions_gpu_name_timestamp', 'gpu_name', 'timestamp')
+    )
 
     cinebenchr15results = db.relationship('CinebenchR15Result',
                                           cascade='all,delete',
@@ -154,16 +287,17 @@ class Revision(db.Model):
 class CinebenchR15Result(db.Model):
     __tablename__ = 'cinebenchr15results'
     id = db.Column(db.Integer, primary_key=True)
-    result_date = db.Column(db.DateTime, index=True, default=datetime.utcnow())
+    result_date = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     cpu_cb = db.Column(db.Integer, index=True)
     opengl_fps = db.Column(db.Integer, index=True)
-    revision_id = db.Column(db.Integer, db.ForeignKey('revisions.id'))
+    revision_id = db.Column(db.Integer, db.ForeignKey('revisions.id'),
+                            index=True)
 
 
 class Futuremark3DMark06Result(db.Model):
     __tablename__ = 'futuremark3dmark06results'
     id = db.Column(db.Integer, primary_key=True)
-    result_date = db.Column(db.DateTime, index=True, default=datetime.utcnow())
+    result_date = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     sm2_score = db.Column(db.Integer, index=True)
     cpu_score = db.Column(db.Integer, index=True)
     sm3_score = db.Column(db.Integer, index=True)
@@ -175,13 +309,14 @@ class Futuremark3DMark06Result(db.Model):
     deepfreeze_fps = db.Column(db.Numeric(5,2))
     overall_score = db.Column(db.Integer, index=True)
     result_url = db.Column(db.String)
-    revision_id = db.Column(db.Integer, db.ForeignKey('revisions.id'))
+    revision_id = db.Column(db.Integer, db.ForeignKey('revisions.id'),
+                            index=True)
 
 
 class Futuremark3DMarkResult(db.Model):
     __tablename__ = 'futuremark3dmarkresults'
     id = db.Column(db.Integer, primary_key=True)
-    result_date = db.Column(db.DateTime, index=True, default=datetime.utcnow())
+    result_date = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     icestorm_score = db.Column(db.Integer, index=True)
     icestorm_result_url = db.Column(db.String)
     cloudgate_score = db.Column(db.Integer, index=True)
@@ -191,4 +326,24 @@ class Futuremark3DMarkResult(db.Model):
     skydiver_score = db.Column(db.Integer, index=True)
     skydiver_result_url = db.Column(db.String)
     overall_result_url = db.Column(db.String)
-    revision_id = db.Column(db.Integer, db.ForeignKey('revisions.id'))
+    # sum of all scores to come up with kinda "aggregate score" for the
+    # leaderboard, kept up to date below so it can be indexed and sorted on
+    aggregate_score = db.Column(db.Integer, index=True, nullable=False,
+                                default=0, server_default='0')
+    revision_id = db.Column(db.Integer, db.ForeignKey('revisions.id'),
+                            index=True)
+
+    @staticmethod
+    def calculate_aggregate_score(icestorm_score, cloudgate_score,
+                                  firestrike_score, skydiver_score):
+        # a missing score counts as zero rather than wiping out the others
+        return sum(score or 0 for score in (icestorm_score, cloudgate_score,
+                                            firestrike_score, skydiver_score))
+
+
+@event.listens_for(Futuremark3DMarkResult, 'before_insert')
+@event.listens_for(Futuremark3DMarkResult, 'before_update')
+def update_aggregate_score(mapper, connection, target):
+    target.aggregate_score = Futuremark3DMarkResult.calculate_aggregate_score(
+        target.icestorm_score, target.cloudgate_score,
+        target.firestrike_score, target.skydiver_score)
@@ -0,0 +1,160 @@
+import json
+import re
+from sqlalchemy import event
+from . import db
+from .bulk import type_names
+from .leaderboards import boards
+from .models import Machine, Revision, User
+
+
+# Checking that what the API runs stays index driven (see
+# `flask explain-queries`). Each of the read endpoints below is requested
+# through a test client, along with the second page of each list, and
+# every statement it runs is put through EXPLAIN on the same database:
+#
+#   SQLite      EXPLAIN QUERY PLAN, where a "SCAN <table>" that isn't
+#               USING an index reads the whole table
+#   PostgreSQL  EXPLAIN (FORMAT JSON), where it's a Seq Scan node
+#
+# Run it against a copy of production sized data (and ANALYZEd, on
+# PostgreSQL), since a planner will happily scan a table of ten rows.
+
+_sqlite_scan = re.compile(r'^SCAN (?!.*\b(USING|VIRTUAL TABLE|CONSTANT ROW)\b)')
+_sqlite_sort = re.compile(r'^USE TEMP B-TREE')
+_sqlite_page = re.compile(r'^(?!.*\bWHERE\b).*\bLIMIT\b', re.DOTALL)
+
+
+def endpoints():
+    """The URLs checked, for the newest rows in the database."""
+    def newest(model):
+        return db.session.query(db.func.max(model.id)).scalar()
+
+    user, machine, revision = newest(User), newest(Machine), newest(Revision)
+    cpu_make = None
+    urls = []
+    if user is not None:
+        urls += ['/users', '/users/{}'.format(user),
+                 '/users/{}/machines'.format(user)]
+    if machine is not None:
+        urls += ['/machines', '/machines/{}'.format(machine),
+                 '/machines/{}/revisions'.format(machine),
+                 '/compare?machines={}'.format(machine)]
+    if revision is not None:
+        cpu_make, cpu_name = db.session.query(
+            Revision.cpu_make, Revision.cpu_name) \
+            .filter(Revision.id == revision).one()
+        urls += ['/revisions', '/revisions/{}'.format(revision),
+                 '/compare?revisions={}'.format(revision)]
+        if cpu_make:
+            urls.append('/revisions?cpu_make={}'.format(cpu_make))
+        words = re.findall(r'\w+', cpu_name or '')
+        if words:
+            urls.append('/search/revisions?q={}'.format(words[0]))
+    for model, name in type_names.items():
+        result = newest(model)
+        if result is None or revision is None:
+            continue
+        table = model.__tablename__
+        urls += ['/' + table, '/{}/{}'.format(table, result),
+                 '/revisions/{}/{}'.format(revision, table)]
+        if cpu_make:
+            urls.append('/{}?cpu_make={}'.format(table, cpu_make))
+    for board in boards.values():
+        urls.append('/leaderboards/' + board.name)
+    return urls
+
+
+def _sqlite_plan(connection, statement, parameters):
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    lines = [row[3] for row in cursor.fetchall()]
+    if _sqlite_page.search(statement) and \
+            not any(_sqlite_sort.match(line) for line in lines):
+        # the first page of a whole table in rowid order: a scan, but one
+        # that stops after `limit` rows
+        return lines, []
+    # a subquery run as a co-routine or materialized is read through in
+    # full, but it only holds what its own (checked) plan found
+    derived = {line.split(' ', 1)[1] for line in lines
+               if line.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    return lines, [line for line in lines if _sqlite_scan.match(line) and
+                   line.split(' ', 1)[1] not in derived]
+
+
+def _postgresql_plan(connection, statement, parameters):
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    lines, scans = [], []
+
+    def walk(node, depth):
+        line = '  ' * depth + node['Node Type']
+        if 'Relation Name' in node:
+            line += ' on ' + node['Relation Name']
+        if 'Index Name' in node:
+            line += ' using ' + node['Index Name']
+        lines.append(line)
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(line.strip())
+        for child in node.get('Plans', ()):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'], 0)
+    return lines, scans
+
+
+_planners = {'sqlite': _sqlite_plan, 'postgresql': _postgresql_plan}
+
+
+def explain(app, urls=None):
+    """Yield (url, status, [(statement, plan lines, full scans)]) for each
+    of `urls` (by default endpoints()), requested in turn.
+
+    Call it outside of an app context, so each request gets its own (and
+    its own count of queries, see loading.py) as it would when served.
+    """
+    engine = db.get_engine(app)
+    planner = _planners.get(engine.dialect.name)
+    if planner is None:
+        raise ValueError("can't read {} query plans"
+                         .format(engine.dialect.name))
+    client = app.test_client()
+    # let the first request's start up work (like building the
+    # leaderboards) happen before anything is being watched
+    client.get('/api/v1.0/metrics')
+    if urls is None:
+        with app.app_context():
+            urls = endpoints()
+
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and \
+                statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', collect)
+    connection = engine.raw_connection()
+    try:
+        for url in urls:
+            while url is not None:
+                del statements[:]
+                response = client.get('/api/v1.0' + url)
+                plans = []
+                for statement, parameters in statements:
+                    lines, scans = planner(connection, statement, parameters)
+                    plans.append((statement, lines, scans))
+                yield url, response.status_code, plans
+                # and the page after, which seeks rather than starting
+                # from the top
+                data = response.get_json(silent=True)
+                if 'cursor=' not in url and isinstance(data, dict) and \
+                        data.get('next'):
+                    url = data['next'].split('/api/v1.0', 1)[1]
+                else:
+                    url = None
+    finally:
+        event.remove(engine, 'before_cursor_execute', collect)
+        connection.close()
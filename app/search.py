@@ -0,0 +1,110 @@
+import re
+from sqlalchemy import DDL, event
+from . import db
+from .models import Machine, Revision
+
+
+# Full-text search over the free text of machines and revisions (see
+# /search), kept up to date by the database itself so that every write,
+# through the API or `flask import-results`, is searchable straight away:
+#
+#   SQLite      an external content FTS5 table per searched table
+#               (machines_search, revisions_search), with triggers copying
+#               each insert, update and delete into it; ranked by bm25()
+#   PostgreSQL  a GIN index on the to_tsvector() of the same columns,
+#               which the query repeats word for word so the planner can
+#               use it; ranked by ts_rank()
+#
+# Anything else falls back to ILIKE on every column, in id order.
+#
+# Both stem English words ("cooled" finds "water cooling") and match every
+# word searched for. The same DDL is in the migration that adds it; here it
+# covers tables made by create_all().
+
+searched = {
+    'machines': (Machine, ('system_name', 'system_notes', 'owner')),
+    'revisions': (Revision, ('cpu_make', 'cpu_name', 'cpu_socket', 'chipset',
+                             'gpu_make', 'gpu_name', 'revision_notes'))
+}
+
+
+def _sqlite_ddl(table, columns):
+    # (statements creating the index and its triggers, statement dropping
+    # it; the triggers go with the table they're on)
+    names = {'index': table + '_search', 'table': table,
+             'columns': ', '.join(columns),
+             'new': ', '.join('new.' + column for column in columns),
+             'old': ', '.join('old.' + column for column in columns)}
+    create = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({columns}, "
+        "content='{table}', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        "CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new}); END",
+        "CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO {index}({index}, rowid, {columns}) "
+        "VALUES ('delete', old.id, {old}); END",
+        "CREATE TRIGGER {index}_update AFTER UPDATE OF {columns} ON {table} "
+        "BEGIN INSERT INTO {index}({index}, rowid, {columns}) "
+        "VALUES ('delete', old.id, {old}); "
+        "INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new}); END"
+    ]
+    return [statement.format(**names) for statement in create], \
+        'DROP TABLE IF EXISTS {index}'.format(**names)
+
+
+def _document_sql(columns):
+    return "to_tsvector('english', {})".format(
+        " || ' ' || ".join("coalesce({}, '')".format(column)
+                           for column in columns))
+
+
+def _postgresql_ddl(table, columns):
+    return 'CREATE INDEX ix_{}_search ON {} USING gin (({}))'.format(
+        table, table, _document_sql(columns))
+
+
+for _table, (_model, _columns) in searched.items():
+    _create, _drop = _sqlite_ddl(_table, _columns)
+    for _statement in _create:
+        event.listen(_model.__table__, 'after_create',
+                     DDL(_statement).execute_if(dialect='sqlite'))
+    event.listen(_model.__table__, 'after_drop',
+                 DDL(_drop).execute_if(dialect='sqlite'))
+    event.listen(_model.__table__, 'after_create',
+                 DDL(_postgresql_ddl(_table, _columns))
+                 .execute_if(dialect='postgresql'))
+
+
+def terms(text):
+    """The words in `text` that a search looks for."""
+    return re.findall(r'\w+', text or '')
+
+
+def search(kind, words):
+    """(query of `kind` matching all of `words`, rank to order it by
+    descending, or None to go by id).
+    """
+    model, columns = searched[kind]
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        index = db.table(kind + '_search', db.column('rowid'))
+        # FTS5 takes the table's own name as the column to match against
+        everything = db.literal_column(index.name)
+        # each word quoted, so nothing in them is taken as FTS5 syntax
+        match = ' '.join('"{}"'.format(word) for word in words)
+        query = model.query.join(index, index.c.rowid == model.id) \
+            .filter(everything.op('MATCH')(match))
+        # bm25() is lower for a better match
+        return query, -db.func.bm25(everything)
+    if dialect == 'postgresql':
+        document = db.literal_column(_document_sql(
+            ['{}.{}'.format(kind, column) for column in columns]))
+        wanted = db.func.plainto_tsquery(db.literal_column("'english'"),
+                                         ' '.join(words))
+        return model.query.filter(document.op('@@')(wanted)), \
+            db.func.ts_rank(document, wanted)
+    fields = [getattr(model, column) for column in columns]
+    return model.query.filter(db.and_(*[
+        db.or_(*[field.ilike('%' + word + '%') for field in fields])
+        for word in words])), None
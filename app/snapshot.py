@@ -0,0 +1,109 @@
+import threading
+import numpy as np
+from . import db
+from .bulk import hardware_fields
+from .models import (ChangeCounter, Revision, CinebenchR15Result,
+                     Futuremark3DMark06Result, Futuremark3DMarkResult)
+
+
+# Each result table as columns of NumPy arrays, for analysis that would
+# rather scan a few million numbers than parse a few million JSON objects
+# (see /snapshots and `flask snapshot`), and for the statistics endpoints.
+#
+# Every result carries its revision's hardware and its machine id along
+# with its own columns (NULL for a result whose revision has been deleted
+# from under it). Layout, per column:
+#
+#   integers      int64, with a bool '<name>.null' alongside if the column
+#                 can be NULL (the value there is then 0)
+#   decimals      float64, NaN for NULL
+#   dates         datetime64[us], NaT for NULL
+#   strings       int32 codes into '<name>.values', -1 for NULL, since the
+#                 likes of cpu_name repeat endlessly
+#
+# URLs are left out, every one being different.
+#
+# Each worker keeps the last snapshot of each table it built, until a write
+# to the table or to revisions bumps one of their change counters.
+
+result_models = (CinebenchR15Result, Futuremark3DMark06Result,
+                 Futuremark3DMarkResult)
+tables = {model.__tablename__: model for model in result_models}
+
+_CHUNK = 10000
+
+_built = {}
+_lock = threading.Lock()
+
+
+def _select(model):
+    columns = [column for column in model.__table__.c
+               if not column.key.endswith('url')]
+    hardware = [Revision.__table__.c[name] for name in hardware_fields]
+    return db.select(columns + [Revision.machine_id] + hardware) \
+        .select_from(model.__table__.outerjoin(Revision.__table__)) \
+        .order_by(model.id)
+
+
+def _encode(column, values):
+    # {name: array} for one column's values
+    name = column.name
+    if isinstance(column.type, db.Integer):
+        floats = np.array(values, dtype=np.float64)
+        null = np.isnan(floats)
+        floats[null] = 0
+        arrays = {name: floats.astype(np.int64)}
+        if column.nullable and not column.primary_key:
+            arrays[name + '.null'] = null
+        return arrays
+    if isinstance(column.type, db.Numeric):
+        return {name: np.array(values, dtype=np.float64)}
+    if isinstance(column.type, db.DateTime):
+        return {name: np.array(values, dtype='datetime64[us]')}
+    lookup = {}
+    codes = np.array([-1 if value is None
+                      else lookup.setdefault(value, len(lookup))
+                      for value in values], dtype=np.int32)
+    return {name: codes,
+            name + '.values': np.array(sorted(lookup, key=lookup.get),
+                                       dtype=np.str_)}
+
+
+def build(model):
+    """{name: array} for every row of `model` (see above)."""
+    query = _select(model)
+    result = db.session.execute(query.execution_options(stream_results=True))
+    values = [[] for column in query.columns]
+    try:
+        while True:
+            fetched = result.fetchmany(_CHUNK)
+            if not fetched:
+                break
+            for column, value in zip(values, zip(*fetched)):
+                column.extend(value)
+    finally:
+        result.close()
+    arrays = {}
+    for column, column_values in zip(query.columns, values):
+        arrays.update(_encode(column, column_values))
+    return arrays
+
+
+def snapshot(table):
+    """The current snapshot of `table`, building it if it's out of date."""
+    model = tables[table]
+    keys = (table, Revision.__tablename__)
+    # read before building, so a write racing the build just means
+    # building again next time
+    found = ChangeCounter.read(keys)
+    versions = tuple(found.get(key, (0,))[0] for key in keys)
+    built = _built.get(table)
+    if built is not None and built[0] == versions:
+        return built[1]
+    with _lock:
+        built = _built.get(table)
+        if built is not None and built[0] == versions:
+            return built[1]
+        arrays = build(model)
+        _built[table] = (versions, arrays)
+        return arrays
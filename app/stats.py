@@ -0,0 +1,145 @@
+import numpy as np
+from . import db
+from .bulk import hardware_fields
+from .snapshot import result_models, snapshot
+
+
+# Distributions of a benchmark score (see /stats), worked out over the
+# columns of a result table's snapshot rather than by handing clients
+# every result. Everything is vectorized over the whole column: sorting once
+# by (group, score) puts each group's scores in a slice of their own, so its
+# percentiles are just positions in it, and the counts, means and
+# histograms of every group are a bincount each.
+
+# every score column, by name
+metrics = {}
+for model in result_models:
+    for column in model.__table__.c:
+        if isinstance(column.type, (db.Integer, db.Numeric)) and \
+                not column.primary_key and not column.foreign_keys:
+            metrics[column.name] = model
+
+group_fields = hardware_fields
+
+percentiles = (('median', 50), ('p90', 90), ('p99', 99))
+
+
+def _valid(arrays, name):
+    # mask of the rows where `name` isn't NULL
+    null = arrays.get(name + '.null')
+    if null is not None:
+        return ~null
+    values = arrays[name]
+    if values.dtype.kind == 'f':
+        return ~np.isnan(values)
+    return np.ones(len(values), dtype=bool)
+
+
+def _groups(arrays, name, valid):
+    # (group of each valid row, the value each group stands for)
+    strings = arrays.get(name + '.values')
+    if strings is not None:
+        # already dictionary encoded, with NULL as -1
+        return arrays[name][valid] + 1, \
+            [None] + [str(string) for string in strings]
+    keys = arrays[name][valid]
+    null = arrays.get(name + '.null')
+    if null is not None:
+        # NULL is a group of its own, apart from any real 0s
+        keys = np.where(null[valid], np.iinfo(np.int64).min, keys)
+    keys, group = np.unique(keys, return_inverse=True)
+    return group, [None if key == np.iinfo(np.int64).min else int(key)
+                   for key in keys]
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 4)
+
+
+def _summary(count, total, minimum, maximum, quantiles, histogram):
+    summary = {'count': int(count),
+               'mean': _number(total / count),
+               'min': _number(minimum),
+               'max': _number(maximum)}
+    for (name, q), value in zip(percentiles, quantiles):
+        summary[name] = _number(value)
+    summary['histogram'] = [int(n) for n in histogram]
+    return summary
+
+
+def _quantiles(values, starts, counts):
+    # linear interpolation between the closest ranks, as numpy.percentile
+    # does, within each of the sorted slices values[start:start + count]
+    # (NaN for an empty one)
+    present = counts > 0
+    starts, counts = starts[present], counts[present]
+    found = []
+    for name, q in percentiles:
+        position = starts + (counts - 1) * (q / 100.0)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, starts + counts - 1)
+        fraction = position - below
+        quantile = np.full(len(present), np.nan)
+        quantile[present] = values[below] + \
+            (values[above] - values[below]) * fraction
+        found.append(quantile)
+    return found
+
+
+def distribution(metric, group_by=None, bins=20, min_count=1, limit=None):
+    """Count, mean, min, max, median, p90, p99 and a histogram of `metric`,
+    for each value of the revision column `group_by` (biggest group first,
+    at most `limit` of them), or overall.
+
+    Every histogram of a metric has the same bin edges, returned as 'bins'.
+    """
+    arrays = snapshot(metrics[metric].__tablename__)
+    valid = _valid(arrays, metric)
+    values = arrays[metric][valid].astype(np.float64)
+    low, high = (values.min(), values.max()) if len(values) else (0, 0)
+    width = max(high - low, 1)
+    stats = {'metric': metric,
+             'bins': [_number(edge)
+                      for edge in np.linspace(low, low + width, bins + 1)],
+             'count': int(len(values))}
+    if not len(values):
+        if group_by is not None:
+            stats.update(group_by=group_by, groups=[])
+        return stats
+    if group_by is None:
+        group, names = np.zeros(len(values), dtype=np.int64), [None]
+    else:
+        group, names = _groups(arrays, group_by, valid)
+
+    # the top edge belongs to the last bin, as with numpy.histogram
+    bin_of = np.minimum(((values - low) * (bins / width)).astype(np.int64),
+                        bins - 1)
+    counts = np.bincount(group, minlength=len(names))
+    totals = np.bincount(group, weights=values, minlength=len(names))
+    histograms = np.bincount(group * bins + bin_of,
+                             minlength=len(names) * bins) \
+        .reshape(len(names), bins)
+    # sorting by (group, value) in one go, without an argsort: offset each
+    # group's values past the one before's and sort those
+    span = 2.0 ** np.ceil(np.log2(width + 1))
+    ordered = np.sort(group * span + (values - low)) - \
+        np.repeat(np.arange(len(names)) * span, counts) + low
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    quantiles = _quantiles(ordered, starts, counts)
+
+    if group_by is None:
+        stats.update(_summary(counts[0], totals[0], ordered[0], ordered[-1],
+                              [q[0] for q in quantiles], histograms[0]))
+        return stats
+    groups = []
+    for i in np.argsort(-counts, kind='mergesort')[:limit]:
+        if counts[i] < max(min_count, 1):
+            break
+        last = starts[i] + counts[i] - 1
+        groups.append(dict(
+            _summary(counts[i], totals[i], ordered[starts[i]], ordered[last],
+                     [q[i] for q in quantiles], histograms[i]),
+            **{group_by: names[i]}))
+    stats.update(group_by=group_by, groups=groups)
+    return stats
@@ -0,0 +1,314 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import exc
+from . import db, leaderboards
+from .bulk import insert_many, parse_result
+from .models import JournalMark, Revision
+
+
+# Write-behind for result submissions (WRITE_BEHIND = True). When a few
+# hundred rigs post their results at once, each request holding a worker
+# through its own transaction (and every one of them queueing for SQLite's
+# write lock) is what gives out first. Instead a checked submission is
+# appended to a journal, a SQLite file of its own on local disk, and
+# answered with a 202 and the journal entry's id; a thread in each worker
+# moves whatever has queued up into the result tables every
+# WRITE_BEHIND_INTERVAL seconds, up to WRITE_BEHIND_BATCH at a time, in one
+# transaction per batch.
+#
+# The journal is synced before the 202 goes out, so an acknowledged
+# submission survives the worker or the host going down, and is flushed by
+# whichever worker starts next. Only one worker flushes at a time (they take
+# turns on a lock file next to the journal), in entry order, and each batch
+# records how far through the journal it got, and which result each entry
+# became or why it failed (JournalMark), in the same transaction as its
+# rows: if a flush dies after that commit but before the journal heard
+# about it, the next one puts exactly that into the journal first.
+#
+# Entries are kept, saved or failed, until `flask prune-queue` clears out
+# the old ones, so clients can look them up at /queued/<id>. Each host has a
+# journal (and so ids) of its own; with more than one, route a client's
+# status checks to the host it submitted to.
+#
+# Submissions are checked before they're queued, but if the database still
+# turns a batch down, it's retried an entry at a time and whichever entries
+# it won't take are marked failed, so one bad entry can't hold up the rest
+# of the queue. Anything else (the database being down, say) leaves the
+# batch queued for the next flush.
+
+_schema = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    # AUTOINCREMENT so an id is never handed out twice, even after pruning
+    'CREATE TABLE IF NOT EXISTS entries ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+    'revision_id INTEGER NOT NULL, '
+    'item TEXT NOT NULL, '
+    'received_at TEXT NOT NULL, '
+    "status TEXT NOT NULL DEFAULT 'queued', "
+    'result_id INTEGER, '
+    'error TEXT, '
+    'saved_at TEXT)',
+    'CREATE INDEX IF NOT EXISTS entries_queued ON entries (id) '
+    "WHERE status = 'queued'",
+    'CREATE INDEX IF NOT EXISTS entries_received_at '
+    'ON entries (received_at)'
+]
+
+
+def _time(value):
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f') \
+        if value is not None else None
+
+
+def _text(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+def _rejected(error):
+    # whether the database turned down the rows themselves, rather than
+    # not being there to take them
+    if isinstance(error, (exc.DataError, exc.IntegrityError,
+                          OverflowError)):
+        return True
+    # a value the driver couldn't even send
+    return isinstance(error, exc.StatementError) and \
+        not isinstance(error, exc.DBAPIError)
+
+
+class Journal(object):
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _connection(self):
+        # one per thread, and none carried over a fork
+        local = self._local
+        path = current_app.config['WRITE_BEHIND_JOURNAL']
+        if getattr(local, 'key', None) != (os.getpid(), path):
+            connection = sqlite3.connect(path, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            # WAL's default only syncs at checkpoints, which could lose a
+            # submission that's already been acknowledged
+            connection.execute('PRAGMA synchronous = FULL')
+            for statement in _schema:
+                connection.execute(statement)
+            connection.execute(
+                "INSERT OR IGNORE INTO meta VALUES ('journal', ?)",
+                (os.urandom(16).hex(),))
+            local.connection, local.key = connection, (os.getpid(), path)
+            local.id = connection.execute(
+                "SELECT value FROM meta WHERE key = 'journal'").fetchone()[0]
+        return local.connection
+
+    def id(self):
+        """What the database knows this journal as (see JournalMark)."""
+        self._connection()
+        return self._local.id
+
+    def enqueue(self, revision_id, items, now=None):
+        """Append checked result submissions (as parse_result() takes
+        them) for `revision_id`, returning their entry ids in order.
+        """
+        now = _text(now or datetime.utcnow())
+        connection = self._connection()
+        ids = []
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            for item in items:
+                ids.append(connection.execute(
+                    'INSERT INTO entries (revision_id, item, received_at) '
+                    'VALUES (?, ?, ?)',
+                    (revision_id, json.dumps(item), now)).lastrowid)
+        return ids
+
+    def status(self, ids):
+        """{id: entry} of those of `ids` still in the journal, each entry a
+        dict of its revision_id, type, status, result_id, error,
+        received_at and saved_at.
+        """
+        ids = list(ids)
+        rows = self._connection().execute(
+            'SELECT id, revision_id, item, status, result_id, error, '
+            'received_at, saved_at FROM entries WHERE id IN ({})'.format(
+                ', '.join('?' * len(ids))), ids) if ids else ()
+        found = {}
+        for id, revision_id, item, status, result_id, error, received_at, \
+                saved_at in rows:
+            found[id] = {'revision_id': revision_id,
+                         'type': json.loads(item).get('type'),
+                         'status': status, 'result_id': result_id,
+                         'error': json.loads(error) if error else None,
+                         'received_at': _time(received_at),
+                         'saved_at': _time(saved_at)}
+        return found
+
+    def depth(self):
+        """(entries waiting to be flushed, received time of the oldest)."""
+        count, oldest = self._connection().execute(
+            "SELECT count(*), min(received_at) FROM entries "
+            "WHERE status = 'queued'").fetchone()
+        return count, _time(oldest)
+
+    def _turn(self):
+        # the lock file, if no other worker is flushing, else None
+        f = open(current_app.config['WRITE_BEHIND_JOURNAL'] + '.lock', 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def flush(self):
+        """Move queued entries into the database, a batch per transaction.
+        Returns how many were saved, or None if another worker is at it.
+        """
+        turn = self._turn()
+        if turn is None:
+            return None
+        try:
+            connection = self._connection()
+            journal = self.id()
+            # finish off a flush that committed and then died
+            mark = JournalMark.query.get(journal)
+            if mark is not None and mark.last_batch is not None:
+                self._record(json.loads(mark.last_batch), mark.flushed_at)
+            saved = 0
+            while True:
+                entries = connection.execute(
+                    "SELECT id, revision_id, item, received_at FROM entries "
+                    "WHERE status = 'queued' ORDER BY id LIMIT ?",
+                    (current_app.config['WRITE_BEHIND_BATCH'],)).fetchall()
+                if not entries:
+                    return saved
+                try:
+                    saved += self._flush_batch(journal, entries)
+                except Exception as e:
+                    db.session.rollback()
+                    if not _rejected(e):
+                        raise
+                    saved += self._flush_singly(journal, entries)
+        finally:
+            turn.close()
+
+    def _flush_singly(self, journal, entries):
+        # to find which of a batch the database won't take
+        saved = 0
+        for entry in entries:
+            try:
+                saved += self._flush_batch(journal, [entry])
+            except Exception as e:
+                db.session.rollback()
+                if not _rejected(e):
+                    raise
+                current_app.logger.warning(
+                    'Queued submission %d was turned down by the '
+                    'database: %s', entry[0], e)
+                with self._connection() as connection:
+                    connection.execute(
+                        "UPDATE entries SET status = 'failed', error = ?, "
+                        "saved_at = ? WHERE id = ?",
+                        (json.dumps({'result': 'the database would not '
+                                               'store it'}),
+                         _text(datetime.utcnow()), entry[0]))
+        return saved
+
+    def _flush_batch(self, journal, entries):
+        # the API imports this module, so not at the top
+        from .api_1_0.cache import touch
+
+        revision_ids = {entry[1] for entry in entries}
+        # a revision deleted since its results were queued takes them
+        # with it
+        existing = {id for id, in db.session.query(Revision.id)
+                    .filter(Revision.id.in_(revision_ids))}
+        by_model, saving, failed = {}, [], []
+        for id, revision_id, item, received_at in entries:
+            if revision_id not in existing:
+                failed.append((id, {'revision': 'no longer exists'}))
+                continue
+            try:
+                model, row = parse_result(json.loads(item),
+                                          _time(received_at))
+            except ValueError as e:
+                failed.append((id, e.args[0]))
+                continue
+            row['revision_id'] = revision_id
+            by_model.setdefault(model, []).append(row)
+            saving.append((id, row))
+        for model, rows in by_model.items():
+            for row, result_id in zip(rows, insert_many(model.__table__,
+                                                        rows)):
+                row['id'] = result_id
+        touch(rows={model.__tablename__: rows
+                    for model, rows in by_model.items()})
+        now = datetime.utcnow()
+        batch = {'saved': [[id, row['id']] for id, row in saving],
+                 'failed': [[id, error] for id, error in failed]}
+        db.session.merge(JournalMark(journal=journal,
+                                     flushed_through=entries[-1][0],
+                                     flushed_at=now,
+                                     last_batch=json.dumps(batch)))
+        db.session.commit()
+        leaderboards.record_rows(by_model)
+
+        self._record(batch, now)
+        return len(saving)
+
+    def _record(self, batch, now):
+        # put what became of a batch's entries (as JournalMark.last_batch
+        # has it) into the journal; those it already has are left alone
+        now = _text(now)
+        with self._connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                "UPDATE entries SET status = 'saved', result_id = ?, "
+                "saved_at = ? WHERE id = ? AND status = 'queued'",
+                [(result_id, now, id) for id, result_id in batch['saved']])
+            connection.executemany(
+                "UPDATE entries SET status = 'failed', error = ?, "
+                "saved_at = ? WHERE id = ? AND status = 'queued'",
+                [(json.dumps(error), now, id)
+                 for id, error in batch['failed']])
+
+    def prune(self, older_than):
+        """Forget saved and failed entries received more than
+        `older_than` (a timedelta) ago, returning how many.
+        """
+        with self._connection() as connection:
+            return connection.execute(
+                "DELETE FROM entries WHERE status != 'queued' "
+                "AND received_at < ?",
+                (_text(datetime.utcnow() - older_than),)).rowcount
+
+    def start(self, app):
+        """Start this process's flusher thread, if it hasn't one yet."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, args=(app,),
+                         name='write-behind', daemon=True).start()
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Flushing queued submissions failed')
+                finally:
+                    db.session.remove()
+            time.sleep(app.config['WRITE_BEHIND_INTERVAL'])
+
+
+journal = Journal()
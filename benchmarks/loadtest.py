@@ -0,0 +1,576 @@
+"""Load test the API end to end against a generated database.
+
+    (venv) $ python -m benchmarks.loadtest --machines 10000 \\
+        --revisions 100000 --results 1000000 --clients 32 --duration 60 \\
+        --output before.json
+    (venv) $ python -m benchmarks.loadtest ... --output after.json \\
+        --baseline before.json
+
+Generates a database of made up users, machines, revisions and results
+(the same one for the same sizes and --seed, kept in the temp directory
+between runs), then serves the app (create_app('testing'), set up as
+rivalrockets-api.py sets it up) from one process with a thread per
+connection, and has --clients threads send it a mix of list, detail,
+leaderboard, login and submission requests for --duration seconds. Each
+run works on a fresh copy of the database, so runs with the same settings
+start from the same place.
+
+Reports each endpoint's p50, p95 and p99 latency, throughput and the SQL
+statements it ran (from X-Query-Count), and writes all of it out as JSON
+with --output; --baseline compares the run against an earlier one.
+"""
+import argparse
+import bisect
+import http.client
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'loadtest'
+
+# what a generated revision can be built from
+_cpus = [('AMD', 'Ryzen 5 1600', 'AM4', 6, 3200),
+         ('AMD', 'Ryzen 7 1700', 'AM4', 8, 3000),
+         ('AMD', 'Ryzen 7 2700X', 'AM4', 8, 3700),
+         ('AMD', 'Ryzen Threadripper 1950X', 'TR4', 16, 3400),
+         ('AMD', 'FX-8350', 'AM3+', 8, 4000),
+         ('Intel', 'Core i5-8400', 'LGA1151', 6, 2800),
+         ('Intel', 'Core i7-8700K', 'LGA1151', 6, 3700),
+         ('Intel', 'Core i7-7700K', 'LGA1151', 4, 4200),
+         ('Intel', 'Core i9-7900X', 'LGA2066', 10, 3300),
+         ('Intel', 'Core 2 Quad Q6600', 'LGA775', 4, 2400)]
+_gpus = [('NVIDIA', 'GTX 1060', 6144), ('NVIDIA', 'GTX 1070', 8192),
+         ('NVIDIA', 'GTX 1080', 8192), ('NVIDIA', 'GTX 1080 Ti', 11264),
+         ('NVIDIA', 'GTX 970', 4096), ('AMD', 'RX 580', 8192),
+         ('AMD', 'RX Vega 64', 8192), ('AMD', 'R9 390', 8192)]
+_chipsets = {'AM4': 'X370', 'TR4': 'X399', 'AM3+': '990FX',
+             'LGA1151': 'Z370', 'LGA2066': 'X299', 'LGA775': 'P35'}
+
+# share of the results that are of each benchmark
+_result_shares = (('cinebenchr15results', 0.5),
+                  ('futuremark3dmark06results', 0.2),
+                  ('futuremark3dmarkresults', 0.3))
+
+
+def load_app():
+    """The app as rivalrockets-api.py makes it, with the testing config."""
+    os.environ['FLASK_CONFIG'] = 'testing'
+    spec = importlib.util.spec_from_file_location(
+        'rivalrockets_api', os.path.join(basedir, 'rivalrockets-api.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def configure(app, path, write_behind=False, hash_workers=0):
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    # testing hashes passwords inline, which holds up every other thread
+    # while a login is checked; served, it should go to the pool as it
+    # does in production
+    app.config['HASH_POOL_WORKERS'] = hash_workers
+    app.config['WRITE_BEHIND'] = write_behind
+    app.config['WRITE_BEHIND_JOURNAL'] = path + '.journal'
+    return app
+
+
+# Generating the database
+
+def _chunks(rows, size=50000):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(app, users, machines, revisions, results, seed):
+    """Fill the (empty) database `app` points at with made up data."""
+    from app import db
+    from app.models import (Machine, Revision, Role, User,
+                            CinebenchR15Result, Futuremark3DMark06Result,
+                            Futuremark3DMarkResult)
+
+    rng = random.Random(seed)
+    start = datetime(2016, 1, 1)
+    span = (datetime(2018, 10, 1) - start).total_seconds()
+
+    def when():
+        return start + timedelta(seconds=rng.random() * span)
+
+    def insert(model, rows):
+        for chunk in _chunks(rows):
+            db.session.execute(model.__table__.insert(), chunk)
+            db.session.commit()
+
+    with app.app_context():
+        db.create_all()
+        Role.insert_roles()
+        role = Role.query.filter_by(default=True).first()
+        # hashing is slow on purpose, so everyone shares the one password
+        user = User()
+        user.hash_password(PASSWORD)
+        password_hash = user.password_hash
+        insert(User, ({'id': i, 'username': 'loadtest{}'.format(i),
+                       'role_id': role.id, 'password_hash': password_hash,
+                       'auth_version': 0}
+                      for i in range(1, users + 1)))
+
+        # every machine gets a revision, the rest go anywhere; the newest
+        # of each machine's is its active one
+        owners = [rng.randint(1, users) for _ in range(machines)]
+        revision_machines = list(range(1, machines + 1)) + \
+            [rng.randint(1, machines)
+             for _ in range(max(revisions - machines, 0))]
+        revision_machines = revision_machines[:revisions]
+        active = {}
+        for id, machine_id in enumerate(revision_machines, 1):
+            active[machine_id] = id
+        insert(Machine, ({'id': i, 'system_name': 'Rig {}'.format(i),
+                          'system_notes': rng.choice(
+                              ['', 'water cooled', 'overclocked',
+                               'small form factor', 'LAN party box']),
+                          'owner': 'loadtest{}'.format(owners[i - 1]),
+                          'author_id': owners[i - 1],
+                          'active_revision_id': active.get(i),
+                          'timestamp': when()}
+                         for i in range(1, machines + 1)))
+
+        hardware = []
+
+        def revision_rows():
+            for id, machine_id in enumerate(revision_machines, 1):
+                cpu_make, cpu_name, socket, cores, mhz = rng.choice(_cpus)
+                gpu_make, gpu_name, gpu_memory = rng.choice(_gpus)
+                hardware.append((cores, mhz))
+                yield {'id': id, 'cpu_make': cpu_make, 'cpu_name': cpu_name,
+                       'cpu_socket': socket, 'cpu_mhz': mhz,
+                       'cpu_proc_cores': cores, 'chipset': _chipsets[socket],
+                       'system_memory_gb': rng.choice((8, 16, 32, 64)),
+                       'system_memory_mhz': rng.choice((2133, 2400, 3200)),
+                       'gpu_name': gpu_name, 'gpu_make': gpu_make,
+                       'gpu_memory_mb': gpu_memory,
+                       'gpu_count': rng.choice((1, 1, 1, 2)),
+                       'revision_notes': '', 'timestamp': when(),
+                       'author_id': owners[machine_id - 1],
+                       'machine_id': machine_id}
+        insert(Revision, revision_rows())
+
+        def score(revision_id, scale):
+            # roughly in line with the hardware, give or take
+            cores, mhz = hardware[revision_id - 1]
+            return int(cores * mhz * scale * rng.uniform(0.85, 1.15))
+
+        def result_rows(table, count):
+            for _ in range(count):
+                revision_id = rng.randint(1, revisions)
+                row = {'result_date': when(), 'revision_id': revision_id}
+                if table == 'cinebenchr15results':
+                    row.update(cpu_cb=score(revision_id, 0.055),
+                               opengl_fps=rng.randint(60, 180))
+                elif table == 'futuremark3dmark06results':
+                    row.update(overall_score=score(revision_id, 0.9),
+                               sm2_score=rng.randint(6000, 12000),
+                               sm3_score=rng.randint(7000, 14000),
+                               cpu_score=score(revision_id, 0.25),
+                               proxcyon_fps=round(rng.uniform(20, 90), 2),
+                               fireflyforest_fps=round(rng.uniform(20, 90),
+                                                       2),
+                               result_url=None)
+                else:
+                    scores = {'icestorm_score': score(revision_id, 6),
+                              'cloudgate_score': score(revision_id, 1.2),
+                              'firestrike_score': score(revision_id, 0.6),
+                              'skydiver_score': score(revision_id, 1.3)}
+                    row.update(scores, aggregate_score=Futuremark3DMarkResult
+                               .calculate_aggregate_score(**scores))
+                yield row
+        for table, share in _result_shares:
+            model = {'cinebenchr15results': CinebenchR15Result,
+                     'futuremark3dmark06results': Futuremark3DMark06Result,
+                     'futuremark3dmarkresults': Futuremark3DMarkResult}[table]
+            insert(model, result_rows(table, int(results * share)))
+        db.session.execute('ANALYZE')
+        db.session.commit()
+        db.get_engine(app).dispose()
+
+
+def database(args):
+    """Path to a fresh copy of the database for `args`' sizes, generating
+    the database first if it hasn't been yet.
+    """
+    name = 'rivalrockets-loadtest-{}-{}-{}-{}-{}.sqlite'.format(
+        args.users, args.machines, args.revisions, args.results, args.seed)
+    pristine = os.path.join(args.data_dir, name)
+    if args.regenerate and os.path.exists(pristine):
+        os.remove(pristine)
+    if not os.path.exists(pristine):
+        print('Generating {} users, {} machines, {} revisions and {} '
+              'results into {}'.format(args.users, args.machines,
+                                       args.revisions, args.results,
+                                       pristine))
+        started = time.perf_counter()
+        building = pristine + '.building'
+        if os.path.exists(building):
+            os.remove(building)
+        generate(configure(load_app(), building), args.users, args.machines,
+                 args.revisions, args.results, args.seed)
+        os.rename(building, pristine)
+        print('Generated in {:.1f}s'.format(time.perf_counter() - started))
+    copy = pristine[:-len('.sqlite')] + '-run.sqlite'
+    for path in (copy, copy + '.journal', copy + '.journal-wal',
+                 copy + '.journal-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.copyfile(pristine, copy)
+    return copy
+
+
+# Serving it
+
+def _serve(path, write_behind, hash_workers):
+    # (--serve) run the server in this process, saying on stdout which
+    # port it got
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    # exit the usual way when told to, so the hashing pool's processes
+    # are shut down too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    app = configure(load_app(), path, write_behind, hash_workers)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def serve(path, write_behind, hash_workers):
+    """(process serving the app on `path`, its port)."""
+    command = [sys.executable, '-m', 'benchmarks.loadtest', '--serve', path,
+               '--hash-workers', str(hash_workers)]
+    if write_behind:
+        command.append('--write-behind')
+    process = subprocess.Popen(command, cwd=basedir, stdout=subprocess.PIPE)
+    return process, int(process.stdout.readline())
+
+
+# The requests
+
+def _ids(path):
+    connection = sqlite3.connect(path)
+    ids = {table: connection.execute(
+        'SELECT max(id) FROM {}'.format(table)).fetchone()[0] or 1
+        for table in ('users', 'machines', 'revisions',
+                      'cinebenchr15results', 'futuremark3dmark06results',
+                      'futuremark3dmarkresults')}
+    connection.close()
+    return ids
+
+
+def _leaderboard_rank(rng, ids):
+    board, table = rng.choice((('cpu_cb', 'cinebenchr15results'),
+                               ('aggregate_score',
+                                'futuremark3dmarkresults')))
+    return '/leaderboards/{}/ranks/{}'.format(
+        board, rng.randint(1, max(ids[table] // 2, 1)))
+
+
+def _result_submission(rng, ids):
+    return {'cpu_cb': rng.randint(300, 4000),
+            'opengl_fps': rng.randint(60, 180)}
+
+
+def _bulk_submission(rng, ids):
+    return {'results': [
+        {'type': 'cinebenchr15result', 'cpu_cb': rng.randint(300, 4000)},
+        {'type': 'futuremark3dmarkresult',
+         'icestorm_score': rng.randint(50000, 250000),
+         'firestrike_score': rng.randint(5000, 25000)},
+        {'type': 'futuremark3dmark06result',
+         'overall_score': rng.randint(10000, 40000)}]}
+
+
+# (weight, name, method, path(rng, ids), body(rng, ids) or None, signed in)
+mix = [
+    (8, 'GET /machines', 'GET', lambda rng, ids: '/machines', None, False),
+    (8, 'GET /revisions', 'GET',
+     lambda rng, ids: '/revisions', None, False),
+    (6, 'GET /revisions?cpu_make=', 'GET',
+     lambda rng, ids: '/revisions?cpu_make=' + rng.choice(('AMD', 'Intel')),
+     None, False),
+    (8, 'GET /cinebenchr15results', 'GET',
+     lambda rng, ids: '/cinebenchr15results', None, False),
+    (4, 'GET /futuremark3dmarkresults', 'GET',
+     lambda rng, ids: '/futuremark3dmarkresults', None, False),
+    (5, 'GET /revisions/<id>/cinebenchr15results', 'GET',
+     lambda rng, ids: '/revisions/{}/cinebenchr15results'.format(
+         rng.randint(1, ids['revisions'])), None, False),
+    (8, 'GET /machines/<id>', 'GET',
+     lambda rng, ids: '/machines/{}'.format(rng.randint(1, ids['machines'])),
+     None, False),
+    (8, 'GET /revisions/<id>', 'GET',
+     lambda rng, ids: '/revisions/{}'.format(
+         rng.randint(1, ids['revisions'])), None, False),
+    (8, 'GET /cinebenchr15results/<id>', 'GET',
+     lambda rng, ids: '/cinebenchr15results/{}'.format(
+         rng.randint(1, ids['cinebenchr15results'])), None, False),
+    (4, 'GET /futuremark3dmark06results/<id>', 'GET',
+     lambda rng, ids: '/futuremark3dmark06results/{}'.format(
+         rng.randint(1, ids['futuremark3dmark06results'])), None, False),
+    (6, 'GET /leaderboards/<metric>', 'GET',
+     lambda rng, ids: '/leaderboards/' + rng.choice(
+         ('cpu_cb', 'opengl_fps', 'overall_score', 'aggregate_score')),
+     None, False),
+    (5, 'GET /leaderboards/<metric>/ranks/<rank>', 'GET',
+     _leaderboard_rank, None, False),
+    (3, 'POST /login', 'POST', lambda rng, ids: '/login',
+     lambda rng, ids: {'username': 'loadtest{}'.format(
+         rng.randint(1, ids['users'])), 'password': PASSWORD}, False),
+    (6, 'POST /revisions/<id>/cinebenchr15results', 'POST',
+     lambda rng, ids: '/revisions/{}/cinebenchr15results'.format(
+         rng.randint(1, ids['revisions'])), _result_submission, True),
+    (3, 'POST /revisions/<id>/results', 'POST',
+     lambda rng, ids: '/revisions/{}/results'.format(
+         rng.randint(1, ids['revisions'])), _bulk_submission, True)
+]
+
+
+def _request(connection, method, path, body=None, token=None):
+    headers = {}
+    if body is not None:
+        body = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    if token is not None:
+        headers['Authorization'] = 'Bearer ' + token
+    connection.request(method, '/api/v1.0' + path, body, headers)
+    response = connection.getresponse()
+    data = response.read()
+    return response.status, response.getheader('X-Query-Count'), data
+
+
+def _client(port, ids, seed, warmup_until, stop_at, samples):
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    status, _, data = _request(connection, 'POST', '/login', {
+        'username': 'loadtest{}'.format(rng.randint(1, ids['users'])),
+        'password': PASSWORD})
+    token = json.loads(data.decode('utf-8'))['access_token']
+    weights = []
+    for weight, *_ in mix:
+        weights.append((weights[-1] if weights else 0) + weight)
+    while True:
+        now = time.perf_counter()
+        if now >= stop_at:
+            break
+        weight, name, method, path, body, signed_in = \
+            mix[bisect.bisect_right(weights, rng.random() * weights[-1])]
+        started = time.perf_counter()
+        try:
+            status, queries, _ = _request(
+                connection, method, path(rng, ids),
+                body(rng, ids) if body is not None else None,
+                token if signed_in else None)
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            status, queries = None, None
+        elapsed = time.perf_counter() - started
+        if started >= warmup_until:
+            samples.append((name, started, elapsed, status,
+                            int(queries) if queries is not None else None))
+    connection.close()
+
+
+# Reporting
+
+def _percentile(ordered, p):
+    # nearest rank, as /metrics works out the hashing pool's latencies
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def _summary(samples, duration):
+    latencies = sorted(elapsed for _, _, elapsed, _, _ in samples)
+    queries = [count for _, _, _, _, count in samples if count is not None]
+    errors = sum(1 for _, _, _, status, _ in samples
+                 if status is None or status >= 400)
+
+    def ms(seconds):
+        return round(seconds * 1000, 2) if seconds is not None else None
+
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput': round(len(samples) / duration, 2),
+        'latency_ms': {'p50': ms(_percentile(latencies, 50)),
+                       'p95': ms(_percentile(latencies, 95)),
+                       'p99': ms(_percentile(latencies, 99)),
+                       'mean': ms(sum(latencies) / len(latencies))
+                       if latencies else None,
+                       'max': ms(latencies[-1]) if latencies else None},
+        'sql_statements': {
+            'mean': round(sum(queries) / len(queries), 2)
+            if queries else None,
+            'max': max(queries) if queries else None}
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=basedir,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _shown(value):
+    return '-' if value is None else value
+
+
+def report(results, baseline=None):
+    print('{:<44}{:>8}{:>7}{:>9}{:>9}{:>9}{:>9}{:>6}'.format(
+        'endpoint', 'reqs', 'errs', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+        'SQL'))
+    rows = sorted(results['endpoints'].items()) + \
+        [('all', results['total'])]
+    for name, summary in rows:
+        latency = summary['latency_ms']
+        print('{:<44}{:>8}{:>7}{:>9.1f}{:>9}{:>9}{:>9}{:>6}'.format(
+            name, summary['requests'], summary['errors'],
+            summary['throughput'],
+            *[_shown(value) for value in (
+                latency['p50'], latency['p95'], latency['p99'],
+                summary['sql_statements']['mean'])]))
+    if baseline is None:
+        return
+
+    def change(new, old):
+        if new is None or not old:
+            return '-'
+        return '{:+.0f}%'.format((new - old) / old * 100)
+
+    print('\nAgainst {} ({}):'.format(baseline.get('commit') or 'baseline',
+                                      baseline.get('started_at')))
+    print('{:<44}{:>9}{:>9}{:>9}{:>9}{:>6}'.format(
+        'endpoint', 'req/s', 'p50', 'p95', 'p99', 'SQL'))
+    old_rows = dict(baseline['endpoints'], all=baseline['total'])
+    for name, summary in rows:
+        old = old_rows.get(name)
+        if old is None:
+            continue
+        new_sql = summary['sql_statements']['mean']
+        old_sql = old['sql_statements']['mean']
+        print('{:<44}{:>9}{:>9}{:>9}{:>9}{:>6}'.format(
+            name, change(summary['throughput'], old['throughput']),
+            *[change(summary['latency_ms'][p], old['latency_ms'][p])
+              for p in ('p50', 'p95', 'p99')],
+            '{:+.1f}'.format(new_sql - old_sql)
+            if new_sql is not None and old_sql is not None else '-'))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--users', type=int, default=1000)
+    argparser.add_argument('--machines', type=int, default=10000)
+    argparser.add_argument('--revisions', type=int, default=100000)
+    argparser.add_argument('--results', type=int, default=1000000)
+    argparser.add_argument('--seed', type=int, default=1)
+    argparser.add_argument('--data-dir', default=tempfile.gettempdir(),
+                           help='where generated databases are kept')
+    argparser.add_argument('--regenerate', action='store_true',
+                           help="generate the database even if it's there")
+    argparser.add_argument('--clients', type=int, default=16)
+    argparser.add_argument('--duration', type=float, default=30,
+                           help='seconds to measure for')
+    argparser.add_argument('--warmup', type=float, default=5,
+                           help='seconds of load before measuring')
+    argparser.add_argument('--hash-workers', type=int, default=2,
+                           help='HASH_POOL_WORKERS to serve with')
+    argparser.add_argument('--write-behind', action='store_true',
+                           help='queue submissions (see app/writebehind.py)')
+    argparser.add_argument('--output', help='write the results here as JSON')
+    argparser.add_argument('--baseline',
+                           help='JSON from an earlier run to compare with')
+    argparser.add_argument('--serve', metavar='DATABASE',
+                           help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+    if args.serve:
+        return _serve(args.serve, args.write_behind, args.hash_workers)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    path = database(args)
+    ids = _ids(path)
+    server, port = serve(path, args.write_behind, args.hash_workers)
+    try:
+        # the first request builds the leaderboards, keep it out of it
+        connection = http.client.HTTPConnection('127.0.0.1', port,
+                                                timeout=600)
+        _request(connection, 'GET', '/metrics')
+        connection.close()
+        print('Running {} clients for {:g}s (after {:g}s warming up)'.format(
+            args.clients, args.duration, args.warmup))
+        started_at = datetime.utcnow()
+        begin = time.perf_counter()
+        warmup_until = begin + args.warmup
+        stop_at = warmup_until + args.duration
+        samples = []
+        clients = [threading.Thread(target=_client, args=(
+            port, ids, args.seed * 1000 + n, warmup_until, stop_at, samples))
+            for n in range(args.clients)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    by_name = {}
+    for sample in samples:
+        by_name.setdefault(sample[0], []).append(sample)
+    results = {
+        'started_at': started_at.isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'dataset': {'users': args.users, 'machines': args.machines,
+                    'revisions': args.revisions, 'results': args.results,
+                    'seed': args.seed},
+        'load': {'clients': args.clients, 'duration': args.duration,
+                 'warmup': args.warmup, 'hash_workers': args.hash_workers,
+                 'write_behind': args.write_behind},
+        'total': _summary(samples, args.duration),
+        'endpoints': {name: _summary(named, args.duration)
+                      for name, named in by_name.items()}
+    }
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
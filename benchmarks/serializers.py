@@ -0,0 +1,90 @@
+"""Compare the compiled serializers against flask_restful's marshal.
+
+    (venv) $ python -m benchmarks.serializers --rows 10000
+
+Builds a result -> revision -> machine -> user graph in memory (no database
+involved) and times marshalling it both ways, after checking that both
+produce exactly the same output.
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask_restful import marshal
+from app import create_app
+from app.models import (User, Machine, Revision, CinebenchR15Result,
+                        Futuremark3DMark06Result, Futuremark3DMarkResult)
+from app.api_1_0.serializers import serialize
+from app.api_1_0.resources.cinebenchr15results import \
+    cinebenchr15result_fields
+from app.api_1_0.resources.futuremark3dmark06results import \
+    futuremark3dmark06result_fields
+from app.api_1_0.resources.futuremark3dmarkresults import \
+    futuremark3dmarkresult_fields
+
+
+def build_rows(count):
+    start = datetime(2018, 1, 1)
+    user = User(id=1, username='benchmark')
+    revisions = []
+    for i in range(max(1, count // 10)):
+        machine = Machine(id=i + 1, system_name='machine {}'.format(i),
+                          system_notes='', owner='benchmark', user=user,
+                          timestamp=start + timedelta(hours=i))
+        revision = Revision(id=i + 1, cpu_make='AMD',
+                            cpu_name='Ryzen 7 {}'.format(1700 + i % 100),
+                            cpu_mhz=3700, cpu_proc_cores=8,
+                            gpu_make='NVIDIA', gpu_name='GTX 1080',
+                            system_memory_gb=16, machine=machine,
+                            timestamp=start + timedelta(hours=i))
+        machine.active_revision = revision
+        revisions.append(revision)
+
+    cinebench, futuremark06, futuremark = [], [], []
+    for i in range(count):
+        revision = revisions[i % len(revisions)]
+        result_date = start + timedelta(minutes=i)
+        cinebench.append(CinebenchR15Result(
+            id=i + 1, cpu_cb=1400 + i % 300, opengl_fps=120 + i % 40,
+            result_date=result_date, revision=revision))
+        futuremark06.append(Futuremark3DMark06Result(
+            id=i + 1, overall_score=20000 + i, sm2_score=8000, sm3_score=9000,
+            cpu_score=7000, proxcyon_fps=Decimal('41.37'),
+            fireflyforest_fps=Decimal('35.1'), cpu1_fps=Decimal('2.5'),
+            cpu2_fps=Decimal('3.75'), canyonflight_fps=Decimal('60.12'),
+            deepfreeze_fps=Decimal('59.99'), result_date=result_date,
+            revision=revision))
+        futuremark.append(Futuremark3DMarkResult(
+            id=i + 1, icestorm_score=150000, cloudgate_score=30000,
+            firestrike_score=18000 + i % 500, skydiver_score=40000,
+            result_date=result_date, revision=revision))
+    return [('cinebenchr15results', cinebench, cinebenchr15result_fields),
+            ('futuremark3dmark06results', futuremark06,
+             futuremark3dmark06result_fields),
+            ('futuremark3dmarkresults', futuremark,
+             futuremark3dmarkresult_fields)]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--rows', type=int, default=10000)
+    argparser.add_argument('--repeat', type=int, default=3)
+    args = argparser.parse_args()
+
+    app = create_app('testing')
+    print('{:<28}{:>12}{:>12}{:>10}'.format('field map', 'marshal',
+                                            'serialize', 'speedup'))
+    for envelope, rows, field_map in build_rows(args.rows):
+        with app.test_request_context('/api/v1.0/' + envelope):
+            assert serialize(rows, field_map) == \
+                [dict(row) for row in marshal(rows, field_map)], envelope
+            before = min(timeit.repeat(lambda: marshal(rows, field_map),
+                                       number=1, repeat=args.repeat))
+            after = min(timeit.repeat(lambda: serialize(rows, field_map),
+                                      number=1, repeat=args.repeat))
+        print('{:<28}{:>11.3f}s{:>11.3f}s{:>9.1f}x'.format(
+            envelope, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
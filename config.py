@@ -11,6 +11,27 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'there is poison in the well'
     JWT_BLACKLIST_ENABLED = True
     JWT_BLACKLIST_TOKEN_CHECKS = ['access', 'refresh']
+    JWT_CLAIMS_IN_REFRESH_TOKEN = True
+    JWT_BLACKLIST_CACHE_SIZE = 4096
+    # how long a revocation can take to reach other workers, in seconds
+    JWT_BLACKLIST_RECHECK = 1
+    HASH_POOL_WORKERS = 2
+    HASH_POOL_QUEUE = 8
+    HASH_POOL_TIMEOUT = 10
+    API_PAGE_LIMIT = 50
+    API_PAGE_LIMIT_MAX = 500
+    API_STREAM_CHUNK = 500
+    API_QUERY_CEILING = 10
+    API_CACHE_SIZE = 1024
+    API_CACHE_MAX_TAGS = 256
+    API_BULK_LIMIT = 1000
+    API_COMPARE_LIMIT = 10
+    # queue result submissions and save them in batches, see writebehind.py
+    WRITE_BEHIND = bool(os.environ.get('WRITE_BEHIND'))
+    WRITE_BEHIND_JOURNAL = os.environ.get('WRITE_BEHIND_JOURNAL') or \
+        os.path.join(basedir, 'write-behind.sqlite')
+    WRITE_BEHIND_BATCH = 1000
+    WRITE_BEHIND_INTERVAL = 0.5
 
     @staticmethod
     def init_app(app):
@@ -25,6 +46,7 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    HASH_POOL_WORKERS = 0
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///' + os.path.join(basedir,
                                                                                                  'data-test.sqlite')
     WTF_CSRF_ENABLED = False
@@ -66,6 +66,11 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the full-text search tables and indexes are made by hand (see
+    # app/search.py), so autogenerate mustn't offer to drop them
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (reflected and compare_to is None and '_search' in name)
+
     engine = engine_from_config(config.get_section(config.config_ini_section),
                                 prefix='sqlalchemy.',
                                 poolclass=pool.NullPool)
@@ -75,6 +80,7 @@ def run_migrations_online():
                       target_metadata=target_metadata,
                       render_as_batch=True,
                       process_revision_directives=process_revision_directives,
+                      include_object=include_object,
                       **current_app.extensions['migrate'].configure_args)
 
     try:
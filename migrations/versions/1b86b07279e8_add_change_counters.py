@@ -0,0 +1,27 @@
+"""add change counters
+
+Revision ID: 1b86b07279e8
+Revises: 37bb8a9c51a6
+Create Date: 2026-10-18 11:02:47.530116
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1b86b07279e8'
+down_revision = '37bb8a9c51a6'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('change_counters',
+    sa.Column('key', sa.String(length=128), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key', name=op.f('pk_change_counters'))
+    )
+
+
+def downgrade():
+    op.drop_table('change_counters')
@@ -0,0 +1,39 @@
+"""add 3dmark aggregate score
+
+Revision ID: 37bb8a9c51a6
+Revises: 556574b57514
+Create Date: 2026-10-18 09:30:12.118204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '37bb8a9c51a6'
+down_revision = '556574b57514'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('futuremark3dmarkresults', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('aggregate_score', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_futuremark3dmarkresults_aggregate_score'), ['aggregate_score'], unique=False)
+
+    # backfill existing results, counting missing scores as zero
+    results = sa.table('futuremark3dmarkresults',
+                       sa.column('icestorm_score', sa.Integer),
+                       sa.column('cloudgate_score', sa.Integer),
+                       sa.column('firestrike_score', sa.Integer),
+                       sa.column('skydiver_score', sa.Integer),
+                       sa.column('aggregate_score', sa.Integer))
+    op.execute(results.update().values(aggregate_score=(
+        sa.func.coalesce(results.c.icestorm_score, 0) +
+        sa.func.coalesce(results.c.cloudgate_score, 0) +
+        sa.func.coalesce(results.c.firestrike_score, 0) +
+        sa.func.coalesce(results.c.skydiver_score, 0))))
+
+
+def downgrade():
+    with op.batch_alter_table('futuremark3dmarkresults', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_futuremark3dmarkresults_aggregate_score'))
+        batch_op.drop_column('aggregate_score')
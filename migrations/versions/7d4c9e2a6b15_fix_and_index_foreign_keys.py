@@ -0,0 +1,107 @@
+"""fix and index foreign keys
+
+Revision ID: 7d4c9e2a6b15
+Revises: e5b2d8c41f93
+Create Date: 2026-10-18 12:09:37.552190
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d4c9e2a6b15'
+down_revision = 'e5b2d8c41f93'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# as in app/__init__.py, for naming constraints SQLite didn't keep names for
+convention = {
+    'ix': 'ix_%(column_0_label)s',
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'
+}
+
+# as in app/search.py: SQLite recreates the machines table to change its
+# foreign key, and the full-text triggers on it go with the old one
+search_columns = ('system_name', 'system_notes', 'owner')
+
+
+def _active_revision_fk(bind):
+    for fk in sa.inspect(bind).get_foreign_keys('machines'):
+        if fk['constrained_columns'] == ['active_revision_id']:
+            return fk['name'] or 'fk_machines_active_revision_id_{}'.format(
+                fk['referred_table'])
+
+
+def _search_triggers():
+    names = {'columns': ', '.join(search_columns),
+             'new': ', '.join('new.' + column for column in search_columns),
+             'old': ', '.join('old.' + column for column in search_columns)}
+    for statement in (
+            "CREATE TRIGGER machines_search_insert AFTER INSERT ON machines "
+            "BEGIN INSERT INTO machines_search(rowid, {columns}) "
+            "VALUES (new.id, {new}); END",
+            "CREATE TRIGGER machines_search_delete AFTER DELETE ON machines "
+            "BEGIN INSERT INTO machines_search(machines_search, rowid, "
+            "{columns}) VALUES ('delete', old.id, {old}); END",
+            "CREATE TRIGGER machines_search_update AFTER UPDATE OF {columns} "
+            "ON machines BEGIN INSERT INTO machines_search(machines_search, "
+            "rowid, {columns}) VALUES ('delete', old.id, {old}); "
+            "INSERT INTO machines_search(rowid, {columns}) "
+            "VALUES (new.id, {new}); END"):
+        op.execute(statement.format(**names))
+
+
+def _point_active_revision_at(table, bind, ondelete=None):
+    with op.batch_alter_table('machines', naming_convention=convention) \
+            as batch_op:
+        batch_op.drop_constraint(_active_revision_fk(bind),
+                                 type_='foreignkey')
+        batch_op.create_foreign_key(
+            'fk_machines_active_revision_id_{}'.format(table), table,
+            ['active_revision_id'], ['id'], ondelete=ondelete)
+    if bind.dialect.name == 'sqlite':
+        _search_triggers()
+
+
+def upgrade():
+    bind = op.get_bind()
+    # it always held revision ids, but nothing checked that they were
+    machines = sa.table('machines', sa.column('active_revision_id'))
+    revisions = sa.table('revisions', sa.column('id'))
+    op.execute(machines.update()
+               .where(~machines.c.active_revision_id.in_(
+                   sa.select([revisions.c.id])))
+               .values(active_revision_id=None))
+    # deleting a machine's active revision leaves it without one
+    _point_active_revision_at('revisions', bind, ondelete='SET NULL')
+
+    with op.batch_alter_table('machines', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_machines_active_revision_id'), ['active_revision_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_machines_author_id'), ['author_id'], unique=False)
+
+    with op.batch_alter_table('revisions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revisions_author_id'), ['author_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_revisions_machine_id'), ['machine_id'], unique=False)
+
+    for table in ('cinebenchr15results', 'futuremark3dmark06results',
+                  'futuremark3dmarkresults'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_{}_revision_id'.format(table)), ['revision_id'], unique=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table in ('cinebenchr15results', 'futuremark3dmark06results',
+                  'futuremark3dmarkresults'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f('ix_{}_revision_id'.format(table)))
+
+    with op.batch_alter_table('revisions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revisions_machine_id'))
+        batch_op.drop_index(batch_op.f('ix_revisions_author_id'))
+
+    with op.batch_alter_table('machines', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_machines_author_id'))
+        batch_op.drop_index(batch_op.f('ix_machines_active_revision_id'))
+
+    _point_active_revision_at('machines', bind)
@@ -0,0 +1,28 @@
+"""add journal marks
+
+Revision ID: 9b3f6a1d2c47
+Revises: 7d4c9e2a6b15
+Create Date: 2026-10-18 16:41:09.284713
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9b3f6a1d2c47'
+down_revision = '7d4c9e2a6b15'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('journal_marks',
+    sa.Column('journal', sa.String(length=32), nullable=False),
+    sa.Column('flushed_through', sa.Integer(), nullable=False),
+    sa.Column('flushed_at', sa.DateTime(), nullable=False),
+    sa.Column('last_batch', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('journal', name=op.f('pk_journal_marks'))
+    )
+
+
+def downgrade():
+    op.drop_table('journal_marks')
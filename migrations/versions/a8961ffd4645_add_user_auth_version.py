@@ -0,0 +1,24 @@
+"""add user auth version
+
+Revision ID: a8961ffd4645
+Revises: d84422bd86ff
+Create Date: 2026-10-18 15:12:38.640952
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a8961ffd4645'
+down_revision = 'd84422bd86ff'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('auth_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('auth_version')
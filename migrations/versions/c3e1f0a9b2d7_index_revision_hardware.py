@@ -0,0 +1,30 @@
+"""index revision hardware
+
+Revision ID: c3e1f0a9b2d7
+Revises: a8961ffd4645
+Create Date: 2026-10-18 10:02:14.318276
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3e1f0a9b2d7'
+down_revision = 'a8961ffd4645'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('revisions', schema=None) as batch_op:
+        batch_op.create_index('ix_revisions_cpu_make_cpu_proc_cores', ['cpu_make', 'cpu_proc_cores'], unique=False)
+        batch_op.create_index('ix_revisions_cpu_name_timestamp', ['cpu_name', 'timestamp'], unique=False)
+        batch_op.create_index('ix_revisions_gpu_make_gpu_memory_mb', ['gpu_make', 'gpu_memory_mb'], unique=False)
+        batch_op.create_index('ix_revisions_gpu_name_timestamp', ['gpu_name', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revisions', schema=None) as batch_op:
+        batch_op.drop_index('ix_revisions_gpu_name_timestamp')
+        batch_op.drop_index('ix_revisions_gpu_make_gpu_memory_mb')
+        batch_op.drop_index('ix_revisions_cpu_name_timestamp')
+        batch_op.drop_index('ix_revisions_cpu_make_cpu_proc_cores')
@@ -0,0 +1,33 @@
+"""add revoked token expiry
+
+Revision ID: d84422bd86ff
+Revises: f80e7273d38f
+Create Date: 2026-10-18 14:26:51.304417
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd84422bd86ff'
+down_revision = 'f80e7273d38f'
+
+from datetime import datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_expires_at'), ['expires_at'], unique=False)
+
+    # we don't know when the tokens already in there expire, but none of
+    # them outlives flask_jwt_extended's default 30 day refresh token
+    tokens = sa.table('revoked_tokens', sa.column('expires_at', sa.DateTime))
+    op.execute(tokens.update().values(
+        expires_at=datetime.utcnow() + timedelta(days=30)))
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_expires_at'))
+        batch_op.drop_column('expires_at')
@@ -0,0 +1,79 @@
+"""add full text search
+
+Revision ID: e5b2d8c41f93
+Revises: c3e1f0a9b2d7
+Create Date: 2026-10-18 11:24:51.907345
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e5b2d8c41f93'
+down_revision = 'c3e1f0a9b2d7'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# as in app/search.py
+searched = {
+    'machines': ('system_name', 'system_notes', 'owner'),
+    'revisions': ('cpu_make', 'cpu_name', 'cpu_socket', 'chipset',
+                  'gpu_make', 'gpu_name', 'revision_notes')
+}
+
+
+def _sqlite(table, columns):
+    names = {'index': table + '_search', 'table': table,
+             'columns': ', '.join(columns),
+             'new': ', '.join('new.' + column for column in columns),
+             'old': ', '.join('old.' + column for column in columns)}
+    create = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({columns}, "
+        "content='{table}', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        "CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new}); END",
+        "CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO {index}({index}, rowid, {columns}) "
+        "VALUES ('delete', old.id, {old}); END",
+        "CREATE TRIGGER {index}_update AFTER UPDATE OF {columns} ON {table} "
+        "BEGIN INSERT INTO {index}({index}, rowid, {columns}) "
+        "VALUES ('delete', old.id, {old}); "
+        "INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new}); END",
+        # index what's already there
+        "INSERT INTO {index}({index}) VALUES ('rebuild')"
+    ]
+    return [statement.format(**names) for statement in create]
+
+
+def _postgresql(table, columns):
+    document = "to_tsvector('english', {})".format(
+        " || ' ' || ".join("coalesce({}, '')".format(column)
+                           for column in columns))
+    return ['CREATE INDEX ix_{}_search ON {} USING gin (({}))'.format(
+        table, table, document)]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in searched.items():
+        if dialect == 'sqlite':
+            statements = _sqlite(table, columns)
+        elif dialect == 'postgresql':
+            statements = _postgresql(table, columns)
+        else:
+            statements = []
+        for statement in statements:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in searched:
+        if dialect == 'sqlite':
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute('DROP TRIGGER IF EXISTS {}_search_{}'.format(
+                    table, trigger))
+            op.execute('DROP TABLE IF EXISTS {}_search'.format(table))
+        elif dialect == 'postgresql':
+            op.execute('DROP INDEX IF EXISTS ix_{}_search'.format(table))
@@ -0,0 +1,31 @@
+"""index revoked token jti
+
+Revision ID: f80e7273d38f
+Revises: 1b86b07279e8
+Create Date: 2026-10-18 13:41:05.862390
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f80e7273d38f'
+down_revision = '1b86b07279e8'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # a token revoked more than once only needs to be remembered once
+    tokens = sa.table('revoked_tokens',
+                      sa.column('id', sa.Integer),
+                      sa.column('jti', sa.String))
+    first = sa.select([sa.func.min(tokens.c.id)]).group_by(tokens.c.jti)
+    op.execute(tokens.delete().where(~tokens.c.id.in_(first)))
+
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_jti'), ['jti'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_jti'))
@@ -1,5 +1,9 @@
 import os
+import time
 from app import create_app, db
+from app.blacklist import blacklist
+from app.exporter import formats, kinds
+from app.snapshot import tables as snapshot_tables
 from app.models import User, Machine, Revision, Role, RevokedToken
 from flask_migrate import Migrate
 import click
@@ -13,10 +17,20 @@ migrate = Migrate(app, db)
 
 
 # Why does this need to be here? I want to put this in authentication.
+@jwt.user_claims_loader
+def add_claims_to_token(identity):
+    user = User.find_by_username(identity)
+    return user.token_claims() if user is not None else {}
+
+
 @jwt.token_in_blacklist_loader
 def check_if_token_in_blacklist(decrypted_token):
     jti = decrypted_token['jti']
-    return RevokedToken.is_jti_blacklisted(jti)
+    claims = decrypted_token.get(app.config['JWT_USER_CLAIMS']) or {}
+    # tokens from before claims were added only get the revocation check
+    if 'uid' in claims and blacklist.is_stale(claims['uid'], claims['ver']):
+        return True
+    return blacklist.is_revoked(jti)
 
 
 @app.shell_context_processor
@@ -32,3 +46,166 @@ def deploy():
 
     # migrate database to latest Revision
     upgrade()
+
+
+@app.cli.command('prune-revoked-tokens')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows to delete per transaction.')
+def prune_revoked_tokens(batch_size):
+    """Forget revoked tokens that have expired anyway."""
+    total = 0
+    for deleted in RevokedToken.prune(batch_size):
+        total += deleted
+        click.echo('{} deleted so far'.format(total))
+    if total:
+        # let the workers shrink their filters
+        blacklist.changed()
+        db.session.commit()
+    click.echo('Deleted {} expired revoked tokens.'.format(total))
+
+
+@app.cli.command('flush-queue')
+def flush_queue():
+    """Save every queued submission now (see app/writebehind.py)."""
+    from app.writebehind import journal
+
+    saved = journal.flush()
+    if saved is None:
+        raise click.ClickException('another worker is flushing the queue')
+    queued, oldest = journal.depth()
+    click.echo('Saved {} queued results, {} still queued.'.format(
+        saved, queued))
+
+
+@app.cli.command('prune-queue')
+@click.option('--days', default=7, show_default=True,
+              help='Keep entries received more recently than this.')
+def prune_queue(days):
+    """Forget queued submissions saved (or failed) a while ago."""
+    from datetime import timedelta
+    from app.writebehind import journal
+
+    click.echo('Deleted {} journal entries.'.format(
+        journal.prune(timedelta(days=days))))
+
+
+@app.cli.command('import-results')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True,
+              help='User to create the machines and revisions as.')
+@click.option('--format', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to going by the file extension.')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Records to insert per transaction.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='Where to keep track of progress.  '
+                   '[default: PATH.checkpoint]')
+@click.option('--restart', is_flag=True,
+              help='Ignore the checkpoint and start from the beginning.')
+def import_results(path, username, format, batch_size, checkpoint, restart):
+    """Load benchmark results from a CSV or NDJSON file (see app/importer.py).
+
+    An interrupted import carries on from its last batch when run again.
+    """
+    from app.importer import (Importer, load_checkpoint, read_records,
+                              save_checkpoint)
+
+    user = User.find_by_username(username)
+    if user is None:
+        raise click.BadParameter('no such user', param_hint='--user')
+    checkpoint = checkpoint or path + '.checkpoint'
+    state = (0, []) if restart else load_checkpoint(checkpoint, path)
+    if state is None:
+        raise click.UsageError('{} is for a different file, use --restart to '
+                               'import from the beginning'.format(checkpoint))
+    skip, made_machines = state
+    if skip:
+        click.echo('Resuming after record {}.'.format(skip))
+
+    importer = Importer(user.id, made_machines)
+    start, read, rejected = time.time(), skip, 0
+    for read, bad in importer.run(read_records(path, format), batch_size,
+                                  skip):
+        save_checkpoint(checkpoint, path, read, importer.made_machines)
+        for number, errors in bad:
+            click.echo('record {}: {}'.format(number, errors), err=True)
+        rejected += len(bad)
+        created = importer.created
+        click.echo('{} records ({:.0f}/s): {} machines, {} revisions, {} '
+                   'results created, {} rejected'.format(
+                       read, (read - skip) / max(time.time() - start, 1e-6),
+                       created.get('machines', 0),
+                       created.get('revisions', 0),
+                       sum(count for table, count in created.items()
+                           if table not in ('machines', 'revisions')),
+                       rejected))
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    click.echo('Imported {} records in {:.1f}s.'.format(
+        read - skip, time.time() - start))
+
+
+@app.cli.command('export-results')
+@click.argument('kind', type=click.Choice(kinds))
+@click.option('--format', type=click.Choice(sorted(formats)),
+              default='ndjson', show_default=True)
+@click.option('--since', help='Only rows dated from then on (ISO 8601).')
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='File to write to.  [default: stdout]')
+def export_results(kind, format, since, output):
+    """Write a table out flattened, as /export does (see app/exporter.py)."""
+    from dateutil import parser
+
+    if since is not None:
+        since = parser.parse(since)
+    generate, mimetype = formats[format]
+    for piece in generate(kind, since):
+        output.write(piece)
+
+
+@app.cli.command('snapshot')
+@click.argument('table', type=click.Choice(sorted(snapshot_tables)))
+@click.argument('directory', type=click.Path(file_okay=False))
+def write_snapshot(table, directory):
+    """Write a table out as one .npy file per column (see app/snapshot.py).
+
+    Unlike /snapshots' .npz, these can be opened with
+    numpy.load(path, mmap_mode='r').
+    """
+    import numpy as np
+    from app.snapshot import build
+
+    os.makedirs(directory, exist_ok=True)
+    arrays = build(snapshot_tables[table])
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), array)
+    click.echo('Wrote {} columns of {} rows to {}.'.format(
+        len(arrays), len(arrays['id']), directory))
+
+
+@app.cli.command('explain-queries', with_appcontext=False)
+@click.option('--plans', is_flag=True, help='Show every plan, not just '
+                                            'the ones that scan a table.')
+def explain_queries(plans):
+    """EXPLAIN what the read endpoints run (see app/queryplans.py).
+
+    Exits with status 1 if any of it reads a whole table.
+    """
+    from app.queryplans import explain
+
+    failed = 0
+    for url, status, statements in explain(app):
+        scans = [scan for statement, lines, found in statements
+                 for scan in found]
+        click.echo('{} {} {} queries{}'.format(
+            'SCAN' if scans else 'ok  ', url, len(statements),
+            '' if status == 200 else ' (status {})'.format(status)))
+        for statement, lines, found in statements:
+            if found or plans:
+                click.echo('    ' + ' '.join(statement.split()))
+                for line in lines:
+                    click.echo('      ' + line)
+        failed += bool(scans)
+    if failed:
+        click.echo('{} endpoints read whole tables.'.format(failed), err=True)
+        raise SystemExit(1)
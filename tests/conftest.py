@@ -0,0 +1,94 @@
+import importlib.util
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+T0 = datetime(2018, 1, 1)
+
+
+def load_app(path):
+    """The app as rivalrockets-api.py makes it, on the database at
+    `path`, with the testing config."""
+    os.environ['FLASK_CONFIG'] = 'testing'
+    spec = importlib.util.spec_from_file_location(
+        'rivalrockets_api', os.path.join(basedir, 'rivalrockets-api.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    app = module.app
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['WRITE_BEHIND_JOURNAL'] = path + '.journal'
+    return app
+
+
+def seed(machines=5, results=3):
+    """A user with `machines` machines, each with one revision and
+    `results` results of every benchmark."""
+    from app import db
+    from app.models import (Machine, Revision, Role, User,
+                            CinebenchR15Result, Futuremark3DMark06Result,
+                            Futuremark3DMarkResult)
+
+    Role.insert_roles()
+    user = User(username='alice')
+    user.hash_password('password')
+    db.session.add(user)
+    db.session.commit()
+    for i in range(machines):
+        machine = Machine(system_name='Machine {}'.format(i),
+                          author_id=user.id,
+                          timestamp=T0 + timedelta(hours=i))
+        db.session.add(machine)
+        db.session.commit()
+        revision = Revision(cpu_make='AMD', cpu_name='Ryzen {}'.format(i),
+                            gpu_name='GTX 1080', cpu_proc_cores=8,
+                            author_id=user.id, machine_id=machine.id,
+                            timestamp=T0 + timedelta(hours=i, minutes=1))
+        db.session.add(revision)
+        db.session.commit()
+        machine.active_revision_id = revision.id
+        for j in range(results):
+            date = T0 + timedelta(days=j)
+            db.session.add_all([
+                CinebenchR15Result(cpu_cb=1000 + i * 10 + j,
+                                   opengl_fps=100 + j,
+                                   revision_id=revision.id, result_date=date),
+                Futuremark3DMark06Result(overall_score=20000 + i + j,
+                                         proxcyon_fps=12.5,
+                                         revision_id=revision.id,
+                                         result_date=date),
+                Futuremark3DMarkResult(icestorm_score=1 + i,
+                                       cloudgate_score=2,
+                                       firestrike_score=3 + j,
+                                       skydiver_score=4,
+                                       revision_id=revision.id,
+                                       result_date=date)])
+        db.session.commit()
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    from app import db
+
+    app = load_app(str(tmp_path_factory.mktemp('db') / 'test.sqlite'))
+    with app.app_context():
+        db.create_all()
+        seed()
+        db.session.remove()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth(client):
+    """Headers carrying an access token for the seeded user."""
+    tokens = client.post('/api/v1.0/login', json={
+        'username': 'alice', 'password': 'password'}).get_json()
+    return {'Authorization': 'Bearer ' + tokens['access_token']}
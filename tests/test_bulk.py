@@ -0,0 +1,43 @@
+from decimal import Decimal
+import pytest
+from app.bulk import parse_result
+from app.models import CinebenchR15Result
+
+
+@pytest.mark.parametrize('item, field', [
+    ({'type': 'cinebenchr15result', 'cpu_cb': 10 ** 30}, 'cpu_cb'),
+    ({'type': 'cinebenchr15result', 'cpu_cb': -2 ** 31 - 1}, 'cpu_cb'),
+    ({'type': 'futuremark3dmark06result', 'proxcyon_fps': 1000},
+     'proxcyon_fps'),
+    ({'type': 'futuremark3dmark06result', 'cpu1_fps': '999.996'}, 'cpu1_fps'),
+    ({'type': 'futuremark3dmarkresult', 'icestorm_score': 2 ** 31 - 1,
+      'skydiver_score': 1}, 'aggregate_score')
+])
+def test_values_that_dont_fit_their_column_are_refused(item, field):
+    with pytest.raises(ValueError) as e:
+        parse_result(item)
+    assert list(e.value.args[0]) == [field]
+
+
+def test_decimals_are_rounded_to_their_column():
+    model, row = parse_result({'type': 'futuremark3dmark06result',
+                               'proxcyon_fps': '12.345',
+                               'cpu1_fps': -999.99})
+    assert row['proxcyon_fps'] == Decimal('12.35')
+    assert row['cpu1_fps'] == Decimal('-999.99')
+
+
+def test_bulk_post_reports_out_of_range_items(app, client, auth):
+    with app.app_context():
+        before = CinebenchR15Result.query.count()
+    response = client.post('/api/v1.0/revisions/1/results', headers=auth,
+                           json={'results': [
+                               {'type': 'cinebenchr15result', 'cpu_cb': 1500},
+                               {'type': 'cinebenchr15result',
+                                'cpu_cb': 10 ** 30}]})
+    assert response.status_code == 400
+    errors = response.get_json()['errors']
+    assert [error['index'] for error in errors] == [1]
+    assert 'cpu_cb' in errors[0]['errors']
+    with app.app_context():
+        assert CinebenchR15Result.query.count() == before
@@ -0,0 +1,44 @@
+from app import db
+from app.api_1_0.cache import touch
+from app.models import Machine
+
+
+def test_missing_machine_is_not_cached(app, client):
+    with app.app_context():
+        id = db.session.query(db.func.max(Machine.id)).scalar() + 1
+    url = '/api/v1.0/machines/{}'.format(id)
+    assert client.get(url).status_code == 404
+
+    with app.app_context():
+        machine = Machine(id=id, system_name='New machine', author_id=1)
+        db.session.add(machine)
+        touch(machine)
+        db.session.commit()
+    try:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.get_json()['system_name'] == 'New machine'
+    finally:
+        with app.app_context():
+            machine = Machine.query.get(id)
+            touch(machine)
+            db.session.delete(machine)
+            db.session.commit()
+
+
+def test_cached_response_follows_the_row(app, client):
+    url = '/api/v1.0/machines/2'
+    before = client.get(url).get_json()['system_name']
+    with app.app_context():
+        machine = Machine.query.get(2)
+        machine.system_name = 'Renamed'
+        touch(machine)
+        db.session.commit()
+    try:
+        assert client.get(url).get_json()['system_name'] == 'Renamed'
+    finally:
+        with app.app_context():
+            machine = Machine.query.get(2)
+            machine.system_name = before
+            touch(machine)
+            db.session.commit()
@@ -0,0 +1,60 @@
+from app import db
+from app.api_1_0 import cache
+from app.api_1_0.cache import touch
+from app.models import CinebenchR15Result
+
+
+def test_compare_follows_new_results(app, client):
+    url = '/api/v1.0/compare?revisions=3'
+
+    def best():
+        benchmarks = client.get(url).get_json()['revisions'][0]['benchmarks']
+        return benchmarks['cinebenchr15result']['cpu_cb']['best']
+
+    before = best()
+    with app.app_context():
+        result = CinebenchR15Result(cpu_cb=before + 1000, revision_id=3)
+        db.session.add(result)
+        touch(result)
+        db.session.commit()
+        id = result.id
+    try:
+        assert best() == before + 1000
+    finally:
+        with app.app_context():
+            result = CinebenchR15Result.query.get(id)
+            touch(result)
+            db.session.delete(result)
+            db.session.commit()
+
+
+def test_summaries_match_with_and_without_window_functions(app, client,
+                                                           monkeypatch):
+    from app.api_1_0.resources import compare
+
+    url = '/api/v1.0/compare?revisions=1,2,3'
+    with app.app_context():
+        # an even number of scores for revision 1, and one missing
+        extra = [CinebenchR15Result(cpu_cb=score, revision_id=1)
+                 for score in (1, None, 5000, 6000)]
+        db.session.add_all(extra)
+        touch(*extra)
+        db.session.commit()
+        ids = [result.id for result in extra]
+    try:
+        grouped = client.get(url).get_json()
+        summary = grouped['revisions'][0]['benchmarks']['cinebenchr15result']
+        assert summary['count'] == 7
+        # 1, 1000, 1001, 1002, 5000, 6000
+        assert summary['cpu_cb'] == {'best': 6000, 'median': 1001.5}
+
+        monkeypatch.setattr(compare, '_window_functions', lambda: False)
+        cache._entries.clear()
+        assert client.get(url).get_json() == grouped
+    finally:
+        with app.app_context():
+            for id in ids:
+                result = CinebenchR15Result.query.get(id)
+                touch(result)
+                db.session.delete(result)
+            db.session.commit()
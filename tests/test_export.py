@@ -0,0 +1,35 @@
+from datetime import datetime
+from app import db
+from app.exporter import rows
+from app.models import CinebenchR15Result
+
+
+def test_results_are_dated_when_saved_not_at_import(app):
+    started = datetime.utcnow()
+    with app.app_context():
+        result = CinebenchR15Result(cpu_cb=1234, revision_id=1)
+        db.session.add(result)
+        db.session.commit()
+        try:
+            assert result.result_date >= started
+            exported = [row['id'] for row in
+                        rows('cinebenchr15results', since=started)]
+            assert exported == [result.id]
+        finally:
+            db.session.delete(result)
+            db.session.commit()
+
+
+def test_orphaned_results_are_exported(app):
+    with app.app_context():
+        # as left behind when its revision is deleted
+        result = CinebenchR15Result(cpu_cb=1234, revision_id=10 ** 6)
+        db.session.add(result)
+        db.session.commit()
+        try:
+            exported = {row['id']: row for row in rows('results')}
+            assert exported[result.id]['revision_id'] == 10 ** 6
+            assert exported[result.id]['machine_id'] is None
+        finally:
+            db.session.delete(result)
+            db.session.commit()
@@ -0,0 +1,103 @@
+import operator
+
+import pytest
+from app.models import CinebenchR15Result, Revision
+
+
+def ids(page, envelope):
+    return [int(item['uri'].rsplit('/', 1)[1]) for item in page[envelope]]
+
+
+def walk(client, url, envelope):
+    """Every id on every page of `url`, following the next links."""
+    page = client.get(url).get_json()
+    found = ids(page, envelope)
+    while page['next']:
+        page = client.get(page['next']).get_json()
+        found += ids(page, envelope)
+    return found
+
+
+def results(app, where):
+    # ids of the Cinebench results `where(result)` holds for, in list order
+    with app.app_context():
+        return [result.id for result in sorted(
+            CinebenchR15Result.query,
+            key=lambda result: (result.cpu_cb, result.id), reverse=True)
+            if where(result)]
+
+
+@pytest.mark.parametrize('op, compare', [
+    ('=', operator.eq), ('!=', operator.ne), ('>', operator.gt),
+    ('>=', operator.ge), ('<', operator.lt), ('<=', operator.le)])
+def test_each_operator(app, client, op, compare):
+    found = walk(client, '/api/v1.0/cinebenchr15results?cpu_cb{}1021'
+                 '&limit=500'.format(op), 'cinebenchr15results')
+    expected = results(app, lambda result: result.cpu_cb is not None and
+                       compare(result.cpu_cb, 1021))
+    assert found == expected
+    assert expected
+
+
+def test_contains_on_the_revision_joins_it(app, client):
+    found = walk(client, '/api/v1.0/cinebenchr15results?cpu_name~=RYZEN%201'
+                 '&cpu_cb>1010&limit=500', 'cinebenchr15results')
+    expected = results(app, lambda result: result.revision.cpu_name ==
+                       'Ryzen 1' and result.cpu_cb > 1010)
+    assert found == expected
+    assert expected
+
+
+def test_contains_takes_wildcards_literally(client):
+    page = client.get('/api/v1.0/revisions?cpu_name~=%25').get_json()
+    assert page['revisions'] == []
+
+
+def test_revisions_filter_on_their_hardware(app, client):
+    found = walk(client, '/api/v1.0/revisions?cpu_make=AMD'
+                 '&cpu_proc_cores>=8&gpu_name~=1080&limit=500', 'revisions')
+    with app.app_context():
+        expected = [revision.id for revision in sorted(
+            Revision.query, key=lambda revision: (revision.timestamp,
+                                                  revision.id),
+            reverse=True)
+            if revision.cpu_make == 'AMD' and
+            (revision.cpu_proc_cores or 0) >= 8 and
+            '1080' in (revision.gpu_name or '')]
+    assert found == expected
+    assert expected
+
+
+def test_later_pages_keep_the_filters(app, client):
+    url = '/api/v1.0/cinebenchr15results?cpu_name~=ryzen&cpu_cb>=1020' \
+        '&limit=2'
+    first = client.get(url).get_json()
+    assert first['next'] is not None
+    assert 'cpu_name~=ryzen&cpu_cb>=1020' in first['next']
+    second = client.get(first['next']).get_json()
+    assert 'cpu_name~=ryzen&cpu_cb>=1020' in second['prev']
+    assert all(result['cpu_cb'] >= 1020
+               for result in second['cinebenchr15results'])
+    expected = results(app, lambda result: result.cpu_cb is not None and
+                       result.cpu_cb >= 1020 and
+                       'ryzen' in (result.revision.cpu_name or '').lower())
+    assert walk(client, url, 'cinebenchr15results') == expected
+
+
+@pytest.mark.parametrize('query, errors', [
+    ('cpu_cb~=15', {'cpu_cb': '~= is only for text'}),
+    ('cpu_cb>=lots', {'cpu_cb': 'must be a whole number'}),
+    ('cpu_proc_cores=eight', {'cpu_proc_cores': 'must be a whole number'}),
+    ('colour>1', {'colour': 'not something to filter on'}),
+])
+def test_invalid_filters_are_a_400(client, query, errors):
+    response = client.get('/api/v1.0/cinebenchr15results?' + query)
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['message'] == 'Invalid filters'
+    assert body['errors'] == errors
+
+
+def test_other_arguments_are_left_alone(client):
+    response = client.get('/api/v1.0/revisions?colour=blue')
+    assert response.status_code == 200
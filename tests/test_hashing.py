@@ -0,0 +1,54 @@
+import time
+import pytest
+from app import db
+from app.hashing import HashingPool, PoolSaturated
+from app.models import Role, User
+
+
+@pytest.fixture
+def pool(app):
+    config = {'HASH_POOL_WORKERS': 1, 'HASH_POOL_QUEUE': 0,
+              'HASH_POOL_TIMEOUT': 0.2}
+    saved = {key: app.config[key] for key in config}
+    app.config.update(config)
+    pool = HashingPool()
+    try:
+        with app.app_context():
+            yield pool
+    finally:
+        app.config.update(saved)
+        if pool._executor is not None:
+            pool._executor.shutdown()
+
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes(pool):
+    with pytest.raises(PoolSaturated):
+        pool.run(time.sleep, 1)
+    # still running, so there's no room for another
+    with pytest.raises(PoolSaturated):
+        pool.run(abs, -1)
+    assert pool.metrics()['rejected'] == 1
+    time.sleep(1.5)
+    assert pool.run(abs, -1) == 1
+    assert pool.metrics()['in_flight'] == 0
+
+
+def test_metrics_are_for_administrators(app, client):
+    url = '/api/v1.0/metrics'
+    assert client.get(url).status_code == 401
+
+    def headers(username):
+        tokens = client.post('/api/v1.0/login', json={
+            'username': username, 'password': 'password'}).get_json()
+        return {'Authorization': 'Bearer ' + tokens['access_token']}
+
+    assert client.get(url, headers=headers('alice')).status_code == 403
+    with app.app_context():
+        admin = User(username='admin', role=Role.query.filter_by(
+            name='Administrator').first())
+        admin.hash_password('password')
+        db.session.add(admin)
+        db.session.commit()
+    response = client.get(url, headers=headers('admin'))
+    assert response.status_code == 200
+    assert 'hashing' in response.get_json()
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+from app import db
+from app.api_1_0.cache import touch
+from app.importer import Importer, read_records, save_checkpoint
+from app.models import Machine, Revision, CinebenchR15Result
+
+
+def record(cpu_name, hour, **result):
+    return dict({'type': 'cinebenchr15result',
+                 'system_name': 'Imported rig', 'cpu_make': 'AMD',
+                 'cpu_name': cpu_name,
+                 'revision_timestamp': '2018-02-01T{:02}:00:00'.format(hour)},
+                **result)
+
+
+@pytest.fixture
+def imported(app):
+    yield
+    with app.app_context():
+        for machine in Machine.query.filter_by(system_name='Imported rig'):
+            for revision in machine.revisions:
+                for result in revision.cinebenchr15results:
+                    touch(result)
+                    db.session.delete(result)
+                touch(revision)
+                db.session.delete(revision)
+            touch(machine)
+            db.session.delete(machine)
+        db.session.commit()
+
+
+def test_cached_machine_follows_its_new_active_revision(app, client,
+                                                         imported):
+    with app.app_context():
+        importer = Importer(1)
+        batches = importer.run([record('Ryzen A', 1, cpu_cb=1500),
+                                record('Ryzen B', 2, cpu_cb=1600)],
+                               batch_size=1)
+    with app.app_context():
+        next(batches)
+        id, = [id for id, in db.session.query(Machine.id)
+               .filter_by(system_name='Imported rig')]
+    url = '/api/v1.0/machines/{}'.format(id)
+    assert client.get(url).get_json()['active_revision']['cpu_name'] == \
+        'Ryzen A'
+
+    with app.app_context():
+        next(batches)
+    assert client.get(url).get_json()['active_revision']['cpu_name'] == \
+        'Ryzen B'
+
+
+def test_missing_owner_is_left_null(app, imported):
+    with app.app_context():
+        for batch in Importer(1).run([record('Ryzen A', 1, cpu_cb=1500)]):
+            pass
+        machine = Machine.query.filter_by(system_name='Imported rig').one()
+        assert machine.owner is None and machine.system_notes is None
+        # and is matched by a record that doesn't have one either
+        for batch in Importer(1).run([record('Ryzen B', 2, cpu_cb=1600)]):
+            pass
+        assert Machine.query.filter_by(system_name='Imported rig') \
+            .count() == 1
+
+def test_interrupted_import_resumes_and_reports_rejects(app, tmp_path,
+                                                        imported):
+    path = str(tmp_path / 'results.ndjson')
+    checkpoint = path + '.checkpoint'
+    lines = [json.dumps(record('Ryzen A', 1, cpu_cb=1500)),
+             json.dumps(record('Ryzen A', 1, cpu_cb=1510)),
+             '{not json',
+             json.dumps(record('Ryzen B', 2, cpu_cb='lots')),
+             json.dumps(record('Ryzen B', 2, cpu_cb=1600))]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    # the first batch goes in, then the import is killed
+    with app.app_context():
+        importer = Importer(1)
+        batches = importer.run(read_records(path), batch_size=2)
+        read, rejected = next(batches)
+        batches.close()
+    assert (read, rejected) == (2, [])
+    save_checkpoint(checkpoint, path, read, importer.made_machines)
+
+    result = app.test_cli_runner().invoke(args=[
+        'import-results', path, '--user', 'alice', '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert 'Resuming after record 2.' in result.output
+    assert "record 3: {'record': 'not valid JSON'}" in result.output
+    assert "record 4: {'cpu_cb': 'must be a whole number'}" in result.output
+    assert not os.path.exists(checkpoint)
+
+    with app.app_context():
+        machine = Machine.query.filter_by(system_name='Imported rig').one()
+        scores = sorted(score for score, in db.session.query(
+            CinebenchR15Result.cpu_cb).join(Revision)
+            .filter(Revision.machine_id == machine.id))
+        # nothing from the first batch twice, and nothing rejected
+        assert scores == [1500, 1510, 1600]
+        assert machine.active_revision.cpu_name == 'Ryzen B'
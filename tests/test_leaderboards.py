@@ -0,0 +1,55 @@
+from app import db
+from app.leaderboards import Leaderboard
+from app.models import CinebenchR15Result
+
+
+def test_out_of_range_score_is_left_off_the_board(app):
+    with app.app_context():
+        result = CinebenchR15Result(cpu_cb=1 << 40, revision_id=1)
+        db.session.add(result)
+        db.session.commit()
+        try:
+            board = Leaderboard(CinebenchR15Result.cpu_cb)
+            board.build(0)
+            assert board.rank(result.id) is None
+            assert len(board) == CinebenchR15Result.query.count() - 1
+            board.update(result.id, -(1 << 40))
+            assert board.rank(result.id) is None
+        finally:
+            db.session.delete(result)
+            db.session.commit()
+
+
+def test_result_gone_from_the_database_is_skipped(app, client):
+    from app.leaderboards import boards
+
+    board = boards['cpu_cb']
+    client.get('/api/v1.0/leaderboards/cpu_cb')
+    # as if it had been deleted by another worker since the board was built
+    board.update(10 ** 6, 10 ** 6)
+    try:
+        response = client.get('/api/v1.0/leaderboards/cpu_cb/ranks/1')
+        assert response.status_code == 200
+        results = response.get_json()['results']
+        assert results and all(entry['result'] for entry in results)
+        assert results[0]['rank'] == 2
+    finally:
+        board.discard(10 ** 6)
+
+
+def test_only_one_thread_rebuilds_a_stale_board(app, monkeypatch):
+    with app.app_context():
+        board = Leaderboard(CinebenchR15Result.cpu_cb)
+        board.ensure()
+        before = len(board)
+        builds = []
+        monkeypatch.setattr(board, 'build', builds.append)
+        # as a write by another worker leaves it
+        board._version = None
+        # another thread is rebuilding it, so this one serves it as it was
+        with board._building:
+            assert board.ensure() is board
+            assert len(board) == before
+        assert builds == []
+        board.ensure()
+        assert len(builds) == 1
@@ -0,0 +1,66 @@
+import json
+from base64 import urlsafe_b64encode
+
+import pytest
+from app.models import Futuremark3DMark06Result
+
+
+def cursor(*parts):
+    return urlsafe_b64encode(json.dumps(parts).encode('utf-8')).decode('ascii')
+
+
+def scores(page):
+    return [(result['overall_score'], int(result['uri'].rsplit('/', 1)[1]))
+            for result in page['futuremark3dmark06results']]
+
+
+def test_next_links_walk_the_list_in_order(app, client):
+    with app.app_context():
+        expected = sorted(((result.overall_score, result.id) for result in
+                           Futuremark3DMark06Result.query), reverse=True)
+    # the seeded scores tie, so this is also ordering on the id
+    assert len({score for score, id in expected}) < len(expected)
+
+    page = client.get('/api/v1.0/futuremark3dmark06results?limit=2') \
+        .get_json()
+    assert page['prev'] is None
+    seen = scores(page)
+    while page['next']:
+        page = client.get(page['next']).get_json()
+        assert page['limit'] == 2
+        assert page['prev'] is not None
+        seen += scores(page)
+    assert seen == expected
+
+
+def test_prev_and_next_round_trip(client):
+    first = client.get('/api/v1.0/cinebenchr15results?limit=3').get_json()
+    second = client.get(first['next']).get_json()
+    back = client.get(second['prev']).get_json()
+    assert back['cinebenchr15results'] == first['cinebenchr15results']
+    # back at the start, so there's nothing before it
+    assert back['prev'] is None
+    again = client.get(back['next']).get_json()
+    assert again['cinebenchr15results'] == second['cinebenchr15results']
+
+
+@pytest.mark.parametrize('url, parts', [
+    ('/machines', ['next', '99999999999999999999', 5]),
+    ('/machines', ['next', 5, 5]),
+    ('/cinebenchr15results', ['next', {'a': 1}, 5]),
+    ('/cinebenchr15results', ['next', '1500', 5]),
+    ('/cinebenchr15results', ['next', 2 ** 70, 5]),
+    ('/cinebenchr15results', ['next', 1500, 2 ** 70]),
+    ('/cinebenchr15results', ['next', 1500, True]),
+    ('/cinebenchr15results', ['sideways', 1500, 5]),
+    ('/users', ['next', 1500, 5]),
+])
+def test_bad_cursor_is_a_400(client, url, parts):
+    response = client.get('/api/v1.0{}?cursor={}'.format(url, cursor(*parts)))
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid cursor'
+
+
+def test_garbled_cursor_is_a_400(client):
+    response = client.get('/api/v1.0/machines?cursor=not-base64!')
+    assert response.status_code == 400
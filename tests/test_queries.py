@@ -0,0 +1,75 @@
+import pytest
+from app.api_1_0 import cache
+
+
+# The most SQL statements each read endpoint may run when its response
+# isn't cached. They're eager-loaded from the field maps (see
+# app/api_1_0/loading.py), so none of these depend on how many rows come
+# back; one going up means something is being loaded a row at a time.
+limits = [
+    ('/users', 3),
+    ('/users/1', 3),
+    ('/users/1/machines', 4),
+    ('/machines', 3),
+    ('/machines/1', 3),
+    ('/machines/1/revisions', 4),
+    ('/revisions', 3),
+    ('/revisions/1', 3),
+    ('/revisions?cpu_make=AMD', 3),
+    ('/cinebenchr15results', 3),
+    ('/cinebenchr15results/1', 3),
+    ('/revisions/1/cinebenchr15results', 4),
+    ('/futuremark3dmark06results', 3),
+    ('/futuremark3dmark06results/1', 3),
+    ('/revisions/1/futuremark3dmark06results', 4),
+    ('/futuremark3dmarkresults', 3),
+    ('/futuremark3dmarkresults/1', 3),
+    ('/revisions/1/futuremark3dmarkresults', 4),
+    ('/leaderboards/cpu_cb', 4),
+    ('/leaderboards/cpu_cb/results/1', 4),
+    ('/leaderboards/cpu_cb/ranks/2', 4),
+    ('/compare?revisions=1,2', 6),
+    ('/compare?machines=1,2', 6),
+    ('/search/machines?q=Machine', 3),
+    ('/search/revisions?q=Ryzen', 3),
+    ('/stats/cpu_cb', 4),
+    ('/stats/cpu_cb?group_by=cpu_name', 4)
+]
+
+
+@pytest.fixture
+def uncached(client):
+    # the first request also loads the leaderboards, which isn't any one
+    # endpoint's doing
+    client.get('/api/v1.0/users')
+    with cache._lock:
+        cache._entries.clear()
+
+
+@pytest.mark.parametrize('url, limit', limits)
+def test_query_count(client, uncached, url, limit):
+    response = client.get('/api/v1.0' + url)
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) <= limit, \
+        '{} ran {} SQL statements, expected at most {}'.format(
+            url, response.headers['X-Query-Count'], limit)
+
+
+def test_list_query_count_does_not_grow_with_page_size(client, uncached):
+    counts = []
+    for limit in (1, 15):
+        response = client.get('/api/v1.0/cinebenchr15results?limit={}'
+                              .format(limit))
+        assert len(response.get_json()['cinebenchr15results']) == limit
+        counts.append(response.headers['X-Query-Count'])
+    assert counts[0] == counts[1]
+
+
+def test_query_count_only_sent_when_testing_or_debugging(app, client):
+    app.testing = False
+    try:
+        response = client.get('/api/v1.0/users/1')
+    finally:
+        app.testing = True
+    assert response.status_code == 200
+    assert 'X-Query-Count' not in response.headers
@@ -0,0 +1,16 @@
+from app.api_1_0 import cache
+from app.queryplans import explain
+
+
+def test_read_endpoints_use_indexes(app):
+    # a cached response runs no queries worth explaining
+    with cache._lock:
+        cache._entries.clear()
+    checked = 0
+    for url, status, statements in explain(app):
+        assert status == 200, url
+        scans = [(statement, found)
+                 for statement, lines, found in statements if found]
+        assert not scans, '{} reads whole tables: {}'.format(url, scans)
+        checked += 1
+    assert checked > 20
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import event
+from app import db
+
+
+@pytest.fixture
+def foreign_keys(app):
+    """SQLite checking foreign keys, as Postgres always does."""
+    def enforce(connection, record):
+        connection.execute('PRAGMA foreign_keys = ON')
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'connect', enforce)
+    yield
+    event.remove(engine, 'connect', enforce)
+
+
+def test_deleting_the_active_revision(client, auth, foreign_keys):
+    machine = client.post('/api/v1.0/machines', headers=auth,
+                          json={'system_name': 'Short lived'}).get_json()
+    id = machine['machine']['id']
+    url = '/api/v1.0/machines/{}'.format(id)
+    revision = client.post(url + '/revisions', headers=auth,
+                           json={'cpu_name': 'Ryzen 9'}).get_json()
+    revision_url = revision['revision']['uri']
+    # a new revision is the machine's active one, and is cached as such
+    assert client.get(url).get_json()['active_revision']['cpu_name'] == \
+        'Ryzen 9'
+
+    response = client.delete(revision_url, headers=auth)
+    assert response.status_code == 200
+    assert client.get(revision_url).status_code == 404
+    assert client.get(url).get_json()['active_revision']['cpu_name'] is None
+    client.delete(url, headers=auth)
@@ -0,0 +1,20 @@
+from app import db
+from app.models import CinebenchR15Result
+from app.snapshot import build
+
+
+def test_orphaned_results_are_in_the_snapshot(app):
+    with app.app_context():
+        # as left behind when its revision is deleted
+        result = CinebenchR15Result(cpu_cb=1234, revision_id=10 ** 6)
+        db.session.add(result)
+        db.session.commit()
+        try:
+            arrays = build(CinebenchR15Result)
+            assert len(arrays['id']) == CinebenchR15Result.query.count()
+            row = list(arrays['id']).index(result.id)
+            assert arrays['machine_id.null'][row]
+            assert arrays['cpu_name'][row] == -1
+        finally:
+            db.session.delete(result)
+            db.session.commit()
@@ -0,0 +1,51 @@
+from app import db
+from app.api_1_0.cache import touch
+from app.models import CinebenchR15Result, Revision
+from app.stats import distribution
+
+
+def test_metric_with_no_values_has_no_groups(client):
+    response = client.get('/api/v1.0/stats/cpu1_fps?group_by=cpu_name')
+    assert response.status_code == 200
+    assert response.get_json()['groups'] == []
+
+
+def test_group_with_no_values_is_left_out(app):
+    with app.app_context():
+        revision = Revision(cpu_name='Zen without a score', machine_id=1)
+        db.session.add(revision)
+        db.session.flush()
+        result = CinebenchR15Result(opengl_fps=50, revision_id=revision.id)
+        db.session.add(result)
+        touch(revision, result)
+        db.session.commit()
+        try:
+            stats = distribution('cpu_cb', 'cpu_name')
+            names = [group['cpu_name'] for group in stats['groups']]
+            assert 'Zen without a score' not in names
+            assert sum(group['count'] for group in stats['groups']) == \
+                stats['count']
+        finally:
+            touch(revision, result)
+            db.session.delete(result)
+            db.session.delete(revision)
+            db.session.commit()
+
+
+def test_stats_follow_new_results(app, client):
+    url = '/api/v1.0/stats/cpu_cb'
+    before = client.get(url).get_json()['count']
+    with app.app_context():
+        result = CinebenchR15Result(cpu_cb=4321, revision_id=1)
+        db.session.add(result)
+        touch(result)
+        db.session.commit()
+        id = result.id
+    try:
+        assert client.get(url).get_json()['count'] == before + 1
+    finally:
+        with app.app_context():
+            result = CinebenchR15Result.query.get(id)
+            touch(result)
+            db.session.delete(result)
+            db.session.commit()
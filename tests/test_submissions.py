@@ -0,0 +1,111 @@
+from sqlalchemy import event
+from app import db
+from app.api_1_0.cache import touch
+from app.models import (Machine, Revision, CinebenchR15Result,
+                        Futuremark3DMark06Result, Futuremark3DMarkResult)
+
+
+models = (Machine, Revision, CinebenchR15Result, Futuremark3DMark06Result,
+          Futuremark3DMarkResult)
+
+submission = {
+    'machine': {'system_name': 'Test bench', 'owner': 'Bob'},
+    'revision': {'cpu_make': 'AMD', 'cpu_name': 'Ryzen 7 1700',
+                 'cpu_proc_cores': 8},
+    'results': [
+        {'type': 'cinebenchr15result', 'cpu_cb': 1400, 'opengl_fps': 110},
+        {'type': 'futuremark3dmark06result', 'overall_score': 21000},
+        {'type': 'futuremark3dmarkresult', 'icestorm_score': 100,
+         'firestrike_score': 50}]
+}
+
+
+def counts():
+    return [model.query.count() for model in models]
+
+
+def remove(machine_id):
+    machine = Machine.query.get(machine_id)
+    for revision in machine.revisions:
+        for result in (revision.cinebenchr15results.all() +
+                       revision.futuremark3dmark06results.all() +
+                       revision.futuremark3dmarkresults.all()):
+            touch(result)
+            db.session.delete(result)
+        touch(revision)
+        db.session.delete(revision)
+    touch(machine)
+    db.session.delete(machine)
+    db.session.commit()
+
+
+def test_submission_is_saved_in_one_commit(app, client, auth):
+    flushed, commits = [], []
+
+    def flushing(session, context):
+        flushed.append(session)
+
+    def committed(session):
+        # the request's teardown commits as well, with nothing to commit
+        if flushed:
+            commits.append(session)
+            del flushed[:]
+
+    event.listen(db.session, 'after_flush', flushing)
+    event.listen(db.session, 'after_commit', committed)
+    try:
+        response = client.post('/api/v1.0/submissions', headers=auth,
+                               json=submission)
+    finally:
+        event.remove(db.session, 'after_flush', flushing)
+        event.remove(db.session, 'after_commit', committed)
+    assert response.status_code == 201
+    assert len(commits) == 1
+    saved = response.get_json()
+    machine, revision = saved['machine'], saved['revision']
+    try:
+        # the new revision is the machine's active one
+        assert machine['active_revision']['id'] == revision['id']
+        assert revision['machine'] == machine
+
+        # each part comes back the way its own endpoint shows it
+        assert client.get('/api/v1.0/machines/{}'.format(machine['id'])) \
+            .get_json() == machine
+        assert client.get(revision['uri']).get_json() == \
+            {'revision': revision}
+        results = saved['results']
+        assert [list(result) for result in results] == [
+            ['cinebenchr15result'], ['futuremark3dmark06result'],
+            ['futuremark3dmarkresult']]
+        for result in results:
+            body, = result.values()
+            assert body['revision'] == revision
+            assert client.get(body['uri']).get_json() == result
+    finally:
+        with app.app_context():
+            remove(machine['id'])
+
+def test_one_bad_result_saves_nothing(app, client, auth):
+    with app.app_context():
+        before = counts()
+    bad = dict(submission, results=submission['results'] + [
+        {'type': 'cinebenchr15result', 'cpu_cb': 'lots'}])
+    response = client.post('/api/v1.0/submissions', headers=auth, json=bad)
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['message'] == 'Nothing was saved'
+    assert [error['index'] for error in body['errors']['results']] == [3]
+    with app.app_context():
+        assert counts() == before
+
+
+def test_bad_machine_saves_nothing(app, client, auth):
+    with app.app_context():
+        before = counts()
+    bad = dict(submission, machine={'system_name': 'Test bench',
+                                    'timestamp': 'yesterday-ish'})
+    response = client.post('/api/v1.0/submissions', headers=auth, json=bad)
+    assert response.status_code == 400
+    assert list(response.get_json()['errors']) == ['machine']
+    with app.app_context():
+        assert counts() == before
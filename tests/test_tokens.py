@@ -0,0 +1,43 @@
+from flask_jwt_extended import decode_token
+from app.blacklist import Blacklist
+from app.models import Permission, User
+
+
+def login(client):
+    tokens = client.post('/api/v1.0/login', json={
+        'username': 'alice', 'password': 'password'}).get_json()
+    return {'Authorization': 'Bearer ' + tokens['access_token']}
+
+
+def test_logged_out_token_is_refused(client):
+    headers = login(client)
+    assert client.post('/api/v1.0/logout/access',
+                       headers=headers).status_code == 200
+    assert client.post('/api/v1.0/logout/access',
+                       headers=headers).status_code == 401
+
+
+def test_revocation_reaches_other_workers(app, client):
+    # a worker elsewhere, with its filter already built
+    other = Blacklist()
+    headers = login(client)
+    with app.app_context():
+        jti = decode_token(headers['Authorization'][7:])['jti']
+    with app.test_request_context():
+        assert not other.is_revoked(jti)
+
+    client.post('/api/v1.0/logout/access', headers=headers)
+    with app.test_request_context():
+        # it doesn't look at the counter again until JWT_BLACKLIST_RECHECK
+        # seconds have passed since the last time
+        assert not other.is_revoked(jti)
+        other._recheck_at = 0
+        assert other.is_revoked(jti)
+
+
+def test_user_without_role_gets_no_permissions(app):
+    with app.app_context():
+        user = User.find_by_username('alice')
+        assert user.role is None
+        assert user.token_claims()['perms'] == 0
+        assert not user.can(Permission.POST)
@@ -0,0 +1,81 @@
+import pytest
+from app import db, writebehind
+from app.models import CinebenchR15Result
+from app.writebehind import journal
+
+
+def test_entry_the_database_refuses_does_not_block_the_queue(
+        app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'WRITE_BEHIND_JOURNAL',
+                        str(tmp_path / 'write-behind.sqlite'))
+    # something that gets past the checks but not into the database
+    parse_result = writebehind.parse_result
+
+    def parse(item, now=None):
+        model, row = parse_result(item, now)
+        if row['cpu_cb'] == 666:
+            row['cpu_cb'] = 10 ** 30
+        return model, row
+    monkeypatch.setattr(writebehind, 'parse_result', parse)
+
+    with app.app_context():
+        ids = journal.enqueue(1, [
+            {'type': 'cinebenchr15result', 'cpu_cb': cpu_cb}
+            for cpu_cb in (1, 666, 2)])
+        try:
+            saved = journal.flush()
+        finally:
+            found = journal.status(ids)
+            CinebenchR15Result.query.filter(CinebenchR15Result.id.in_(
+                [entry['result_id'] for entry in found.values()
+                 if entry['result_id'] is not None])) \
+                .delete(synchronize_session=False)
+            db.session.commit()
+        assert saved == 2
+        assert [found[id]['status'] for id in ids] == \
+            ['saved', 'failed', 'saved']
+        assert journal.depth()[0] == 0
+
+
+
+def test_flush_cut_short_after_committing_is_finished_off(
+        app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'WRITE_BEHIND_JOURNAL',
+                        str(tmp_path / 'write-behind.sqlite'))
+
+    def die(by_model):
+        # the batch is in the database, but the journal hasn't heard
+        raise KeyboardInterrupt
+    monkeypatch.setattr(writebehind.leaderboards, 'record_rows', die)
+
+    with app.app_context():
+        before = CinebenchR15Result.query.count()
+        # the middle one's revision is gone by the time it's flushed
+        ids = [id for revision_id, cpu_cb in ((1, 1), (10 ** 6, 2), (1, 3))
+               for id in journal.enqueue(revision_id, [
+                   {'type': 'cinebenchr15result', 'cpu_cb': cpu_cb}])]
+        with pytest.raises(KeyboardInterrupt):
+            journal.flush()
+        db.session.remove()
+        assert [entry['status'] for entry in journal.status(ids).values()] \
+            == ['queued'] * 3
+
+        monkeypatch.setattr(writebehind.leaderboards, 'record_rows',
+                            lambda by_model: None)
+        # finishing it off leaves nothing to save again
+        assert journal.flush() == 0
+        found = journal.status(ids)
+        result_ids = [found[id]['result_id'] for id in ids]
+        try:
+            assert [found[id]['status'] for id in ids] == \
+                ['saved', 'failed', 'saved']
+            assert found[ids[1]]['error'] == {'revision': 'no longer exists'}
+            assert result_ids[1] is None
+            assert [CinebenchR15Result.query.get(id).cpu_cb
+                    for id in (result_ids[0], result_ids[2])] == [1, 3]
+            assert CinebenchR15Result.query.count() == before + 2
+        finally:
+            CinebenchR15Result.query.filter(CinebenchR15Result.id.in_(
+                [id for id in result_ids if id is not None])) \
+                .delete(synchronize_session=False)
+            db.session.commit()